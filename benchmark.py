@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Benchmark of the domoticz-emmeti-eq2021 plugin poll cycle, running against the heat pump emulator in emulator.py.
+Author: Paolo Subiaco https://github.com/CreasolTech
+
+The plugin is loaded with a minimal stand-in of the Domoticz module, then BasePlugin.onStart, onHeartbeat and onCommand
+are called as Domoticz does, while the poller thread talks to the emulator at several baud rates and failure rates.
+For each scenario it reports, per cycle:
+    wall time of the poll cycle, time spent in time.sleep, number of serial transactions, number of Domoticz device updates
+
+Usage:
+    python3 benchmark.py [--cycles 20] [--baudrates 9600,19200,115200] [--drops 0,0.1,0.3] [--latency 0.005] [--commands 5]
+    python3 benchmark.py --crc      # microbenchmark of minimalmodbus._calculate_crc against the reference implementation
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import termios
+import threading
+import time
+import timeit
+import types
+
+import minimalmodbus
+from emulator import EQ2021Emulator
+
+
+class Counters:
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.sleepTime=0
+        self.transactions=0
+        self.updates=0
+
+counters=Counters()
+
+_sleep=time.sleep   # the harness uses the original time.sleep, not counted
+
+def countingSleep(seconds):
+    if threading.current_thread().name=="EQ2021Poller":
+        with counters.lock:
+            counters.sleepTime+=seconds
+    _sleep(seconds)
+
+_communicate=minimalmodbus.Instrument._communicate
+
+def countingCommunicate(self, request, number_of_bytes_to_read):
+    with counters.lock:
+        counters.transactions+=1
+    return _communicate(self, request, number_of_bytes_to_read)
+
+
+class Device:
+    """ Stand-in for Domoticz.Device: counts the updates """
+    def __init__(self, Name="", Unit=0, **kwargs):
+        self.Name=Name
+        self.Unit=Unit
+        self.nValue=0
+        self.sValue=""
+
+    def Create(self):
+        plugin.Devices[self.Unit]=self
+
+    def Update(self, nValue=0, sValue="", **kwargs):
+        self.nValue=nValue
+        self.sValue=sValue
+        with counters.lock:
+            counters.updates+=1
+
+
+def loadPlugin():
+    """ Import plugin.py with a minimal Domoticz module """
+    Domoticz=types.ModuleType("Domoticz")
+    Domoticz.log=[]
+    Domoticz.Status=Domoticz.Log=Domoticz.Debug=lambda text: Domoticz.log.append(text)
+    Domoticz.Error=lambda text: Domoticz.log.append("ERROR: "+text)
+    Domoticz.Heartbeat=lambda seconds: None
+    Domoticz.Device=Device
+    sys.modules["Domoticz"]=Domoticz
+    import plugin
+    return plugin
+
+
+def ptySupportsParity():
+    """ Some Linux kernels refuse to set parity on a pseudo-terminal """
+    master, slave = os.openpty()
+    try:
+        port=minimalmodbus.serial.Serial(os.ttyname(slave))
+        try:
+            port.parity=minimalmodbus.serial.PARITY_EVEN   # as done by the plugin, after opening the port
+        finally:
+            port.close()
+        return True
+    except (minimalmodbus.serial.SerialException, OSError, termios.error):
+        return False
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def waitIdle(poller, timeout=30):
+    """ Wait until the poller has done the poll requested by pollNow() and is waiting for the next cycle """
+    deadline=time.monotonic()+timeout
+    while poller.nextPoll==0 or not poller.idle.is_set() or poller.wakeup.is_set():
+        if time.monotonic()>deadline:
+            raise RuntimeError("Timeout waiting for the poller cycle")
+        _sleep(0.001)
+
+
+def elapse(poller):
+    """ Simulate the elapsing of one poll interval, without waiting for it """
+    for block in poller.blocks:
+        block.lastRead-=poller.pollTime
+    poller.breaker.nextAttempt-=poller.pollTime
+
+
+def runScenario(baudrate, drop, latency, cycles, commands):
+    """ Run the plugin against the emulator for the given number of poll cycles, return a dict of per-cycle statistics """
+    with tempfile.TemporaryDirectory() as homeFolder:   # the poller saves its Modbus trace there when the breaker opens
+        return _runScenario(baudrate, drop, latency, cycles, commands, homeFolder+os.sep)
+
+
+def _runScenario(baudrate, drop, latency, cycles, commands, homeFolder):
+    """ Body of runScenario(), with the plugin folder given by homeFolder """
+    emulator=EQ2021Emulator(address=3, latency=latency, drop=drop, baudrate=baudrate)
+    emulator.start()
+    plugin.Parameters={"SerialPort":emulator.port, "Address":"", "Mode1":str(baudrate), "Mode2":"3", "Mode3":"10", "Mode4":"", "Mode5":"", "Mode6":"", "HomeFolder":homeFolder}
+    plugin.Settings={"Language":"en"}
+    plugin.Devices={}
+    plugin._plugin=plugin.BasePlugin()
+    wallTimes=[]; sleepTimes=[]; transactions=[]; updates=[]
+    with contextlib.redirect_stdout(io.StringIO()):  # minimalmodbus debug output
+        plugin.onStart()
+        poller=plugin._plugin.poller
+        waitIdle(poller)    # first poll at startup, reads all blocks
+        plugin.onHeartbeat()
+        for cycle in range(cycles):
+            with counters.lock:
+                counters.sleepTime=counters.transactions=counters.updates=0
+            busyTime=poller.busyTime
+            if commands and cycle%commands==0:  # a slider drag: several commands in a row
+                for level in (45, 45.5, 46):
+                    plugin.onCommand(plugin.DEVS["SP_HOTWATER"]["unit"], "Set Level", level, 0)
+            elapse(poller)
+            poller.pollNow()
+            waitIdle(poller)
+            plugin.onHeartbeat()
+            with counters.lock:
+                wallTimes.append(poller.busyTime-busyTime)
+                sleepTimes.append(counters.sleepTime)
+                transactions.append(counters.transactions)
+                updates.append(counters.updates)
+        plugin.onStop()
+    emulator.stop()
+    wallTimes.sort()
+    return {
+        "baudrate": baudrate,
+        "drop": drop,
+        "cycles": cycles,
+        "wall_ms": statistics.mean(wallTimes)*1000,
+        "wall_p95_ms": wallTimes[int(0.95*(len(wallTimes)-1))]*1000,
+        "sleep_ms": statistics.mean(sleepTimes)*1000,
+        "transactions": statistics.mean(transactions),
+        "updates": statistics.mean(updates),
+    }
+
+
+def crcBenchmark(sizes=(4, 6, 8, 16, 32, 64, 128, 254), number=20000):
+    """ Compare minimalmodbus._calculate_crc with the reference implementation, for frames up to the 256 bytes RTU maximum """
+    print(f"{'bytes':>5} {'reference us':>12} {'crc us':>8} {'speedup':>7} {'cached us':>9}")
+    for size in sizes:
+        for i in range(1000):   # the results must be bit-identical
+            data=os.urandom(size)
+            assert minimalmodbus._calculate_crc(data)==minimalmodbus._calculate_crc_reference(data), data
+        data=os.urandom(size)
+        times=[min(timeit.repeat(lambda: function(data), number=number, repeat=5))/number*1e6
+                for function in (minimalmodbus._calculate_crc_reference, minimalmodbus._calculate_crc, minimalmodbus._calculate_request_crc)]
+        print(f"{size:>5} {times[0]:>12.2f} {times[1]:>8.2f} {times[0]/times[1]:>7.1f} {times[2]:>9.2f}")
+
+
+def main():
+    global plugin
+    parser=argparse.ArgumentParser(description="Poll cycle benchmark of the domoticz-emmeti-eq2021 plugin against the emulator")
+    parser.add_argument("--cycles", type=int, default=20, help="poll cycles for each scenario")
+    parser.add_argument("--baudrates", default="9600,19200,115200", help="comma separated list of baud rates")
+    parser.add_argument("--drops", default="0,0.1,0.3", help="comma separated list of probabilities of dropped responses")
+    parser.add_argument("--latency", type=float, default=0.005, help="emulator response latency in seconds")
+    parser.add_argument("--commands", type=int, default=5, help="send a burst of setpoint commands every COMMANDS cycles (0=never)")
+    parser.add_argument("--crc", action="store_true", help="run the CRC microbenchmark instead")
+    args=parser.parse_args()
+
+    if args.crc:
+        crcBenchmark()
+        return
+
+    plugin=loadPlugin()
+    if not ptySupportsParity():
+        print("Note: this kernel does not support parity on pseudo-terminals: using no parity")
+        minimalmodbus.serial.PARITY_EVEN=minimalmodbus.serial.PARITY_NONE
+    time.sleep=countingSleep
+    minimalmodbus.Instrument._communicate=countingCommunicate
+
+    print(f"{'baud':>7} {'drop':>5} {'cycles':>6} {'wall ms':>8} {'p95 ms':>8} {'sleep ms':>8} {'transact':>8} {'updates':>8}")
+    for baudrate in [int(b) for b in args.baudrates.split(",")]:
+        for drop in [float(d) for d in args.drops.split(",")]:
+            r=runScenario(baudrate, drop, args.latency, args.cycles, args.commands)
+            print(f"{r['baudrate']:>7} {r['drop']:>5} {r['cycles']:>6} {r['wall_ms']:>8.1f} {r['wall_p95_ms']:>8.1f} {r['sleep_ms']:>8.1f} {r['transactions']:>8.2f} {r['updates']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+Emmeti EQ2021/EQ3021 hot water heat pump emulator, to run and benchmark the domoticz-emmeti-eq2021 plugin without the heat pump.
+Author: Paolo Subiaco https://github.com/CreasolTech
+
+Opens a pseudo-terminal pair and answers, on the slave side, the Modbus RTU requests FC3 (read registers),
+FC6 (write register) and FC16 (write registers) for the registers used by the plugin, with the same
+encoding of temperatures (scale and offset) used by the DEVS register map in plugin.py.
+Response latency, dropped frames and "unit off" (no answer at all) can be configured.
+With --tcp it listens on a local TCP port instead, as an Ethernet to RS485 gateway, with Modbus TCP
+or RTU over TCP framing.
+
+Usage:
+    python3 emulator.py [--address 3] [--latency 0.02] [--drop 0.1] [--off] [--baudrate 9600] [--tcp tcp|rtu+tcp] [--tcpport 5020]
+then use the printed port name as Modbus Port (or gateway URL) of the plugin, or as port of minimalmodbus.Instrument.
+
+Note: some Linux kernels refuse to set parity on a pseudo-terminal, so opening the port with even parity
+(as the plugin does) may fail with "Invalid argument": in that case use no parity.
+"""
+
+import argparse
+import os
+import random
+import select
+import socket
+import threading
+import time
+import tty
+
+import minimalmodbus
+
+
+def temp2value(temp):
+    """ Convert a temperature to a Modbus value, same encoding as encodeValue() in plugin.py """
+    return int(temp*2)+60
+
+REGISTERS={ # address: value at startup
+    1104: temp2value(50),   # SP_HOTWATER
+    1105: 0,
+    1106: temp2value(5),    # SP_DIFF
+    1107: 0,
+    1108: 0,
+    1109: 6,                # SP_RESISTOR_DELAY, 5 minutes step
+    2019: temp2value(20),   # TEMP_AIR_IN
+    2020: temp2value(45),   # TEMP_WATER_BOTTOM
+    2021: temp2value(50),   # TEMP_WATER_TOP
+    2022: temp2value(15),   # TEMP_COIL
+    2023: temp2value(10),   # TEMP_AIR_OUT
+}
+READONLYADDR=2000   # registers from this address are read-only
+
+ILLEGAL_FUNCTION=1
+ILLEGAL_DATA_ADDRESS=2
+ILLEGAL_DATA_VALUE=3
+
+
+class EQ2021Emulator(threading.Thread):
+    """ Modbus RTU slave emulating the heat pump on the slave side of a pseudo-terminal: the master side is self.port """
+    def __init__(self, address=3, latency=0, drop=0, off=False, baudrate=0):
+        super().__init__(name="EQ2021Emulator", daemon=True)
+        self.address=address
+        self.latency=latency    # seconds between the end of the request and the start of the response
+        self.drop=drop          # probability of not answering a request
+        self.off=off            # True => unit off, never answers
+        self.baudrate=baudrate  # if not 0, simulate the time needed to transmit the response at this baudrate
+        self.registers=dict(REGISTERS)
+        self.lock=threading.Lock()
+        self.requests=0
+        self.responses=0
+        self.dropped=0
+        self.exceptions=0
+        self.running=True
+        self.openPort()
+
+    def openPort(self):
+        self.fd, self.slavefd = os.openpty()
+        tty.setraw(self.fd)
+        tty.setraw(self.slavefd)
+        self.port=os.ttyname(self.slavefd)   # the slave fd is kept open, so the pty survives the master closing the port
+
+    def closePort(self):
+        os.close(self.fd)
+        os.close(self.slavefd)
+
+    def stop(self):
+        self.running=False
+        if self.is_alive():
+            self.join()
+        self.closePort()
+
+    def setTemperature(self, address, temp):
+        with self.lock:
+            self.registers[address]=temp2value(temp)
+
+    def run(self):
+        gap=minimalmodbus._calculate_minimum_silent_period(self.baudrate or 9600)
+        while self.running:
+            if not select.select([self.fd], [], [], 0.1)[0]:
+                continue
+            frame=os.read(self.fd, 256)
+            while select.select([self.fd], [], [], gap)[0]:    # a frame ends with a silent interval of 3.5 chars
+                frame+=os.read(self.fd, 256)
+            response=self.respond(frame)
+            if response is not None:
+                os.write(self.fd, response)
+
+    def respond(self, frame):
+        """ Return the response to the request frame after the configured delay, or None if there is no response """
+        self.requests+=1
+        response=self.handle(frame)
+        if response is None:
+            return None
+        if self.off or random.random()<self.drop:
+            self.dropped+=1
+            return None
+        delay=self.latency
+        if self.baudrate:
+            delay+=len(response)*11/self.baudrate
+        if delay:
+            time.sleep(delay)
+        self.responses+=1
+        return response
+
+    def handle(self, frame):
+        """ Return the response frame for the request frame, or None if the request must be ignored """
+        if len(frame)<4 or frame[0]!=self.address or minimalmodbus._calculate_crc(frame[:-2])!=frame[-2:]:
+            return None
+        functioncode=frame[1]
+        data=frame[2:-2]
+        if functioncode not in (3, 6, 16) or len(data)<4:
+            return self.exception(functioncode, ILLEGAL_FUNCTION)
+        start=int.from_bytes(data[0:2], "big")
+        with self.lock:
+            if functioncode==3:
+                count=int.from_bytes(data[2:4], "big")
+                if not 1<=count<=125:
+                    return self.exception(functioncode, ILLEGAL_DATA_VALUE)
+                if any(start+i not in self.registers for i in range(count)):
+                    return self.exception(functioncode, ILLEGAL_DATA_ADDRESS)
+                payload=bytes([count*2])+b"".join(self.registers[start+i].to_bytes(2, "big") for i in range(count))
+            elif functioncode==6:
+                if start not in self.registers or start>=READONLYADDR:
+                    return self.exception(functioncode, ILLEGAL_DATA_ADDRESS)
+                self.registers[start]=int.from_bytes(data[2:4], "big")
+                payload=data[0:4]   # echo of address and value
+            else:
+                count=int.from_bytes(data[2:4], "big")
+                if not 1<=count<=123 or len(data)!=5+count*2 or data[4]!=count*2:
+                    return self.exception(functioncode, ILLEGAL_DATA_VALUE)
+                if any(start+i not in self.registers or start+i>=READONLYADDR for i in range(count)):
+                    return self.exception(functioncode, ILLEGAL_DATA_ADDRESS)
+                for i in range(count):
+                    self.registers[start+i]=int.from_bytes(data[5+i*2:7+i*2], "big")
+                payload=data[0:4]   # echo of address and number of registers
+        return self.frame(functioncode, payload)
+
+    def exception(self, functioncode, code):
+        self.exceptions+=1
+        return self.frame(functioncode|0x80, bytes([code]))
+
+    def frame(self, functioncode, payload):
+        response=bytes([self.address, functioncode])+payload
+        return response+minimalmodbus._calculate_crc(response)
+
+
+class EQ2021TcpEmulator(EQ2021Emulator):
+    """ The same heat pump behind an Ethernet to RS485 gateway listening on a local TCP port: self.port is the URL for minimalmodbus """
+    def __init__(self, framing="tcp", tcpport=0, **kwargs):
+        self.framing=framing    # "tcp" => Modbus TCP (MBAP header), "rtu+tcp" => RTU frames over TCP
+        self.tcpport=tcpport    # 0 => any free port
+        super().__init__(**kwargs)
+
+    def openPort(self):
+        self.server=socket.create_server(("127.0.0.1", self.tcpport))
+        self.server.settimeout(0.1)
+        self.port=f"{self.framing}://127.0.0.1:{self.server.getsockname()[1]}"
+
+    def closePort(self):
+        self.server.close()
+
+    def run(self):
+        while self.running:
+            try:
+                conn, addr = self.server.accept()   # one client at a time, as most gateways
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(0.1)
+                buffer=b""
+                while self.running:
+                    try:
+                        data=conn.recv(1024)
+                    except socket.timeout:
+                        continue
+                    if not data:
+                        break   # connection closed by the client
+                    if self.framing=="rtu+tcp":  # each TCP segment holds a request frame
+                        response=self.respond(data)
+                        if response is not None:
+                            conn.sendall(response)
+                        continue
+                    buffer+=data
+                    while len(buffer)>=6 and len(buffer)>=6+int.from_bytes(buffer[4:6], "big"):  # complete Modbus TCP frames
+                        length=6+int.from_bytes(buffer[4:6], "big")
+                        frame, buffer = buffer[:length], buffer[length:]
+                        pdu=frame[6:]   # unit id, function code and data: the RTU frame without CRC
+                        response=self.respond(pdu+minimalmodbus._calculate_crc(pdu))
+                        if response is not None:
+                            response=response[:-2]
+                            conn.sendall(frame[0:4]+len(response).to_bytes(2, "big")+response)
+
+
+def main():
+    parser=argparse.ArgumentParser(description="Emmeti EQ2021/EQ3021 Modbus RTU emulator on a pseudo-terminal")
+    parser.add_argument("--address", type=int, default=3, help="slave address (default 3)")
+    parser.add_argument("--latency", type=float, default=0, help="response latency in seconds")
+    parser.add_argument("--drop", type=float, default=0, help="probability of dropping a response (0-1)")
+    parser.add_argument("--off", action="store_true", help="unit off: never answer")
+    parser.add_argument("--baudrate", type=int, default=0, help="simulate the transmission time of responses at this baudrate")
+    parser.add_argument("--tcp", choices=["tcp", "rtu+tcp"], help="listen on a TCP port, with Modbus TCP or RTU over TCP framing")
+    parser.add_argument("--tcpport", type=int, default=5020, help="TCP port, with --tcp (default 5020)")
+    args=parser.parse_args()
+
+    if args.tcp:
+        emulator=EQ2021TcpEmulator(args.tcp, args.tcpport, address=args.address, latency=args.latency, drop=args.drop, off=args.off, baudrate=args.baudrate)
+    else:
+        emulator=EQ2021Emulator(args.address, args.latency, args.drop, args.off, args.baudrate)
+    emulator.start()
+    print(f"Emulating EQ2021 at address {args.address} on {emulator.port} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    emulator.stop()
+    print(f"{emulator.requests} requests, {emulator.responses} responses, {emulator.dropped} dropped, {emulator.exceptions} exceptions")
+
+
+if __name__ == "__main__":
+    main()
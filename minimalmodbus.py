@@ -28,15 +28,45 @@ if sys.version_info < (3, 8, 0):
         "Your Python version is too old for this version of MinimalModbus"
     )
 
+import array
+import asyncio
 import binascii
+import bisect
+import collections
+import concurrent.futures
+import contextlib
 import enum
+import functools
+import io
+import itertools
+import math
 import os
+import queue
+import select
 import struct
+import threading
 import time
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import serial
 
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None  # type: ignore
+
 _NUMBER_OF_BYTES_BEFORE_REGISTERDATA = 1  # Within the payload
 _NUMBER_OF_BYTES_PER_REGISTER = 2
 _MAX_NUMBER_OF_REGISTERS_TO_WRITE = 123
@@ -47,7 +77,19 @@ _MAX_NUMBER_OF_DECIMALS = 10  # Some instrument might store 0.00000154 Ampere as
 _MAX_BYTEORDER_VALUE = 3
 _SECONDS_TO_MILLISECONDS = 1000
 _BROADCAST_DELAY: float = 0.2  # seconds
+# Seconds at the end of each wait spent spinning, as time.sleep() may oversleep
+_SPIN_TIME: float = 0.002 if sys.platform == "win32" else 0.0003
+_MINIMUM_END_OF_FRAME_SILENCE: float = 0.02  # seconds, USB adapters deliver in bursts
+_END_OF_FRAME_POLLS = 4  # Checks of the receive buffer per silent period
+_BUS_POLL_MIN_DELAY: float = 0.001  # seconds, first retry of a busy serial port lock
+_BUS_POLL_MAX_DELAY: float = 0.02  # seconds
 _BITS_PER_BYTE = 8
+_BIT_VALUES = frozenset([0, 1])  # Also matches False and True
+_BIT_VALUES_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_BYTE_TO_BITS = [  # Index: byte value, value: its 8 bits (one per byte), LSB first
+    bytes((bytevalue >> bitposition) & 1 for bitposition in range(_BITS_PER_BYTE))
+    for bytevalue in range(256)
+]
 _ASCII_HEADER = b":"
 _ASCII_FOOTER = b"\r\n"
 _BYTEPOSITION_FOR_ASCII_HEADER = 0  # Relative to plain response
@@ -56,10 +98,25 @@ _BYTEPOSITION_FOR_FUNCTIONCODE = 1  # Relative to (stripped) response
 _BYTEPOSITION_FOR_SLAVE_ERROR_CODE = 2  # Relative to (stripped) response
 _BITNUMBER_FUNCTIONCODE_ERRORINDICATION = 7
 _SLAVEADDRESS_BROADCAST = 0
+_MODBUS_TCP_URL_SCHEME = "tcp://"  # Modbus TCP framing
+_RTU_OVER_TCP_URL_SCHEME = "rtu+tcp://"  # Serial line framing over a TCP connection
+_TCP_DEFAULT_TIMEOUT = 1.0  # seconds, for the gateway and the serial line behind it
+_NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH = 6  # Transaction ID, protocol ID and length
+_RTO_SRTT_GAIN = 0.125  # RFC 6298 alpha
+_RTO_RTTVAR_GAIN = 0.25  # RFC 6298 beta
+_RTO_RTTVAR_FACTOR = 4  # RFC 6298 K
+_TRACE_FILE_MAGIC = b"MMTRACE1"
+_TRACE_RECORD_HEADER = struct.Struct("<dBfH")  # Time, direction, roundtrip, length
+_LATENCY_BUCKET_BOUNDS = [  # seconds, upper bounds: 0.5 ms to 8 s, 4 buckets/octave
+    0.0005 * 2 ** (index / 4) for index in range(57)
+]
 
 # Several instrument instances can share the same serialport
 _serialports: Dict[str, serial.Serial] = {}  # Key: port name, value: port instance
-_latest_read_times: Dict[str, float] = {}  # Key: port name, value: timestamp
+_latest_transaction_ids: Dict[str, int] = {}  # Key: port name, value: Modbus TCP ID
+# Key: port name, or id() of a port without name. Value: arbiter
+_bus_arbiters: Dict[Union[str, int], "BusArbiter"] = {}
+_bus_arbiters_lock = threading.Lock()
 
 # ############### #
 # Named constants #
@@ -69,6 +126,9 @@ MODE_RTU: str = "rtu"
 """Use Modbus RTU communication."""
 MODE_ASCII: str = "ascii"
 """Use Modbus ASCII communication."""
+MODE_TCP: str = "tcp"
+"""Use Modbus TCP communication (MBAP header, no checksum). Set automatically for
+``tcp://`` ports."""
 
 BYTEORDER_BIG: int = 0
 """Use big endian byteorder."""
@@ -79,18 +139,78 @@ BYTEORDER_BIG_SWAP: int = 2
 BYTEORDER_LITTLE_SWAP: int = 3
 """Use litte endian byteorder, with swap."""
 
+PRIORITY_WRITE: int = 0
+"""Priority of interactive writes on a :class:`BusMaster`, the highest."""
+PRIORITY_POLL: int = 1
+"""Priority of periodic polls on a :class:`BusMaster`."""
+PRIORITY_SCAN: int = 2
+"""Priority of background scans on a :class:`BusMaster`, the lowest."""
+_PRIORITY_STOP = 3  # After all the requests
+
+TRACE_REQUEST: int = 0
+"""Direction of a :class:`TraceRecord` of a request, sent to the slave."""
+TRACE_RESPONSE: int = 1
+"""Direction of a :class:`TraceRecord` of a response, received from the slave."""
+
 
 @enum.unique
 class _Payloadformat(enum.Enum):
     BIT = enum.auto()
     BITS = enum.auto()
+    PACKEDBITS = enum.auto()
     FLOAT = enum.auto()
     LONG = enum.auto()
     REGISTER = enum.auto()
     REGISTERS = enum.auto()
+    REGISTERARRAY = enum.auto()
     STRING = enum.auto()
 
 
+class PreparedCommand(NamedTuple):
+    """A command validated once, ready to be executed many times.
+
+    Created by :meth:`Instrument.prepare_read` and :meth:`Instrument.prepare_write`,
+    and executed by :meth:`Instrument.execute`. It is immutable, and holds the
+    finished request frame (including CRC/LRC), so executing it only does the
+    serial port I/O and the response checking.
+    """
+
+    slaveaddress: int
+    """Slave address the request is built for."""
+
+    mode: str
+    """Modbus mode the request is built for."""
+
+    functioncode: int
+    """Modbus function code."""
+
+    request: bytes
+    """The raw request frame."""
+
+    number_of_bytes_to_read: int
+    """Expected response length in bytes (0 for broadcasts)."""
+
+    decoder: Callable[[bytes], Any]
+    """Checks and parses the response payload (bound :func:`_parse_payload`, and
+    :func:`_scale_registers` for :meth:`Instrument.prepare_read_scaled`)."""
+
+
+class TraceRecord(NamedTuple):
+    """A frame recorded by a :class:`TransactionTrace`."""
+
+    timestamp: float
+    """Time of the write or of the end of the read, as given by :func:`time.time`."""
+
+    direction: int
+    """:data:`TRACE_REQUEST` or :data:`TRACE_RESPONSE`."""
+
+    frame: bytes
+    """The raw frame. Empty for a request without response."""
+
+    roundtrip_time: Optional[float]
+    """Seconds from the write of the request, for responses. Else ``None``."""
+
+
 # ######################## #
 # Modbus instrument object #
 # ######################## #
@@ -99,13 +219,16 @@ class _Payloadformat(enum.Enum):
 class Instrument:
     """Instrument class for talking to instruments (slaves).
 
-    Uses the Modbus RTU or ASCII protocols (via RS485 or RS232).
+    Uses the Modbus RTU or ASCII protocols (via RS485 or RS232), or Modbus TCP.
 
     Args:
         * port: The serial port name, for example ``/dev/ttyUSB0`` (Linux),
           ``/dev/tty.usbserial`` (OS X) or ``COM4`` (Windows).
           It is also possible to pass in an already opened ``serial.Serial``
           object (new in version 2.1).
+          For an Ethernet gateway use ``tcp://host:port`` (Modbus TCP, the mode is
+          set to :data:`minimalmodbus.MODE_TCP`) or ``rtu+tcp://host:port`` (the
+          serial line frames sent over a TCP connection).
         * slaveaddress: Slave address in the range 0 to 247.
           Address 0 is for broadcast, and 248-255 are reserved.
         * mode: Mode selection. Can be :data:`minimalmodbus.MODE_RTU` or
@@ -137,9 +260,9 @@ class Instrument:
         """
 
         self.mode = mode
-        """Slave mode (str), can be :data:`minimalmodbus.MODE_RTU` or
-        :data:`minimalmodbus.MODE_ASCII`. Most often set by the constructor (see the
-        class documentation). Defaults to RTU.
+        """Slave mode (str), can be :data:`minimalmodbus.MODE_RTU`,
+        :data:`minimalmodbus.MODE_ASCII` or :data:`minimalmodbus.MODE_TCP`. Most often
+        set by the constructor (see the class documentation). Defaults to RTU.
 
         Changing this will not affect how other instruments use the same serial port.
 
@@ -155,6 +278,19 @@ class Instrument:
         New in version 0.5.
         """
 
+        self.end_frame_on_silence = False
+        """If this is :const:`True`, a Modbus RTU response is considered complete when
+        the line has been silent for 3.5 character times, instead of reading until
+        timeout. Defaults to :const:`False`.
+
+        This is useful when :attr:`precalculate_read_size` is :const:`False`, for
+        function codes with unpredictable response size, and to detect truncated
+        frames. The silent period is at least 20 ms, as USB serial adapters deliver
+        the received bytes in bursts.
+
+        Changing this will not affect how other instruments use the same serial port.
+        """
+
         self.debug = debug
         """Set this to :const:`True` to print the communication details. Defaults to
         :const:`False`.
@@ -194,6 +330,48 @@ class Instrument:
         New in version 0.7.
         """
 
+        self.max_transactions_in_flight = 8
+        """Maximum number of requests sent by :meth:`execute_many` before waiting for
+        their responses, in Modbus TCP mode. Defaults to 8.
+
+        Gateways accept a limited number of concurrent transactions, see their
+        documentation.
+        """
+
+        self.adaptive_timeout: Optional[AdaptiveTimeout] = None
+        """If set to an :class:`AdaptiveTimeout`, the read timeout of each request is
+        computed from the round-trip times observed for the same function code and
+        response size, instead of using the ``timeout`` of the serial port.
+        Defaults to ``None``.
+
+        Not used by :meth:`execute_many` in Modbus TCP mode.
+        """
+
+        self.trace: Optional[TransactionTrace] = None
+        """If set to a :class:`TransactionTrace`, the raw requests and responses are
+        recorded in it. Defaults to ``None``.
+
+        Much cheaper than :attr:`debug`, as nothing is formatted or printed until
+        the trace is read. Several instruments can share the same trace.
+        """
+
+        self.metrics = TransactionMetrics()
+        """Counters and latency histograms of the transactions of this instrument,
+        see :class:`TransactionMetrics`. Read them with its
+        :meth:`~TransactionMetrics.snapshot` method.
+        """
+
+        self.bus_timeout: Optional[float] = 1.0
+        """Maximum time to wait for the serial port to be free, in seconds (float).
+        Defaults to 1.0 s. Set to ``None`` to wait forever.
+
+        The transactions of all the instruments using the same serial port, in this
+        and in other processes, are serialized by the :class:`BusArbiter` of the port.
+        If the port is not free in time, :exc:`BusBusyError` is raised.
+
+        Changing this will not affect how other instruments use the same serial port.
+        """
+
         self.serial: Optional[serial.Serial] = None
         """The serial port object as defined by the pySerial module. Created by the
         constructor.
@@ -211,7 +389,7 @@ class Instrument:
             - stopbits (use STOPBITS_xxx constants):  Number of stopbits. See pySerial.
                 - Defaults to :const:`serial.STOPBITS_ONE`.
             - timeout (float): Read timeout value in seconds.
-                - Defaults to 0.05 s.
+                - Defaults to 0.05 s (1.0 s for TCP connections).
             - write_timeout (float): Write timeout value in seconds.
                 - Defaults to 2.0 s.
         """
@@ -222,15 +400,7 @@ class Instrument:
             port not in _serialports or not _serialports[port]
         ):
             self._print_debug("Create serial port {}".format(port))
-            self.serial = _serialports[port] = serial.Serial(
-                port=port,
-                baudrate=19200,
-                parity=serial.PARITY_NONE,
-                bytesize=8,
-                stopbits=1,
-                timeout=0.05,
-                write_timeout=2.0,
-            )
+            self.serial = _serialports[port] = _create_serial_port(port)
         elif isinstance(port, str):
             self._print_debug("Serial port {} already exists".format(port))
             self.serial = _serialports[port]
@@ -244,6 +414,9 @@ class Instrument:
         if not self.serial.is_open:
             raise MasterReportedException("Failed to open serial port")
 
+        if isinstance(port, str) and port.startswith(_MODBUS_TCP_URL_SCHEME):
+            self.mode = MODE_TCP
+
         if self.close_port_after_each_call:
             self._print_debug("Closing serial port {}".format(port))
             self.serial.close()
@@ -254,7 +427,8 @@ class Instrument:
         """Give string representation of the :class:`.Instrument` object."""
         template = (
             "{}.{}<id=0x{:x}, address={}, mode={}, close_port_after_each_call={}, "
-            + "precalculate_read_size={}, clear_buffers_before_each_transaction={}, "
+            + "precalculate_read_size={}, end_frame_on_silence={}, "
+            + "clear_buffers_before_each_transaction={}, "
             + "handle_local_echo={}, debug={}, serial={}>"
         )
         return template.format(
@@ -265,6 +439,7 @@ class Instrument:
             self.mode,
             self.close_port_after_each_call,
             self.precalculate_read_size,
+            self.end_frame_on_silence,
             self.clear_buffers_before_each_transaction,
             self.handle_local_echo,
             self.debug,
@@ -289,6 +464,21 @@ class Instrument:
         """
         return self._latest_roundtrip_time
 
+    @property
+    def bus_arbiter(self) -> "BusArbiter":
+        """The :class:`BusArbiter` of the serial port, with its contention metrics.
+        Read only.
+        """
+        assert self.serial is not None
+        return _get_bus_arbiter(self.serial)
+
+    @property
+    def bus_timing(self) -> "BusTiming":
+        """The :class:`BusTiming` of the serial port, with the delays between
+        transactions. Read only.
+        """
+        return self.bus_arbiter.timing
+
     def _print_debug(self, text: str) -> None:
         if self.debug:
             print("MinimalModbus debug mode. " + text)
@@ -313,15 +503,7 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [1, 2])
-        return int(
-            self._generic_command(
-                functioncode,
-                registeraddress,
-                number_of_bits=1,
-                payloadformat=_Payloadformat.BIT,
-            )
-        )
+        return int(self.execute(self._prepare_read_bit(registeraddress, functioncode)))
 
     def write_bit(
         self, registeraddress: int, value: int, functioncode: int = 5
@@ -339,19 +521,15 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [5, 15])
-        _check_int(value, minvalue=0, maxvalue=1, description="input value")
-        self._generic_command(
-            functioncode,
-            registeraddress,
-            value,
-            number_of_bits=1,
-            payloadformat=_Payloadformat.BIT,
-        )
+        self.execute(self._prepare_write_bit(registeraddress, value, functioncode))
 
     def read_bits(
-        self, registeraddress: int, number_of_bits: int, functioncode: int = 2
-    ) -> List[int]:
+        self,
+        registeraddress: int,
+        number_of_bits: int,
+        functioncode: int = 2,
+        packed: bool = False,
+    ) -> Union[List[int], int]:
         """Read multiple bits from the slave (instrument).
 
         This is for bits that have individual addresses in the instrument.
@@ -360,28 +538,29 @@ class Instrument:
             * registeraddress: The slave register start address.
             * number_of_bits: Number of bits to read
             * functioncode: Modbus function code. Can be 1 or 2.
+            * packed: If :const:`True`, return the bits packed in an integer.
 
         Returns:
             A list of bit values 0 or 1. The first value in the list is for
             the bit at the given address.
 
+            If *packed* is :const:`True`, an integer where bit 0 (the LSB) is
+            the bit at the given address, bit 1 the bit at the next address
+            and so on. Use it to test many status flags with bit masks,
+            without building a list.
+
         Raises:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [1, 2])
-        _check_int(
-            number_of_bits,
-            minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_BITS_TO_READ,
-            description="number of bits",
-        )
-        returnvalue = self._generic_command(
-            functioncode,
-            registeraddress,
-            number_of_bits=number_of_bits,
-            payloadformat=_Payloadformat.BITS,
+        command = self._prepare_read_bits(
+            registeraddress, number_of_bits, functioncode, packed
         )
+        returnvalue = self.execute(command)
+        if packed:
+            assert isinstance(returnvalue, int)
+            return returnvalue
+
         # Make sure that we really return a list of integers
         assert isinstance(returnvalue, list)
         return [int(x) for x in returnvalue]
@@ -402,25 +581,7 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        if not isinstance(values, list):
-            raise TypeError(
-                'The "values parameter" must be a list. Given: {0!r}'.format(values)
-            )
-        # Note: The content of the list is checked at content conversion.
-        _check_int(
-            len(values),
-            minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_BITS_TO_WRITE,
-            description="length of input list",
-        )
-
-        self._generic_command(
-            15,
-            registeraddress,
-            values,
-            number_of_bits=len(values),
-            payloadformat=_Payloadformat.BITS,
-        )
+        self.execute(self._prepare_write_bits(registeraddress, values))
 
     def read_register(
         self,
@@ -473,25 +634,11 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [3, 4])
-        _check_int(
-            number_of_decimals,
-            minvalue=0,
-            maxvalue=_MAX_NUMBER_OF_DECIMALS,
-            description="number of decimals",
-        )
-        _check_bool(signed, description="signed")
-        returnvalue = self._generic_command(
-            functioncode,
-            registeraddress,
-            number_of_decimals=number_of_decimals,
-            number_of_registers=1,
-            signed=signed,
-            payloadformat=_Payloadformat.REGISTER,
+        return self.execute(
+            self._prepare_read_register(
+                registeraddress, number_of_decimals, functioncode, signed
+            )
         )
-        if int(returnvalue) == returnvalue:
-            return int(returnvalue)
-        return float(returnvalue)
 
     def write_register(
         self,
@@ -539,24 +686,10 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [6, 16])
-        _check_int(
-            number_of_decimals,
-            minvalue=0,
-            maxvalue=_MAX_NUMBER_OF_DECIMALS,
-            description="number of decimals",
-        )
-        _check_bool(signed, description="signed")
-        _check_numerical(value, description="input value")
-
-        self._generic_command(
-            functioncode,
-            registeraddress,
-            value,
-            number_of_decimals=number_of_decimals,
-            number_of_registers=1,
-            signed=signed,
-            payloadformat=_Payloadformat.REGISTER,
+        self.execute(
+            self._prepare_write_register(
+                registeraddress, value, number_of_decimals, functioncode, signed
+            )
         )
 
     def read_long(
@@ -599,22 +732,15 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [3, 4])
-        _check_bool(signed, description="signed")
-        _check_int(
-            number_of_registers,
-            minvalue=2,
-            maxvalue=4,
-            description="number of registers",
-        )
         return int(
-            self._generic_command(
-                functioncode,
-                registeraddress,
-                number_of_registers=number_of_registers,
-                signed=signed,
-                byteorder=byteorder,
-                payloadformat=_Payloadformat.LONG,
+            self.execute(
+                self._prepare_read_long(
+                    registeraddress,
+                    functioncode,
+                    signed,
+                    byteorder,
+                    number_of_registers,
+                )
             )
         )
 
@@ -650,40 +776,10 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        MAX_VALUE_LONG = 4294967295  # Unsigned INT32
-        MIN_VALUE_LONG = -2147483648  # INT32
-        MAX_VALUE_LONG_LONG = 18446744073709551615  # Unsigned INT64
-        MIN_VALUE_LONG_LONG = -9223372036854775808  # INT64
-
-        _check_int(
-            number_of_registers,
-            minvalue=2,
-            maxvalue=4,
-            description="number of registers",
-        )
-        if number_of_registers == 2:
-            _check_int(
-                value,
-                minvalue=MIN_VALUE_LONG,
-                maxvalue=MAX_VALUE_LONG,
-                description="input value",
-            )
-        elif number_of_registers == 4:
-            _check_int(
-                value,
-                minvalue=MIN_VALUE_LONG_LONG,
-                maxvalue=MAX_VALUE_LONG_LONG,
-                description="input value",
+        self.execute(
+            self._prepare_write_long(
+                registeraddress, value, signed, byteorder, number_of_registers
             )
-        _check_bool(signed, description="signed")
-        self._generic_command(
-            16,
-            registeraddress,
-            value,
-            number_of_registers=number_of_registers,
-            signed=signed,
-            byteorder=byteorder,
-            payloadformat=_Payloadformat.LONG,
         )
 
     def read_float(
@@ -731,20 +827,11 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [3, 4])
-        _check_int(
-            number_of_registers,
-            minvalue=2,
-            maxvalue=4,
-            description="number of registers",
-        )
         return float(
-            self._generic_command(
-                functioncode,
-                registeraddress,
-                number_of_registers=number_of_registers,
-                byteorder=byteorder,
-                payloadformat=_Payloadformat.FLOAT,
+            self.execute(
+                self._prepare_read_float(
+                    registeraddress, functioncode, number_of_registers, byteorder
+                )
             )
         )
 
@@ -780,20 +867,10 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_numerical(value, description="input value")
-        _check_int(
-            number_of_registers,
-            minvalue=2,
-            maxvalue=4,
-            description="number of registers",
-        )
-        self._generic_command(
-            16,
-            registeraddress,
-            value,
-            number_of_registers=number_of_registers,
-            byteorder=byteorder,
-            payloadformat=_Payloadformat.FLOAT,
+        self.execute(
+            self._prepare_write_float(
+                registeraddress, value, number_of_registers, byteorder
+            )
         )
 
     def read_string(
@@ -822,19 +899,11 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [3, 4])
-        _check_int(
-            number_of_registers,
-            minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
-            description="number of registers for read string",
-        )
         return str(
-            self._generic_command(
-                functioncode,
-                registeraddress,
-                number_of_registers=number_of_registers,
-                payloadformat=_Payloadformat.STRING,
+            self.execute(
+                self._prepare_read_string(
+                    registeraddress, number_of_registers, functioncode
+                )
             )
         )
 
@@ -869,30 +938,17 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_int(
-            number_of_registers,
-            minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_WRITE,
-            description="number of registers for write string",
-        )
-        _check_string(
-            textstring,
-            "input string",
-            minlength=1,
-            maxlength=2 * number_of_registers,
-            force_ascii=True,
-        )
-        self._generic_command(
-            16,
-            registeraddress,
-            textstring,
-            number_of_registers=number_of_registers,
-            payloadformat=_Payloadformat.STRING,
+        self.execute(
+            self._prepare_write_string(registeraddress, textstring, number_of_registers)
         )
 
     def read_registers(
-        self, registeraddress: int, number_of_registers: int, functioncode: int = 3
-    ) -> List[int]:
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        functioncode: int = 3,
+        as_array: bool = False,
+    ) -> Union[List[int], "array.array[int]"]:
         """Read integers from 16-bit registers in the slave.
 
         The slave registers can hold integer values in the range 0 to
@@ -902,6 +958,8 @@ class Instrument:
             * registeraddress: The slave register start address.
             * number_of_registers: The number of registers to read, max 125 registers.
             * functioncode: Modbus function code. Can be 3 or 4.
+            * as_array: Return an :class:`array.array` of type ``'H'`` instead
+              of a list. This avoids creating one Python int object per register.
 
         .. note:: The parameter number_of_registers was named numberOfRegisters
                   before MinimalModbus 1.0
@@ -917,30 +975,73 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
-        _check_functioncode(functioncode, [3, 4])
-        _check_int(
-            number_of_registers,
-            minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
-            description="number of registers",
-        )
-        returnvalue = self._generic_command(
-            functioncode,
-            registeraddress,
-            number_of_registers=number_of_registers,
-            payloadformat=_Payloadformat.REGISTERS,
+        returnvalue = self.execute(
+            self._prepare_read_registers(
+                registeraddress, number_of_registers, functioncode, as_array
+            )
         )
-        # Make sure that we really return a list of integers
-        assert isinstance(returnvalue, list)
-        return [int(x) for x in returnvalue]
-
-    def write_registers(self, registeraddress: int, values: List[int]) -> None:
-        """Write integers to 16-bit registers in the slave.
+        # Make sure that we really return a list (or array) of integers
+        assert isinstance(returnvalue, (list, array.array))
+        return returnvalue
 
-        The slave register can hold integer values in the range 0 to
-        65535 ("Unsigned INT16").
+    def read_registers_scaled(
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        scale: Union[float, List[float], Tuple[float, ...]] = 1.0,
+        offset: Union[float, List[float], Tuple[float, ...]] = 0.0,
+        signed: bool = False,
+        functioncode: int = 3,
+        as_numpy: bool = False,
+    ) -> Any:
+        """Read 16-bit registers in the slave, and scale them to floats.
 
-        Uses Modbus function code 16.
+        Each register is converted to ``value * scale + offset``, in one pass over
+        the response, without building an intermediate list of integers.
+
+        Args:
+            * registeraddress: The slave register start address.
+            * number_of_registers: The number of registers to read, max 125 registers.
+            * scale: Factor for all the registers, or a list with one factor per
+              register.
+            * offset: Added after scaling, for all the registers, or a list with one
+              offset per register.
+            * signed: Whether the registers hold signed INT16 values (two's
+              complement) instead of unsigned INT16.
+            * functioncode: Modbus function code. Can be 3 or 4.
+            * as_numpy: Return a :class:`numpy.ndarray` of float64, computed by
+              NumPy. NumPy is imported at the first use, and only then required.
+
+        Returns:
+            A list of floats (or a NumPy array). The first value is for the
+            register at the given address.
+
+        For example a temperature stored as half degrees with 60 = 0 °C is read
+        with ``scale=0.5, offset=-30``.
+
+        Raises:
+            TypeError, ValueError, ImportError, ModbusException,
+            serial.SerialException (inherited from IOError)
+        """
+        return self.execute(
+            self.prepare_read_scaled(
+                registeraddress,
+                number_of_registers,
+                scale,
+                offset,
+                signed,
+                functioncode,
+                as_numpy,
+            )
+        )
+
+    def write_registers(self, registeraddress: int, values: List[int]) -> None:
+        """Write integers to 16-bit registers in the slave.
+
+        The slave register can hold integer values in the range 0 to
+        65535 ("Unsigned INT16").
+
+        Uses Modbus function code 16.
 
         The number of registers that will be written is defined by the length of
         the ``values`` list.
@@ -961,149 +1062,768 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
         """
+        self.execute(self._prepare_write_registers(registeraddress, values))
+
+    # ############################################ #
+    # Commands of the methods talking to the slave #
+    # ############################################ #
+
+    def _prepare_read_bit(
+        self, registeraddress: int, functioncode: int = 2
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_bit`."""
+        _check_functioncode(functioncode, [1, 2])
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_bits=1,
+            payloadformat=_Payloadformat.BIT,
+        )
+
+    def _prepare_write_bit(
+        self, registeraddress: int, value: int, functioncode: int = 5
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_bit`."""
+        _check_functioncode(functioncode, [5, 15])
+        _check_int(value, minvalue=0, maxvalue=1, description="input value")
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            value,
+            number_of_bits=1,
+            payloadformat=_Payloadformat.BIT,
+        )
+
+    def _prepare_read_bits(
+        self,
+        registeraddress: int,
+        number_of_bits: int,
+        functioncode: int = 2,
+        packed: bool = False,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_bits`."""
+        _check_functioncode(functioncode, [1, 2])
+        _check_int(
+            number_of_bits,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_BITS_TO_READ,
+            description="number of bits",
+        )
+        _check_bool(packed, description="packed")
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_bits=number_of_bits,
+            payloadformat=_Payloadformat.PACKEDBITS if packed else _Payloadformat.BITS,
+        )
+
+    def _prepare_write_bits(
+        self, registeraddress: int, values: List[int]
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_bits`."""
         if not isinstance(values, list):
             raise TypeError(
                 'The "values parameter" must be a list. Given: {0!r}'.format(values)
             )
+        # Note: The content of the list is checked at content conversion.
         _check_int(
             len(values),
             minvalue=1,
-            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_WRITE,
+            maxvalue=_MAX_NUMBER_OF_BITS_TO_WRITE,
             description="length of input list",
         )
-        # Note: The content of the list is checked at content conversion.
-
-        self._generic_command(
-            16,
+        return self._prepare_command(
+            15,
             registeraddress,
             values,
-            number_of_registers=len(values),
-            payloadformat=_Payloadformat.REGISTERS,
+            number_of_bits=len(values),
+            payloadformat=_Payloadformat.BITS,
         )
 
-    # ############### #
-    # Generic command #
-    # ############### #
-
-    def _generic_command(
+    def _prepare_read_register(
         self,
-        functioncode: int,
         registeraddress: int,
-        value: Union[None, str, int, float, List[int]] = None,
         number_of_decimals: int = 0,
-        number_of_registers: int = 0,
-        number_of_bits: int = 0,
+        functioncode: int = 3,
         signed: bool = False,
-        byteorder: int = BYTEORDER_BIG,
-        payloadformat: _Payloadformat = _Payloadformat.REGISTER,
-    ) -> Any:
-        """Perform generic command for reading and writing registers and bits.
-
-        Args:
-            * functioncode: Modbus function code.
-            * registeraddress: The register address.
-            * value (numerical or string or None or list of int): The value to store
-              in the register. Depends on payloadformat.
-            * number_of_decimals: The number of decimals for content conversion.
-              Only for a single register.
-            * number_of_registers: The number of registers to read/write.
-              Only certain values allowed, depends on payloadformat.
-            * number_of_bits: The number of bits to read/write.
-            * signed: Whether the data should be interpreted as unsigned or signed.
-              Only for a single register or for payloadformat='long'.
-            * byteorder: How multi-register data should be interpreted.
-            * payloadformat: An _Payloadformat enum
-
-        If a value of 77.0 is stored internally in the slave register as 770,
-        then use ``number_of_decimals=1`` which will divide the received data
-        from the slave by 10 before returning the value. Similarly
-        ``number_of_decimals=2`` will divide the received data by 100 before returning
-        the value. Same functionality is also used when writing data to the slave.
-
-        Returns:
-            The register data in numerical value (int or float), or the bit value 0 or
-            1 (int), or a list of int, or ``None``.
-
-            Returns ``None`` for all write function codes.
-
-        Raises:
-            TypeError, ValueError, ModbusException,
-            serial.SerialException (inherited from IOError)
-        """
-        ALL_ALLOWED_FUNCTIONCODES = [1, 2, 3, 4, 5, 6, 15, 16]
-        ALLOWED_FUNCTIONCODES_BROADCAST = [5, 6, 15, 16]
-        ALLOWED_FUNCTIONCODES = {}
-        ALLOWED_FUNCTIONCODES[_Payloadformat.BIT] = [1, 2, 5, 15]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.BITS] = [1, 2, 15]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.REGISTER] = [3, 4, 6, 16]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.FLOAT] = [3, 4, 16]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.STRING] = [3, 4, 16]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.LONG] = [3, 4, 16]
-        ALLOWED_FUNCTIONCODES[_Payloadformat.REGISTERS] = [3, 4, 16]
-
-        # Check input values
-        _check_functioncode(functioncode, ALL_ALLOWED_FUNCTIONCODES)
-        _check_registeraddress(registeraddress)
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_register`."""
+        _check_functioncode(functioncode, [3, 4])
         _check_int(
             number_of_decimals,
             minvalue=0,
             maxvalue=_MAX_NUMBER_OF_DECIMALS,
             description="number of decimals",
         )
-        _check_int(
-            number_of_registers,
-            minvalue=0,
-            maxvalue=max(
-                _MAX_NUMBER_OF_REGISTERS_TO_READ, _MAX_NUMBER_OF_REGISTERS_TO_WRITE
-            ),
-            description="number of registers",
+        _check_bool(signed, description="signed")
+        command = self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_decimals=number_of_decimals,
+            number_of_registers=1,
+            signed=signed,
+            payloadformat=_Payloadformat.REGISTER,
+        )
+        return command._replace(
+            decoder=functools.partial(_decode_register, command.decoder)
         )
+
+    def _prepare_write_register(
+        self,
+        registeraddress: int,
+        value: Union[int, float],
+        number_of_decimals: int = 0,
+        functioncode: int = 16,
+        signed: bool = False,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_register`."""
+        _check_functioncode(functioncode, [6, 16])
         _check_int(
-            number_of_bits,
+            number_of_decimals,
             minvalue=0,
-            maxvalue=max(_MAX_NUMBER_OF_BITS_TO_READ, _MAX_NUMBER_OF_BITS_TO_WRITE),
-            description="number of bits",
+            maxvalue=_MAX_NUMBER_OF_DECIMALS,
+            description="number of decimals",
         )
         _check_bool(signed, description="signed")
-        _check_int(
-            byteorder,
-            minvalue=0,
-            maxvalue=_MAX_BYTEORDER_VALUE,
-            description="byteorder",
+        _check_numerical(value, description="input value")
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            value,
+            number_of_decimals=number_of_decimals,
+            number_of_registers=1,
+            signed=signed,
+            payloadformat=_Payloadformat.REGISTER,
         )
 
-        if not isinstance(payloadformat, _Payloadformat):
-            raise TypeError(
-                "The payload format should be an enum of type _Payloadformat. "
-                + "Given: {!r}".format(payloadformat)
-            )
+    def _prepare_read_long(
+        self,
+        registeraddress: int,
+        functioncode: int = 3,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        number_of_registers: int = 2,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_long`."""
+        _check_functioncode(functioncode, [3, 4])
+        _check_bool(signed, description="signed")
+        _check_int(
+            number_of_registers,
+            minvalue=2,
+            maxvalue=4,
+            description="number of registers",
+        )
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            signed=signed,
+            byteorder=byteorder,
+            payloadformat=_Payloadformat.LONG,
+        )
 
-        number_of_register_bytes = number_of_registers * _NUMBER_OF_BYTES_PER_REGISTER
+    def _prepare_write_long(
+        self,
+        registeraddress: int,
+        value: int,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        number_of_registers: int = 2,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_long`."""
+        MAX_VALUE_LONG = 4294967295  # Unsigned INT32
+        MIN_VALUE_LONG = -2147483648  # INT32
+        MAX_VALUE_LONG_LONG = 18446744073709551615  # Unsigned INT64
+        MIN_VALUE_LONG_LONG = -9223372036854775808  # INT64
 
-        # Check combinations: Payload format and functioncode
-        if functioncode not in ALLOWED_FUNCTIONCODES[payloadformat]:
-            raise ValueError(
-                "Wrong functioncode for payloadformat "
-                + "{!r}. Given: {!r}.".format(payloadformat, functioncode)
+        _check_int(
+            number_of_registers,
+            minvalue=2,
+            maxvalue=4,
+            description="number of registers",
+        )
+        if number_of_registers == 2:
+            _check_int(
+                value,
+                minvalue=MIN_VALUE_LONG,
+                maxvalue=MAX_VALUE_LONG,
+                description="input value",
             )
-
-        # Check combinations: Broadcast and functioncode
-        if (
-            self.address == _SLAVEADDRESS_BROADCAST
-            and functioncode not in ALLOWED_FUNCTIONCODES_BROADCAST
-        ):
-            raise ValueError(
-                f"Wrong functioncode for broadcast. Given: {functioncode!r}"
+        elif number_of_registers == 4:
+            _check_int(
+                value,
+                minvalue=MIN_VALUE_LONG_LONG,
+                maxvalue=MAX_VALUE_LONG_LONG,
+                description="input value",
             )
+        _check_bool(signed, description="signed")
+        return self._prepare_command(
+            16,
+            registeraddress,
+            value,
+            number_of_registers=number_of_registers,
+            signed=signed,
+            byteorder=byteorder,
+            payloadformat=_Payloadformat.LONG,
+        )
+
+    def _prepare_read_float(
+        self,
+        registeraddress: int,
+        functioncode: int = 3,
+        number_of_registers: int = 2,
+        byteorder: int = BYTEORDER_BIG,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_float`."""
+        _check_functioncode(functioncode, [3, 4])
+        _check_int(
+            number_of_registers,
+            minvalue=2,
+            maxvalue=4,
+            description="number of registers",
+        )
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            byteorder=byteorder,
+            payloadformat=_Payloadformat.FLOAT,
+        )
+
+    def _prepare_write_float(
+        self,
+        registeraddress: int,
+        value: Union[int, float],
+        number_of_registers: int = 2,
+        byteorder: int = BYTEORDER_BIG,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_float`."""
+        _check_numerical(value, description="input value")
+        _check_int(
+            number_of_registers,
+            minvalue=2,
+            maxvalue=4,
+            description="number of registers",
+        )
+        return self._prepare_command(
+            16,
+            registeraddress,
+            value,
+            number_of_registers=number_of_registers,
+            byteorder=byteorder,
+            payloadformat=_Payloadformat.FLOAT,
+        )
+
+    def _prepare_read_string(
+        self, registeraddress: int, number_of_registers: int = 16, functioncode: int = 3
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_string`."""
+        _check_functioncode(functioncode, [3, 4])
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
+            description="number of registers for read string",
+        )
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            payloadformat=_Payloadformat.STRING,
+        )
+
+    def _prepare_write_string(
+        self, registeraddress: int, textstring: str, number_of_registers: int = 16
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_string`."""
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_WRITE,
+            description="number of registers for write string",
+        )
+        _check_string(
+            textstring,
+            "input string",
+            minlength=1,
+            maxlength=2 * number_of_registers,
+            force_ascii=True,
+        )
+        return self._prepare_command(
+            16,
+            registeraddress,
+            textstring,
+            number_of_registers=number_of_registers,
+            payloadformat=_Payloadformat.STRING,
+        )
+
+    def _prepare_read_registers(
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        functioncode: int = 3,
+        as_array: bool = False,
+    ) -> PreparedCommand:
+        """Build the command of :meth:`read_registers`."""
+        _check_functioncode(functioncode, [3, 4])
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
+            description="number of registers",
+        )
+        _check_bool(as_array, description="as_array")
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            payloadformat=_Payloadformat.REGISTERARRAY
+            if as_array
+            else _Payloadformat.REGISTERS,
+        )
+
+    def _prepare_write_registers(
+        self, registeraddress: int, values: List[int]
+    ) -> PreparedCommand:
+        """Build the command of :meth:`write_registers`."""
+        if not isinstance(values, list):
+            raise TypeError(
+                'The "values parameter" must be a list. Given: {0!r}'.format(values)
+            )
+        _check_int(
+            len(values),
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_WRITE,
+            description="length of input list",
+        )
+        # Note: The content of the list is checked at content conversion.
+        return self._prepare_command(
+            16,
+            registeraddress,
+            values,
+            number_of_registers=len(values),
+            payloadformat=_Payloadformat.REGISTERS,
+        )
+
+    # ################# #
+    # Prepared commands #
+    # ################# #
+
+    def prepare_read(
+        self, registeraddress: int, number_of_registers: int, functioncode: int = 3
+    ) -> PreparedCommand:
+        """Prepare a command reading integers from 16-bit registers in the slave.
+
+        All the validation and the building of the request is done here, once.
+        Execute the command with :meth:`execute`, which returns the same as
+        :meth:`read_registers`.
+
+        Args:
+            * registeraddress: The slave register start address.
+            * number_of_registers: The number of registers to read, max 125 registers.
+            * functioncode: Modbus function code. Can be 3 or 4.
+
+        Returns:
+            The prepared command.
+
+        Raises:
+            TypeError, ValueError
+        """
+        _check_functioncode(functioncode, [3, 4])
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
+            description="number of registers",
+        )
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            payloadformat=_Payloadformat.REGISTERS,
+        )
+
+    def prepare_read_scaled(
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        scale: Union[float, List[float], Tuple[float, ...]] = 1.0,
+        offset: Union[float, List[float], Tuple[float, ...]] = 0.0,
+        signed: bool = False,
+        functioncode: int = 3,
+        as_numpy: bool = False,
+    ) -> PreparedCommand:
+        """Prepare a command reading 16-bit registers in the slave, scaled to floats.
+
+        Execute the command with :meth:`execute`, which returns the same as
+        :meth:`read_registers_scaled`. For argument descriptions, see that method.
+
+        Returns:
+            The prepared command.
+
+        Raises:
+            TypeError, ValueError, ImportError
+        """
+        _check_functioncode(functioncode, [3, 4])
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
+            description="number of registers",
+        )
+        scale = _normalize_scaling(scale, number_of_registers, "scale")
+        offset = _normalize_scaling(offset, number_of_registers, "offset")
+        _check_bool(signed, description="signed")
+        _check_bool(as_numpy, description="as_numpy")
+        if as_numpy:
+            _import_numpy()  # Fail now, not at each execution
+        command = self._prepare_command(
+            functioncode,
+            registeraddress,
+            number_of_registers=number_of_registers,
+            payloadformat=_Payloadformat.REGISTERARRAY,
+        )
+        return command._replace(
+            decoder=functools.partial(
+                _decode_scaled_registers,
+                command.decoder,
+                scale=scale,
+                offset=offset,
+                signed=signed,
+                as_numpy=as_numpy,
+            )
+        )
+
+    def prepare_write(
+        self, registeraddress: int, values: List[int], functioncode: int = 16
+    ) -> PreparedCommand:
+        """Prepare a command writing integers to 16-bit registers in the slave.
+
+        All the validation and the building of the request is done here, once.
+        Execute the command with :meth:`execute`, which returns ``None``.
+
+        Args:
+            * registeraddress: The slave register start address.
+            * values: The values to store in the slave registers, max 123 values.
+            * functioncode: Modbus function code. Can be 6 (then ``values`` must
+              have a single element) or 16.
+
+        Returns:
+            The prepared command.
+
+        Raises:
+            TypeError, ValueError
+        """
+        _check_functioncode(functioncode, [6, 16])
+        if not isinstance(values, list):
+            raise TypeError(
+                'The "values parameter" must be a list. Given: {0!r}'.format(values)
+            )
+        _check_int(
+            len(values),
+            minvalue=1,
+            maxvalue=1 if functioncode == 6 else _MAX_NUMBER_OF_REGISTERS_TO_WRITE,
+            description="length of input list",
+        )
+        if functioncode == 6:
+            return self._prepare_command(
+                functioncode,
+                registeraddress,
+                values[0],
+                number_of_registers=1,
+                payloadformat=_Payloadformat.REGISTER,
+            )
+        return self._prepare_command(
+            functioncode,
+            registeraddress,
+            list(values),
+            number_of_registers=len(values),
+            payloadformat=_Payloadformat.REGISTERS,
+        )
+
+    def execute(self, command: PreparedCommand) -> Any:
+        """Execute a prepared command.
+
+        Args:
+            * command: Created by :meth:`prepare_read` or :meth:`prepare_write`
+              of an instrument with the same slave address and mode.
+
+        Returns:
+            The parsed response, or ``None`` for write commands and broadcasts.
+
+        Raises:
+            ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+        """
+        self._check_command(command)
+        response_bytes = self._communicate(
+            command.request, command.number_of_bytes_to_read
+        )
+
+        # There is no response for broadcasts
+        if command.number_of_bytes_to_read == 0:
+            return None
+
+        return self._decode_response(command, response_bytes)
+
+    def execute_many(
+        self, commands: List[PreparedCommand], return_exceptions: bool = False
+    ) -> List[Any]:
+        """Execute several prepared commands.
+
+        In Modbus TCP mode up to :attr:`max_transactions_in_flight` requests are
+        sent before waiting for the responses, which are matched to the requests by
+        their transaction IDs. So the network and gateway latency is paid once for
+        several commands. In the other modes the commands are executed one after the
+        other.
+
+        Args:
+            * commands: Created by :meth:`prepare_read` or :meth:`prepare_write`
+              of an instrument with the same slave address and mode.
+            * return_exceptions: If :const:`True`, the exception raised by a
+              command is returned in its place in the list, and the other commands
+              are still executed.
+
+        Returns:
+            The list of the results of :meth:`execute`, in the order of *commands*.
+
+        Raises:
+            ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+        """
+        for command in commands:
+            self._check_command(command)
+
+        if self.mode == MODE_TCP:
+            responses: List[Union[bytes, Exception, None]] = list(
+                self._communicate_pipelined(
+                    [
+                        (command.request, command.number_of_bytes_to_read)
+                        for command in commands
+                    ]
+                )
+            )
+        else:
+            responses = [None] * len(commands)
+
+        results: List[Any] = []
+        for command, response in zip(commands, responses):
+            try:
+                if response is None:
+                    results.append(self.execute(command))
+                elif isinstance(response, Exception):
+                    raise response
+                elif command.number_of_bytes_to_read == 0:
+                    results.append(None)
+                else:
+                    results.append(self._decode_response(command, response))
+            except Exception as exc:
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+        return results
+
+    def _decode_response(self, command: PreparedCommand, response: bytes) -> Any:
+        """Check the response to a prepared command, and decode it.
+
+        Args:
+            * command: The executed command.
+            * response: The raw response from the slave.
+
+        Returns:
+            The parsed response.
+
+        Raises:
+            ModbusException
+
+        Invalid responses and slave exceptions are counted in :attr:`metrics`.
+        """
+        try:
+            payload_from_slave = _extract_payload(
+                response, command.slaveaddress, command.mode, command.functioncode
+            )
+            return command.decoder(payload_from_slave)
+        except ModbusException as exc:
+            self.metrics._record_error(exc)
+            raise
+
+    def _check_command(self, command: PreparedCommand) -> None:
+        """Check that a prepared command matches the slave address and mode.
+
+        Raises:
+            ValueError
+        """
+        if command.slaveaddress != self.address or command.mode != self.mode:
+            raise ValueError(
+                "The command is prepared for slave address {} in {} mode, ".format(
+                    command.slaveaddress, command.mode
+                )
+                + "but the instrument has address {} and {} mode.".format(
+                    self.address, self.mode
+                )
+            )
+
+    # ############### #
+    # Generic command #
+    # ############### #
+
+    def _generic_command(
+        self,
+        functioncode: int,
+        registeraddress: int,
+        value: Union[None, str, int, float, List[int]] = None,
+        number_of_decimals: int = 0,
+        number_of_registers: int = 0,
+        number_of_bits: int = 0,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        payloadformat: _Payloadformat = _Payloadformat.REGISTER,
+    ) -> Any:
+        """Perform generic command for reading and writing registers and bits.
+
+        Args:
+            * functioncode: Modbus function code.
+            * registeraddress: The register address.
+            * value (numerical or string or None or list of int): The value to store
+              in the register. Depends on payloadformat.
+            * number_of_decimals: The number of decimals for content conversion.
+              Only for a single register.
+            * number_of_registers: The number of registers to read/write.
+              Only certain values allowed, depends on payloadformat.
+            * number_of_bits: The number of bits to read/write.
+            * signed: Whether the data should be interpreted as unsigned or signed.
+              Only for a single register or for payloadformat='long'.
+            * byteorder: How multi-register data should be interpreted.
+            * payloadformat: An _Payloadformat enum
+
+        If a value of 77.0 is stored internally in the slave register as 770,
+        then use ``number_of_decimals=1`` which will divide the received data
+        from the slave by 10 before returning the value. Similarly
+        ``number_of_decimals=2`` will divide the received data by 100 before returning
+        the value. Same functionality is also used when writing data to the slave.
+
+        Returns:
+            The register data in numerical value (int or float), or the bit value 0 or
+            1 (int), or a list of int, or ``None``.
+
+            Returns ``None`` for all write function codes.
+
+        Raises:
+            TypeError, ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+        """
+        return self.execute(
+            self._prepare_command(
+                functioncode,
+                registeraddress,
+                value,
+                number_of_decimals,
+                number_of_registers,
+                number_of_bits,
+                signed,
+                byteorder,
+                payloadformat,
+            )
+        )
+
+    def _prepare_command(
+        self,
+        functioncode: int,
+        registeraddress: int,
+        value: Union[None, str, int, float, List[int]] = None,
+        number_of_decimals: int = 0,
+        number_of_registers: int = 0,
+        number_of_bits: int = 0,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        payloadformat: _Payloadformat = _Payloadformat.REGISTER,
+    ) -> "PreparedCommand":
+        """Validate a generic command and build the request, without any I/O.
+
+        For argument descriptions, see the :meth:`_generic_command` method.
+
+        Returns:
+            A :class:`PreparedCommand` to be executed by :meth:`execute`.
+
+        Raises:
+            TypeError, ValueError
+        """
+        ALL_ALLOWED_FUNCTIONCODES = [1, 2, 3, 4, 5, 6, 15, 16]
+        ALLOWED_FUNCTIONCODES_BROADCAST = [5, 6, 15, 16]
+        ALLOWED_FUNCTIONCODES = {}
+        ALLOWED_FUNCTIONCODES[_Payloadformat.BIT] = [1, 2, 5, 15]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.BITS] = [1, 2, 15]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.PACKEDBITS] = [1, 2]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.REGISTER] = [3, 4, 6, 16]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.FLOAT] = [3, 4, 16]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.STRING] = [3, 4, 16]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.LONG] = [3, 4, 16]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.REGISTERS] = [3, 4, 16]
+        ALLOWED_FUNCTIONCODES[_Payloadformat.REGISTERARRAY] = [3, 4]
+
+        # Check input values
+        _check_functioncode(functioncode, ALL_ALLOWED_FUNCTIONCODES)
+        _check_registeraddress(registeraddress)
+        _check_int(
+            number_of_decimals,
+            minvalue=0,
+            maxvalue=_MAX_NUMBER_OF_DECIMALS,
+            description="number of decimals",
+        )
+        _check_int(
+            number_of_registers,
+            minvalue=0,
+            maxvalue=max(
+                _MAX_NUMBER_OF_REGISTERS_TO_READ, _MAX_NUMBER_OF_REGISTERS_TO_WRITE
+            ),
+            description="number of registers",
+        )
+        _check_int(
+            number_of_bits,
+            minvalue=0,
+            maxvalue=max(_MAX_NUMBER_OF_BITS_TO_READ, _MAX_NUMBER_OF_BITS_TO_WRITE),
+            description="number of bits",
+        )
+        _check_bool(signed, description="signed")
+        _check_int(
+            byteorder,
+            minvalue=0,
+            maxvalue=_MAX_BYTEORDER_VALUE,
+            description="byteorder",
+        )
+
+        if not isinstance(payloadformat, _Payloadformat):
+            raise TypeError(
+                "The payload format should be an enum of type _Payloadformat. "
+                + "Given: {!r}".format(payloadformat)
+            )
+
+        number_of_register_bytes = number_of_registers * _NUMBER_OF_BYTES_PER_REGISTER
+
+        # Check combinations: Payload format and functioncode
+        if functioncode not in ALLOWED_FUNCTIONCODES[payloadformat]:
+            raise ValueError(
+                "Wrong functioncode for payloadformat "
+                + "{!r}. Given: {!r}.".format(payloadformat, functioncode)
+            )
+
+        # Check combinations: Broadcast and functioncode
+        if (
+            self.address == _SLAVEADDRESS_BROADCAST
+            and functioncode not in ALLOWED_FUNCTIONCODES_BROADCAST
+        ):
+            raise ValueError(
+                f"Wrong functioncode for broadcast. Given: {functioncode!r}"
+            )
+
+        # Check combinations: signed
+        if signed:
+            if payloadformat not in [_Payloadformat.REGISTER, _Payloadformat.LONG]:
+                raise ValueError(
+                    'The "signed" parameter can not be used for this payload format. '
+                    + "Given format: {!r}.".format(payloadformat)
+                )
 
-        # Check combinations: signed
-        if signed:
-            if payloadformat not in [_Payloadformat.REGISTER, _Payloadformat.LONG]:
-                raise ValueError(
-                    'The "signed" parameter can not be used for this payload format. '
-                    + "Given format: {!r}.".format(payloadformat)
-                )
-
         # Check combinations: number_of_decimals
         if number_of_decimals > 0:
             if payloadformat != _Payloadformat.REGISTER:
@@ -1112,257 +1832,2355 @@ class Instrument:
                     + "payload format. Given format: {0!r}.".format(payloadformat)
                 )
 
-        # Check combinations: byteorder
-        if byteorder:
-            if payloadformat not in [_Payloadformat.FLOAT, _Payloadformat.LONG]:
-                raise ValueError(
-                    'The "byteorder" parameter can not be used for this payload'
-                    + " format. Given format: {0!r}.".format(payloadformat)
-                )
+        # Check combinations: byteorder
+        if byteorder:
+            if payloadformat not in [_Payloadformat.FLOAT, _Payloadformat.LONG]:
+                raise ValueError(
+                    'The "byteorder" parameter can not be used for this payload'
+                    + " format. Given format: {0!r}.".format(payloadformat)
+                )
+
+        # Check combinations: number of bits
+        if payloadformat == _Payloadformat.BIT:
+            if number_of_bits != 1:
+                raise ValueError(
+                    "For BIT payload format the number of bits should be 1. "
+                    + "Given: {0!r}.".format(number_of_bits)
+                )
+        elif payloadformat in [_Payloadformat.BITS, _Payloadformat.PACKEDBITS]:
+            if number_of_bits < 1:
+                raise ValueError(
+                    "For BITS payload format the number of bits should be at least 1. "
+                    + "Given: {0!r}.".format(number_of_bits)
+                )
+        elif number_of_bits:
+            raise ValueError(
+                "The number_of_bits parameter is wrong for payload format "
+                + "{0!r}. Given: {1!r}.".format(payloadformat, number_of_bits)
+            )
+
+        # Check combinations: Number of registers
+        if functioncode in [1, 2, 5, 15] and number_of_registers:
+            raise ValueError(
+                "The number_of_registers is not valid for this function code. "
+                + "number_of_registers: {0!r}, functioncode {1}.".format(
+                    number_of_registers, functioncode
+                )
+            )
+        if functioncode in [3, 4, 16] and not number_of_registers:
+            raise ValueError(
+                "The number_of_registers must be > 0 for functioncode "
+                + "{}.".format(functioncode)
+            )
+        if functioncode == 6 and number_of_registers != 1:
+            raise ValueError(
+                "The number_of_registers must be 1 for functioncode 6. "
+                + "Given: {}.".format(number_of_registers)
+            )
+        if (
+            functioncode == 16
+            and payloadformat == _Payloadformat.REGISTER
+            and number_of_registers != 1
+        ):
+            raise ValueError(
+                "Wrong number_of_registers when writing to a "
+                + "single register. Given {0!r}.".format(number_of_registers)
+            )
+            # Note: For function code 16 there is checking also in the content
+            # conversion functions.
+
+        # Number of registers for float and long
+        if payloadformat == _Payloadformat.FLOAT and number_of_registers not in [2, 4]:
+            raise ValueError(
+                "The number of registers for float must be 2 or 4. "
+                + "Given {0!r}".format(number_of_registers)
+            )
+        if payloadformat == _Payloadformat.LONG and number_of_registers not in [2, 4]:
+            raise ValueError(
+                "The number of registers for long must be 2 or 4. "
+                + "Given {0!r}".format(number_of_registers)
+            )
+
+        # Check combinations: Value
+        if functioncode in [5, 6, 15, 16] and value is None:
+            raise ValueError(
+                "The input value must be given for this function code. "
+                + "Given {0!r} and {1}.".format(value, functioncode)
+            )
+        if functioncode in [1, 2, 3, 4] and value is not None:
+            raise ValueError(
+                "The input value should not be given for this function code. "
+                + "Given {0!r} and {1}.".format(value, functioncode)
+            )
+
+        # Check combinations: Value for numerical
+        if (
+            functioncode == 16
+            and payloadformat
+            in [
+                _Payloadformat.REGISTER,
+                _Payloadformat.FLOAT,
+                _Payloadformat.LONG,
+            ]
+        ) or (functioncode == 6 and payloadformat == _Payloadformat.REGISTER):
+            if not isinstance(value, (int, float)):
+                raise TypeError(f"The input value must be numerical. Given: {value!r}")
+
+        # Check combinations: Value for string
+        if functioncode == 16 and payloadformat == _Payloadformat.STRING:
+            if not isinstance(value, str):
+                raise TypeError(f"The input should be a string. Given: {value!r}")
+            _check_string(
+                value, "input string", minlength=1, maxlength=number_of_register_bytes
+            )
+            # Note: The string might be padded later, so the length might be shorter
+            # than number_of_register_bytes.
+
+        # Check combinations: Value for registers
+        if functioncode == 16 and payloadformat == _Payloadformat.REGISTERS:
+            if not isinstance(value, list):
+                raise TypeError(
+                    "The value parameter for payloadformat REGISTERS must be a list. "
+                    + "Given {0!r}.".format(value)
+                )
+
+            if len(value) != number_of_registers:
+                raise ValueError(
+                    "The list length does not match number of registers. "
+                    + "List: {0!r},  Number of registers: {1!r}.".format(
+                        value, number_of_registers
+                    )
+                )
+
+        # Check combinations: Value for bit
+        if functioncode in [5, 15] and payloadformat == _Payloadformat.BIT:
+            if not isinstance(value, int):
+                raise TypeError(f"The input should be an integer. Given: {value!r}")
+            _check_int(
+                value,
+                minvalue=0,
+                maxvalue=1,
+                description="input value for payload format BIT",
+            )
+
+        # Check combinations: Value for bits
+        if functioncode == 15 and payloadformat == _Payloadformat.BITS:
+            if not isinstance(value, list):
+                raise TypeError(
+                    "The value parameter for payloadformat BITS must be a list. "
+                    + "Given {0!r}.".format(value)
+                )
+
+            if len(value) != number_of_bits:
+                raise ValueError(
+                    "The list length does not match number of bits. "
+                    + "List: {0!r},  Number of registers: {1!r}.".format(
+                        value, number_of_registers
+                    )
+                )
+
+        # Create payload
+        payload_to_slave = _create_payload(
+            functioncode,
+            registeraddress,
+            value,
+            number_of_decimals,
+            number_of_registers,
+            number_of_bits,
+            signed,
+            byteorder,
+            payloadformat,
+        )
+        request_bytes, number_of_bytes_to_read = self._build_request(
+            functioncode, payload_to_slave
+        )
+
+        # Bind the response parsing to the request parameters
+        decoder = functools.partial(
+            _parse_payload,
+            functioncode=functioncode,
+            registeraddress=registeraddress,
+            value=list(value) if isinstance(value, list) else value,
+            number_of_decimals=number_of_decimals,
+            number_of_registers=number_of_registers,
+            number_of_bits=number_of_bits,
+            signed=signed,
+            byteorder=byteorder,
+            payloadformat=payloadformat,
+        )
+        return PreparedCommand(
+            self.address,
+            self.mode,
+            functioncode,
+            request_bytes,
+            number_of_bytes_to_read,
+            decoder,
+        )
+
+    # #################################### #
+    # Communication implementation details #
+    # #################################### #
+
+    def _perform_command(self, functioncode: int, payload_to_slave: bytes) -> bytes:
+        """Perform the command having the *functioncode*.
+
+        Args:
+            * functioncode: The function code for the command to be performed.
+              Can for example be 'Write register' = 16.
+            * payload_to_slave: Data to be transmitted to the slave (will be
+              embedded in slaveaddress, CRC etc)
+
+        Returns:
+            The extracted data payload from the slave. It has been
+            stripped of CRC etc.
+
+        Raises:
+            TypeError, ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+
+        Makes use of the :meth:`_communicate` method. The request is generated
+        with the :func:`_embed_payload` function, and the parsing of the
+        response is done with the :func:`_extract_payload` function.
+        """
+        _check_functioncode(functioncode, None)
+        _check_bytes(payload_to_slave, description="payload")
+
+        request_bytes, number_of_bytes_to_read = self._build_request(
+            functioncode, payload_to_slave
+        )
+
+        # Communicate
+        response_bytes = self._communicate(request_bytes, number_of_bytes_to_read)
+
+        if number_of_bytes_to_read == 0:
+            return b""
+
+        # Extract payload
+        try:
+            payload_from_slave = _extract_payload(
+                response_bytes, self.address, self.mode, functioncode
+            )
+        except ModbusException as exc:
+            self.metrics._record_error(exc)
+            raise
+        return payload_from_slave
+
+    def _build_request(
+        self, functioncode: int, payload_to_slave: bytes
+    ) -> Tuple[bytes, int]:
+        """Build the request, and calculate the number of bytes to read.
+
+        Args:
+            * functioncode: The function code for the command to be performed.
+            * payload_to_slave: Data to be transmitted to the slave.
+
+        Returns:
+            The raw request (including slaveaddress, CRC etc) and the number of
+            bytes to read in the response (0 for broadcasts).
+
+        Raises:
+            TypeError, ValueError
+        """
+        DEFAULT_NUMBER_OF_BYTES_TO_READ = 1000
+
+        # Build request
+        request_bytes = _embed_payload(
+            self.address, self.mode, functioncode, payload_to_slave
+        )
+
+        # Calculate number of bytes to read
+        number_of_bytes_to_read = DEFAULT_NUMBER_OF_BYTES_TO_READ
+        if self.address == _SLAVEADDRESS_BROADCAST:
+            number_of_bytes_to_read = 0
+        elif self.precalculate_read_size:
+            try:
+                number_of_bytes_to_read = _predict_response_size(
+                    self.mode, functioncode, payload_to_slave
+                )
+            except Exception:
+                if self.debug:
+                    template = (
+                        "Could not precalculate response size for Modbus {} mode. "
+                        + "Will read {} bytes. Request: {!r}"
+                    )
+                    self._print_debug(
+                        template.format(
+                            self.mode, number_of_bytes_to_read, request_bytes
+                        )
+                    )
+
+        return request_bytes, number_of_bytes_to_read
+
+    def _communicate(self, request: bytes, number_of_bytes_to_read: int) -> bytes:
+        """Talk to the slave via a serial port.
+
+        Args:
+            * request: The raw request that is to be sent to the slave.
+            * number_of_bytes_to_read: Number of bytes to read
+
+        Returns:
+            The raw data returned from the slave.
+
+        Raises:
+            TypeError, ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+
+        Sleeps if the previous message arrived less than the "silent period" ago.
+
+        Will block until reaching *number_of_bytes_to_read* or timeout.
+
+        Additional delay will be used after broadcast transmissions (slave address 0).
+
+        If the attribute :attr:`Instrument.debug` is :const:`True`, the communication
+        details are printed.
+
+        If the attribute :attr:`Instrument.close_port_after_each_call` is :const:`True`
+        the serial port is closed after each call.
+
+        Timing::
+
+                            Request from master (Master is writing)
+                            |
+                            |                             Response from slave
+                            |                             (Master is reading)
+                            |                             |
+            --------R-------W-----------------------------R-------W--------------------
+                     |     |                               |
+                     |     |<------- Roundtrip time ------>|
+                     |     |
+                  -->|-----|<----- Silent period
+
+        The resolution for Python's :py:func:`time.time()` is lower on Windows than
+        on Linux.
+        It is about 16 ms on Windows according to
+        stackoverflow.com/questions/157359/accurate-timestamping-in-python-logging
+        """
+        _check_bytes(request, minlength=1, description="request")
+        _check_int(number_of_bytes_to_read)
+
+        if self.debug:
+            self._print_debug(
+                "Will write to instrument (expecting {} bytes back): {}".format(
+                    number_of_bytes_to_read, _describe_bytes(request)
+                )
+            )
+
+        if self.serial is None:
+            raise ModbusException("The serial port instance is None")
+
+        if not self.serial.is_open:
+            self._print_debug("Opening port {}".format(self.serial.port))
+            self.serial.open()
+
+        portname: str = ""
+        if self.serial.port is not None:
+            portname = self.serial.port
+
+        arbiter = _get_bus_arbiter(self.serial)
+        timing = arbiter.timing
+        with arbiter.transaction(self.serial, self.bus_timeout):
+            if self.clear_buffers_before_each_transaction:
+                self._print_debug(
+                    "Clearing serial buffers for port {}".format(portname)
+                )
+                self.serial.reset_input_buffer()
+                self.serial.reset_output_buffer()
+
+            if self.mode == MODE_TCP:
+                request = _set_transaction_id(request, portname)
+
+            # Wait for the silent period after the previous frame
+            sleep_time = 0.0
+            if self.mode != MODE_TCP:
+                timing._set_baudrate(self.serial.baudrate)
+                if self.debug:
+                    template = (
+                        "Waiting {:.2f} ms before sending. "
+                        + "Minimum silent period: {:.2f} ms."
+                    )
+                    text = template.format(
+                        timing.time_to_wait() * _SECONDS_TO_MILLISECONDS,
+                        timing.inter_frame_delay * _SECONDS_TO_MILLISECONDS,
+                    )
+                    self._print_debug(text)
+                sleep_time = timing.wait()
+
+            # Write request
+            write_time = time.monotonic()
+            self.serial.write(request)
+            if self.trace is not None:
+                self.trace._record(TRACE_REQUEST, request, None)
+
+            # Read and discard local echo
+            if self.handle_local_echo:
+                local_echo_to_discard = self.serial.read(len(request))
+                if self.debug:
+                    text = "Discarding this local echo: {}".format(
+                        _describe_bytes(local_echo_to_discard),
+                    )
+                    self._print_debug(text)
+                if local_echo_to_discard != request:
+                    template = (
+                        "Local echo handling is enabled, but the local echo does "
+                        + "not match the sent request. "
+                        + "Request: {}, local echo: {}."
+                    )
+                    text = template.format(
+                        _describe_bytes(request),
+                        _describe_bytes(local_echo_to_discard),
+                    )
+                    raise LocalEchoError(text)
+
+            # Read response
+            functioncode = _get_functioncode_of_request(request, self.mode)
+            timeout = self.serial.timeout
+            if number_of_bytes_to_read > 0:
+                if self.adaptive_timeout is not None:
+                    timeout = self.adaptive_timeout.get_timeout(
+                        functioncode, number_of_bytes_to_read
+                    )
+                answer = self._read_response(number_of_bytes_to_read, timeout)
+                while self.mode == MODE_TCP and answer and answer[:2] != request[:2]:
+                    if self.debug:
+                        self._print_debug(
+                            "Discarding the response to an earlier request: "
+                            + _describe_bytes(answer)
+                        )
+                    answer = self._read_response(number_of_bytes_to_read, timeout)
+            else:
+                answer = b""
+                self.serial.flush()
+
+            read_time = time.monotonic()
+            if self.mode != MODE_TCP:
+                timing._end_of_transaction(number_of_bytes_to_read == 0)
+            roundtrip_time = read_time - write_time
+            self._latest_roundtrip_time = roundtrip_time
+            if number_of_bytes_to_read > 0:
+                if self.trace is not None:
+                    self.trace._record(TRACE_RESPONSE, answer, roundtrip_time)
+                if self.adaptive_timeout is not None:
+                    self.adaptive_timeout._record(
+                        functioncode,
+                        number_of_bytes_to_read,
+                        roundtrip_time if answer else None,
+                    )
+            self.metrics._record_transaction(
+                functioncode,
+                len(request),
+                len(answer),
+                number_of_bytes_to_read,
+                roundtrip_time,
+                sleep_time,
+            )
+
+            if self.close_port_after_each_call:
+                self._print_debug("Closing port {}".format(portname))
+                self.serial.close()
+
+            if self.debug:
+                if isinstance(timeout, float):
+                    timeout_time = timeout * _SECONDS_TO_MILLISECONDS
+                else:
+                    timeout_time = 0
+                text = (
+                    "Response from instrument: {}, roundtrip time: {:.1f} ms."
+                    " Timeout for reading: {:.1f} ms.\n"
+                ).format(
+                    _describe_bytes(answer),
+                    roundtrip_time,
+                    timeout_time,
+                )
+                self._print_debug(text)
+
+            if not answer and number_of_bytes_to_read > 0:
+                raise NoResponseError(
+                    "No communication with the instrument (no answer)"
+                )
+
+            if number_of_bytes_to_read == 0 and self.mode != MODE_TCP:
+                self._print_debug(
+                    "Broadcast delay: next request after {} s".format(
+                        timing.broadcast_delay
+                    )
+                )
+
+        return answer
+
+    def _communicate_pipelined(
+        self, requests: List[Tuple[bytes, int]]
+    ) -> List[Union[bytes, Exception]]:
+        """Talk to a Modbus TCP gateway, with several transactions in flight.
+
+        Args:
+            * requests: The raw requests that are to be sent, each with the number
+              of bytes to read (0 for broadcasts).
+
+        Returns:
+            For each request, the raw response, or the :exc:`NoResponseError` if
+            there is no response within the timeout.
+
+        Raises:
+            ModbusException, serial.SerialException (inherited from IOError)
+
+        After a timeout the requests in flight have no response, and the requests
+        not sent yet are sent. Responses to earlier requests (after a timeout) are
+        discarded.
+        """
+        if self.serial is None:
+            raise ModbusException("The serial port instance is None")
+
+        if not self.serial.is_open:
+            self._print_debug("Opening port {}".format(self.serial.port))
+            self.serial.open()
+
+        portname: str = ""
+        if self.serial.port is not None:
+            portname = self.serial.port
+
+        answers: List[Optional[bytes]] = [None] * len(requests)
+        with _get_bus_arbiter(self.serial).transaction(self.serial, self.bus_timeout):
+            if self.clear_buffers_before_each_transaction:
+                self.serial.reset_input_buffer()
+                self.serial.reset_output_buffer()
+
+            write_time = time.monotonic()
+            write_times: List[float] = [write_time] * len(requests)
+            in_flight: Dict[bytes, int] = {}  # Key: transaction ID, value: index
+            next_index = 0
+            while next_index < len(requests) or in_flight:
+                while next_index < len(requests) and (
+                    len(in_flight) < self.max_transactions_in_flight
+                ):
+                    request, number_of_bytes_to_read = requests[next_index]
+                    request = _set_transaction_id(request, portname)
+                    if self.debug:
+                        self._print_debug(
+                            "Will write to instrument: {}".format(
+                                _describe_bytes(request)
+                            )
+                        )
+                    write_times[next_index] = time.monotonic()
+                    self.serial.write(request)
+                    if self.trace is not None:
+                        self.trace._record(TRACE_REQUEST, request, None)
+                    if number_of_bytes_to_read > 0:
+                        in_flight[request[:2]] = next_index
+                    else:
+                        answers[next_index] = b""
+                        self.metrics._record_transaction(
+                            _get_functioncode_of_request(request, MODE_TCP),
+                            len(request),
+                            0,
+                            0,
+                            0.0,
+                            0.0,
+                        )
+                    next_index += 1
+                if not in_flight:
+                    continue
+
+                answer = self._read_response(0, self.serial.timeout)
+                if self.debug:
+                    self._print_debug(
+                        "Response from instrument: {}".format(_describe_bytes(answer))
+                    )
+                if not answer:
+                    # Timeout: the requests in flight have no answer, each one is
+                    # recorded as in _communicate. Then the others are sent.
+                    for index in sorted(in_flight.values()):
+                        roundtrip_time = time.monotonic() - write_times[index]
+                        if self.trace is not None:
+                            self.trace._record(TRACE_RESPONSE, b"", roundtrip_time)
+                        self.metrics._record_transaction(
+                            _get_functioncode_of_request(requests[index][0], MODE_TCP),
+                            len(requests[index][0]),
+                            0,
+                            requests[index][1],
+                            roundtrip_time,
+                            0.0,
+                        )
+                    in_flight.clear()
+                    continue
+
+                index = in_flight.pop(answer[:2], None)
+                if self.trace is not None:
+                    self.trace._record(
+                        TRACE_RESPONSE,
+                        answer,
+                        None
+                        if index is None
+                        else time.monotonic() - write_times[index],
+                    )
+                if index is None:
+                    self._print_debug("Discarding the response to an earlier request")
+                    continue
+                answers[index] = answer
+                self.metrics._record_transaction(
+                    _get_functioncode_of_request(requests[index][0], MODE_TCP),
+                    len(requests[index][0]),
+                    len(answer),
+                    requests[index][1],
+                    time.monotonic() - write_times[index],
+                    0.0,
+                )
+
+            self._latest_roundtrip_time = time.monotonic() - write_time
+
+            if self.close_port_after_each_call:
+                self._print_debug("Closing port {}".format(portname))
+                self.serial.close()
+
+        return [
+            NoResponseError("No communication with the instrument (no answer)")
+            if answer is None
+            else answer
+            for answer in answers
+        ]
+
+    def _read_response(
+        self, number_of_bytes_to_read: int, timeout: Optional[float]
+    ) -> bytes:
+        """Read the response from the slave, stopping at the end of the frame.
+
+        Args:
+            * number_of_bytes_to_read: Number of bytes expected
+            * timeout: Maximum time to wait for the response, in seconds. ``None``
+              waits forever.
+
+        Returns:
+            The raw data returned from the slave.
+
+        In RTU mode the frame length is predicted from its first bytes by
+        :func:`_predict_rtu_frame_length`, so an exception response costs one
+        frame time instead of the read timeout. If :attr:`end_frame_on_silence`
+        is :const:`True`, the frame also ends when the line goes silent.
+        In TCP mode the frame length is given by the MBAP header.
+
+        In ASCII mode *number_of_bytes_to_read* bytes are read.
+
+        The timeout is for the whole response: the frame is read in chunks, each
+        one waiting only for what is left of it.
+        """
+        assert self.serial is not None
+        if self.mode == MODE_ASCII:
+            return self._read_with_timeout(number_of_bytes_to_read, timeout)
+
+        predict_frame_length = _predict_rtu_frame_length
+        if self.mode == MODE_TCP:
+            predict_frame_length = _predict_tcp_frame_length
+        end_frame_on_silence = self.end_frame_on_silence and self.mode == MODE_RTU
+        silent_period = 0.0
+        if end_frame_on_silence:
+            silent_period = self.bus_timing.end_of_frame_silence
+        deadline = None if timeout is None else time.monotonic() + timeout
+        read_timeout = timeout
+        answer = b""
+        expected = predict_frame_length(answer, number_of_bytes_to_read)
+        while len(answer) < expected:
+            size = expected - len(answer)
+            if answer and deadline is not None:
+                read_timeout = max(deadline - time.monotonic(), 0.0)
+            if not end_frame_on_silence:
+                chunk = self._read_with_timeout(size, read_timeout)
+            elif answer:
+                chunk = self._read_until_silence(silent_period, size)
+            else:
+                size = 1  # Wait up to the timeout for the start of the response
+                chunk = self._read_with_timeout(size, read_timeout)
+            answer += chunk
+            if len(chunk) < size:
+                break  # Timeout or silence
+            expected = predict_frame_length(answer, number_of_bytes_to_read)
+        return answer
+
+    def _read_with_timeout(self, size: int, timeout: Optional[float]) -> bytes:
+        """Read from the serial port, with a timeout that may differ from the port's.
+
+        Args:
+            * size: Maximum number of bytes to read
+            * timeout: Seconds to wait for the data (``None`` waits forever)
+
+        Returns:
+            The bytes received.
+
+        The timeout of the serial port is not changed, as pySerial reconfigures
+        the port at each change (tcgetattr and tcsetattr on POSIX). The file
+        descriptor is watched with :func:`select.select` instead. Ports without
+        file descriptor, as on Windows, get the timeout for the read.
+        """
+        assert self.serial is not None
+        if timeout == self.serial.timeout or self.serial.in_waiting >= size:
+            return self.serial.read(size)
+        try:
+            fd = self.serial.fileno()
+        except (io.UnsupportedOperation, OSError, AttributeError):
+            configured_timeout = self.serial.timeout
+            self.serial.timeout = timeout
+            try:
+                return self.serial.read(size)
+            finally:
+                self.serial.timeout = configured_timeout
+
+        answer = b""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(answer) < size:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0.0)
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                break  # Timeout
+            waiting = max(self.serial.in_waiting, 1)
+            chunk = self.serial.read(min(waiting, size - len(answer)))
+            if not chunk:
+                break
+            answer += chunk
+        return answer
+
+    def _read_until_silence(self, silent_period: float, size: int) -> bytes:
+        """Read from the serial port until the line is silent, or enough bytes.
+
+        Args:
+            * silent_period: Silence (in seconds) that ends the frame
+            * size: Maximum number of bytes to read
+
+        Returns:
+            The bytes received.
+
+        The receive buffer is checked instead of relying on the
+        ``inter_byte_timeout`` of the serial port, as pySerial on POSIX maps it
+        to the VTIME terminal setting, that has a resolution of 0.1 s.
+        """
+        assert self.serial is not None
+        answer = b""
+        deadline = time.monotonic() + silent_period
+        while len(answer) < size:
+            waiting = self.serial.in_waiting
+            if waiting:
+                answer += self.serial.read(min(waiting, size - len(answer)))
+                deadline = time.monotonic() + silent_period
+            elif time.monotonic() >= deadline:
+                break
+            else:
+                time.sleep(silent_period / _END_OF_FRAME_POLLS)
+        return answer
+
+
+# ############################# #
+# Transaction metrics and trace #
+# ############################# #
+
+
+class LatencyHistogram:
+    """Histogram of durations, for example round-trip times.
+
+    The buckets are logarithmic, from 0.5 ms to 8 s with four buckets per
+    doubling of the duration, so percentiles have an error of at most 19%
+    whatever the baudrate or network latency.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        """Number of recorded durations (int)."""
+
+        self.total = 0.0
+        """Sum of the recorded durations, in seconds (float)."""
+
+        self.max = 0.0
+        """Longest recorded duration, in seconds (float)."""
+
+        self.buckets = [0] * (len(_LATENCY_BUCKET_BOUNDS) + 1)
+        """Number of durations in each bucket (list of int). The upper bounds of
+        the buckets are in ``_LATENCY_BUCKET_BOUNDS``, the last bucket is for
+        longer durations.
+        """
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.LatencyHistogram` object."""
+        template = "{}.{}<id=0x{:x}, count={}, mean={}, p95={}, max={:.4f}>"
+        return template.format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.count,
+            self.mean,
+            self.percentile(95),
+            self.max,
+        )
+
+    @property
+    def mean(self) -> Optional[float]:
+        """Mean of the recorded durations in seconds, or ``None`` if there are
+        none. Read only.
+        """
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Estimate a percentile of the recorded durations.
+
+        Args:
+            * percent: The percentile, 0 to 100. For example 95 gives the duration
+              that 95% of the recorded durations do not exceed.
+
+        Returns:
+            The duration in seconds, interpolated within its bucket, or ``None``
+            if there are no recorded durations.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for index, bucketcount in enumerate(self.buckets):
+            if bucketcount and cumulative + bucketcount >= rank:
+                lower = _LATENCY_BUCKET_BOUNDS[index - 1] if index else 0.0
+                upper = self.max
+                if index < len(_LATENCY_BUCKET_BOUNDS):
+                    upper = min(_LATENCY_BUCKET_BOUNDS[index], self.max)
+                return lower + (upper - lower) * (rank - cumulative) / bucketcount
+            cumulative += bucketcount
+        return self.max
+
+    def record(self, duration: float) -> None:
+        """Record a duration, in seconds."""
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect.bisect_left(_LATENCY_BUCKET_BOUNDS, duration)] += 1
+
+    def _copy(self) -> "LatencyHistogram":
+        histogram = LatencyHistogram()
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.max = self.max
+        histogram.buckets = list(self.buckets)
+        return histogram
+
+
+class TransactionMetrics:
+    """Counters and latency histograms of the transactions of an instrument.
+
+    Updated by the :class:`Instrument` at each transaction, see
+    :attr:`Instrument.metrics`. To read them while other threads use the
+    instrument, take a consistent copy with :meth:`snapshot`.
+    """
+
+    def __init__(self) -> None:
+        self.transactions = 0
+        """Number of requests sent, including broadcasts (int)."""
+
+        self.bytes_sent = 0
+        """Number of bytes sent (int)."""
+
+        self.bytes_received = 0
+        """Number of bytes received (int)."""
+
+        self.no_responses = 0
+        """Number of requests without response, see :exc:`NoResponseError` (int)."""
+
+        self.invalid_responses = 0
+        """Number of responses with wrong checksum, length or content, see
+        :exc:`InvalidResponseError` (int)."""
+
+        self.slave_exceptions = 0
+        """Number of exception responses, see :exc:`SlaveReportedException` (int).
+        They are valid responses, so they are not counted in :attr:`error_rate`.
+        """
+
+        self.roundtrip = LatencyHistogram()
+        """Round-trip times of the answered requests (:class:`LatencyHistogram`),
+        see :attr:`Instrument.roundtrip_time`.
+        """
+
+        self.sleep = LatencyHistogram()
+        """Times slept before sending, to respect the silent period on the bus
+        (:class:`LatencyHistogram`). Zero when no sleep was needed.
+        """
+
+        self.roundtrip_by_functioncode: Dict[int, LatencyHistogram] = {}
+        """Round-trip times of the answered requests, per function code (dict of
+        :class:`LatencyHistogram`).
+        """
+
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.TransactionMetrics` object."""
+        template = (
+            "{}.{}<id=0x{:x}, transactions={}, bytes_sent={}, bytes_received={}, "
+            + "no_responses={}, invalid_responses={}, slave_exceptions={}, "
+            + "error_rate={:.3f}, roundtrip={!r}, sleep={!r}>"
+        )
+        return template.format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.transactions,
+            self.bytes_sent,
+            self.bytes_received,
+            self.no_responses,
+            self.invalid_responses,
+            self.slave_exceptions,
+            self.error_rate,
+            self.roundtrip,
+            self.sleep,
+        )
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of the transactions without response or with an invalid response,
+        0.0 to 1.0. Read only.
+        """
+        if not self.transactions:
+            return 0.0
+        return (self.no_responses + self.invalid_responses) / self.transactions
+
+    def snapshot(self, reset: bool = False) -> "TransactionMetrics":
+        """Take a copy of the metrics, not updated by later transactions.
+
+        Args:
+            * reset: If :const:`True`, the metrics are also reset, so consecutive
+              snapshots cover consecutive time intervals.
+
+        Returns:
+            The copy.
+        """
+        metrics = TransactionMetrics()
+        with self._lock:
+            metrics.transactions = self.transactions
+            metrics.bytes_sent = self.bytes_sent
+            metrics.bytes_received = self.bytes_received
+            metrics.no_responses = self.no_responses
+            metrics.invalid_responses = self.invalid_responses
+            metrics.slave_exceptions = self.slave_exceptions
+            metrics.roundtrip = self.roundtrip._copy()
+            metrics.sleep = self.sleep._copy()
+            metrics.roundtrip_by_functioncode = {
+                functioncode: histogram._copy()
+                for functioncode, histogram in self.roundtrip_by_functioncode.items()
+            }
+            if reset:
+                self._reset()
+        return metrics
+
+    def reset(self) -> None:
+        """Set all the counters to zero, and empty the histograms."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.no_responses = 0
+        self.invalid_responses = 0
+        self.slave_exceptions = 0
+        self.roundtrip = LatencyHistogram()
+        self.sleep = LatencyHistogram()
+        self.roundtrip_by_functioncode = {}
+
+    def _record_transaction(
+        self,
+        functioncode: int,
+        request_size: int,
+        response_size: int,
+        number_of_bytes_to_read: int,
+        roundtrip_time: float,
+        sleep_time: float,
+    ) -> None:
+        """Record a transaction.
+
+        Args:
+            * functioncode: Function code of the request
+            * request_size: Number of bytes sent
+            * response_size: Number of bytes received
+            * number_of_bytes_to_read: Number of bytes expected, 0 for broadcasts
+            * roundtrip_time: Round-trip time in seconds
+            * sleep_time: Time slept before sending, in seconds
+        """
+        with self._lock:
+            self.transactions += 1
+            self.bytes_sent += request_size
+            self.bytes_received += response_size
+            self.sleep.record(sleep_time)
+            if not number_of_bytes_to_read:
+                return
+            if not response_size:
+                self.no_responses += 1
+                return
+            self.roundtrip.record(roundtrip_time)
+            histogram = self.roundtrip_by_functioncode.get(functioncode)
+            if histogram is None:
+                histogram = self.roundtrip_by_functioncode[
+                    functioncode
+                ] = LatencyHistogram()
+            histogram.record(roundtrip_time)
+
+    def _record_error(self, error: Exception) -> None:
+        """Count an error found in a response."""
+        with self._lock:
+            if isinstance(error, InvalidResponseError):
+                self.invalid_responses += 1
+            elif isinstance(error, SlaveReportedException):
+                self.slave_exceptions += 1
+
+
+class AdaptiveTimeout:
+    """Read timeout following the observed round-trip times, see
+    :attr:`Instrument.adaptive_timeout`.
+
+    Args:
+        * minimum: The shortest timeout, in seconds.
+        * maximum: The longest timeout, in seconds. Also used before the first
+          round-trip time is observed.
+
+    For each function code and expected response size, a smoothed round-trip
+    time and its mean deviation are estimated as for the TCP retransmission timeout
+    (RFC 6298), and the timeout is the smoothed round-trip time plus four times
+    the deviation. After a request without response the timeout is doubled, so a
+    slow slave (for example during a firmware hiccup) gets the time to answer and
+    its new round-trip time is learnt. The timeout is always clamped between
+    *minimum* and *maximum*.
+    """
+
+    def __init__(self, minimum: float = 0.02, maximum: float = 1.0) -> None:
+        _check_numerical(minimum, minvalue=0, description="minimum timeout")
+        _check_numerical(maximum, minvalue=minimum, description="maximum timeout")
+        self.minimum = minimum
+        """The shortest timeout, in seconds (float)."""
+
+        self.maximum = maximum
+        """The longest timeout, in seconds (float)."""
+
+        # Key: (function code, response size), value: [srtt, rttvar, timeout]
+        self._estimates: Dict[Tuple[int, int], List[float]] = {}
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.AdaptiveTimeout` object."""
+        return "{}.{}<id=0x{:x}, minimum={}, maximum={}, timeouts={}>".format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.minimum,
+            self.maximum,
+            {key: round(estimate[2], 4) for key, estimate in self._estimates.items()},
+        )
+
+    def get_timeout(self, functioncode: int, number_of_bytes_to_read: int) -> float:
+        """Give the read timeout for a request.
+
+        Args:
+            * functioncode: Function code of the request
+            * number_of_bytes_to_read: Expected size of the response
+
+        Returns:
+            The timeout in seconds.
+        """
+        estimate = self._estimates.get((functioncode, number_of_bytes_to_read))
+        if estimate is None:
+            return self.maximum
+        return min(max(estimate[2], self.minimum), self.maximum)
+
+    def _record(
+        self,
+        functioncode: int,
+        number_of_bytes_to_read: int,
+        roundtrip_time: Optional[float],
+    ) -> None:
+        """Update the estimate with a round-trip time, ``None`` if no response."""
+        key = (functioncode, number_of_bytes_to_read)
+        estimate = self._estimates.get(key)
+        if roundtrip_time is None:
+            if estimate is not None:  # Back off
+                estimate[2] = min(2 * max(estimate[2], self.minimum), self.maximum)
+            return
+        if estimate is None:
+            srtt = roundtrip_time
+            rttvar = roundtrip_time / 2
+        else:
+            srtt, rttvar, _ = estimate
+            rttvar += _RTO_RTTVAR_GAIN * (abs(srtt - roundtrip_time) - rttvar)
+            srtt += _RTO_SRTT_GAIN * (roundtrip_time - srtt)
+        self._estimates[key] = [srtt, rttvar, srtt + _RTO_RTTVAR_FACTOR * rttvar]
+
+
+class TransactionTrace:
+    """Ring buffer of the latest raw frames sent and received, see
+    :attr:`Instrument.trace`.
+
+    Recording a frame only appends a :class:`TraceRecord` to a
+    :class:`collections.deque`, so the trace can stay enabled in production. The
+    frames are formatted only when the trace is read, with :meth:`format`.
+
+    Args:
+        * size: Maximum number of records. The oldest records are dropped.
+
+    Save the trace with :meth:`dump`, for example when a transaction fails, and
+    read it back with :func:`load_trace`. The file is binary: the magic bytes
+    ``MMTRACE1``, then for each record the timestamp (float64), the direction
+    (uint8), the round-trip time (float32, NaN if none) and the frame length
+    (uint16), little endian, followed by the frame.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        _check_int(size, minvalue=1, description="trace size")
+        self._records: Deque[TraceRecord] = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.TransactionTrace` object."""
+        return "{}.{}<id=0x{:x}, size={}, records={}>".format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.size,
+            len(self._records),
+        )
+
+    def __str__(self) -> str:
+        return self.format()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def size(self) -> int:
+        """Maximum number of records. Read only."""
+        maxlen = self._records.maxlen
+        assert maxlen is not None
+        return maxlen
+
+    def records(self) -> List[TraceRecord]:
+        """Return the records, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def clear(self) -> None:
+        """Remove all the records."""
+        with self._lock:
+            self._records.clear()
+
+    def format(self) -> str:
+        """Describe the records in a human friendly way, one line per frame.
+
+        For example::
+
+            2024-05-01 10:31:07.512043 >> 03 03 07 E3 00 05 74 A9 (8 bytes)
+            2024-05-01 10:31:07.520911 << 03 03 0A 00 64 ... (15 bytes) 8.9 ms
+        """
+        lines = []
+        for record in self.records():
+            line = "{}.{:06d} {} {}".format(
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp)),
+                int(record.timestamp % 1 * 1000000),
+                ">>" if record.direction == TRACE_REQUEST else "<<",
+                _describe_bytes(record.frame) if record.frame else "(no response)",
+            )
+            if record.roundtrip_time is not None:
+                line += " {:.1f} ms".format(
+                    record.roundtrip_time * _SECONDS_TO_MILLISECONDS
+                )
+            lines.append(line)
+        return "\n".join(lines)
+
+    def dump(self, filename: str) -> None:
+        """Save the records to a binary capture file, replacing it.
+
+        Args:
+            * filename: Name of the file
+        """
+        records = self.records()
+        parts = [_TRACE_FILE_MAGIC]
+        for record in records:
+            roundtrip_time = record.roundtrip_time
+            parts.append(
+                _TRACE_RECORD_HEADER.pack(
+                    record.timestamp,
+                    record.direction,
+                    float("nan") if roundtrip_time is None else roundtrip_time,
+                    len(record.frame),
+                )
+            )
+            parts.append(record.frame)
+        with open(filename, "wb") as tracefile:
+            tracefile.write(b"".join(parts))
+
+    def _record(
+        self, direction: int, frame: bytes, roundtrip_time: Optional[float]
+    ) -> None:
+        with self._lock:
+            self._records.append(
+                TraceRecord(time.time(), direction, frame, roundtrip_time)
+            )
+
+
+def load_trace(filename: str) -> TransactionTrace:
+    """Read a capture file saved by :meth:`TransactionTrace.dump`.
+
+    Args:
+        * filename: Name of the file
+
+    Returns:
+        A :class:`TransactionTrace` with all the records of the file.
+
+    Raises:
+        ValueError if the file is not a valid capture file.
+    """
+    with open(filename, "rb") as tracefile:
+        data = tracefile.read()
+    if not data.startswith(_TRACE_FILE_MAGIC):
+        raise ValueError("Not a MinimalModbus trace file: {!r}".format(filename))
+
+    records = []
+    position = len(_TRACE_FILE_MAGIC)
+    while position < len(data):
+        if position + _TRACE_RECORD_HEADER.size > len(data):
+            raise ValueError("Truncated trace file: {!r}".format(filename))
+        timestamp, direction, roundtrip_time, length = _TRACE_RECORD_HEADER.unpack_from(
+            data, position
+        )
+        position += _TRACE_RECORD_HEADER.size
+        frame = data[position : position + length]
+        if len(frame) != length:
+            raise ValueError("Truncated trace file: {!r}".format(filename))
+        position += length
+        records.append(
+            TraceRecord(
+                timestamp,
+                direction,
+                frame,
+                None if math.isnan(roundtrip_time) else roundtrip_time,
+            )
+        )
+
+    trace = TransactionTrace(max(len(records), 1))
+    trace._records.extend(records)
+    return trace
+
+
+class ReplayedTransaction(NamedTuple):
+    """A transaction of a capture, decoded again by :func:`replay_trace`."""
+
+    timestamp: float
+    """Time of the end of the transaction, as recorded (see :func:`time.time`)."""
+
+    request: bytes
+    """The raw request frame."""
+
+    response: Optional[bytes]
+    """The raw response frame, empty if there was no response, ``None`` for
+    broadcasts."""
+
+    roundtrip_time: Optional[float]
+    """The recorded round-trip time, in seconds. ``None`` for broadcasts."""
+
+    slaveaddress: int
+    """Slave address of the request."""
+
+    functioncode: int
+    """Function code of the request."""
+
+    registeraddress: int
+    """Start address of the request."""
+
+    result: Any
+    """What the :class:`Instrument` method doing the request would return, for
+    example the list of register values for function code 3. ``None`` for writes
+    and broadcasts, and if the response is invalid."""
+
+    error: Optional["ModbusException"]
+    """The exception the :class:`Instrument` method would raise, if any."""
+
+
+def replay_trace(
+    trace: TransactionTrace, mode: str = MODE_RTU, realtime: bool = False
+) -> Iterator[ReplayedTransaction]:
+    """Decode again the transactions recorded in a trace, without a serial port.
+
+    Args:
+        * trace: For example from :func:`load_trace`.
+        * mode: The Modbus mode of the recorded frames.
+        * realtime: If :const:`False` the transactions are replayed as fast as
+          possible, for example to profile the decoding. If :const:`True` they are
+          replayed with the recorded timing.
+
+    Yields:
+        A :class:`ReplayedTransaction` for each request in the trace.
+
+    Each response goes through the same checks and parsing as in
+    :meth:`Instrument.execute` (:func:`_extract_payload` and
+    :func:`_parse_payload`), with the parameters read from its request. So the
+    errors seen in the field, like a wrong CRC or byte count, are raised again
+    and can be debugged offline.
+
+    In Modbus TCP mode the responses are matched to the requests by transaction
+    ID, and a timeout (an empty response) belongs to the oldest request still
+    waiting. Else each response belongs to the latest request. A response that
+    matches no request, for example the first record of a full ring buffer,
+    is skipped.
+
+    Raises:
+        ValueError
+    """
+    _check_mode(mode)
+    _check_bool(realtime, description="realtime")
+
+    start_time = time.monotonic()
+    first_timestamp: Optional[float] = None
+    pending: Dict[bytes, TraceRecord] = {}  # Key: transaction ID, or b"" if not TCP
+
+    for record in trace.records():
+        if first_timestamp is None:
+            first_timestamp = record.timestamp
+        if realtime:
+            delay = record.timestamp - first_timestamp - (time.monotonic() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+
+        if mode != MODE_TCP:
+            key = b""
+        elif record.frame:
+            key = record.frame[:2]
+        else:
+            # A timeout is recorded without transaction ID, and the requests
+            # time out in the order they were sent
+            key = next(iter(pending), b"")
+        if record.direction == TRACE_REQUEST:
+            previous = pending.pop(key, None)
+            if previous is not None and mode != MODE_TCP:
+                yield _replay_transaction(previous, None, mode)  # Broadcast
+            if mode == MODE_TCP and (
+                record.frame[_NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH]
+                == _SLAVEADDRESS_BROADCAST
+            ):
+                yield _replay_transaction(record, None, mode)  # Broadcast
+                continue
+            pending[key] = record
+            continue
+
+        request_record = pending.pop(key, None)
+        if request_record is not None:
+            yield _replay_transaction(request_record, record, mode)
+
+    for request_record in pending.values():
+        yield _replay_transaction(request_record, None, mode)
+
+
+def _replay_transaction(
+    request_record: TraceRecord, response_record: Optional[TraceRecord], mode: str
+) -> ReplayedTransaction:
+    """Decode the recorded response to a recorded request.
+
+    Args:
+        * request_record: The request
+        * response_record: The response, ``None`` for broadcasts
+        * mode: The Modbus mode of the frames
+
+    Returns:
+        The decoded transaction.
+    """
+    request = request_record.frame
+    if mode == MODE_ASCII:
+        pdu = _hexdecode(request[len(_ASCII_HEADER) : -len(_ASCII_FOOTER) - 2])
+    elif mode == MODE_TCP:
+        pdu = request[_NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH:]
+    else:
+        pdu = request[:-2]
+    slaveaddress = pdu[_BYTEPOSITION_FOR_SLAVEADDRESS]
+    functioncode = pdu[_BYTEPOSITION_FOR_FUNCTIONCODE]
+    payload_to_slave = pdu[_BYTEPOSITION_FOR_FUNCTIONCODE + 1 :]
+    registeraddress = int.from_bytes(payload_to_slave[0:2], "big")
+
+    result = None
+    error = None
+    if response_record is None:
+        response = None
+        roundtrip_time = None
+        timestamp = request_record.timestamp
+    else:
+        response = response_record.frame
+        roundtrip_time = response_record.roundtrip_time
+        timestamp = response_record.timestamp
+        try:
+            if not response:
+                raise NoResponseError(
+                    "No communication with the instrument (no answer)"
+                )
+            payload_from_slave = _extract_payload(
+                response, slaveaddress, mode, functioncode
+            )
+            result = _decode_replayed_payload(
+                payload_from_slave, functioncode, registeraddress, payload_to_slave
+            )
+        except ModbusException as exc:
+            error = exc
+
+    return ReplayedTransaction(
+        timestamp,
+        request,
+        response,
+        roundtrip_time,
+        slaveaddress,
+        functioncode,
+        registeraddress,
+        result,
+        error,
+    )
+
+
+def _decode_replayed_payload(
+    payload_from_slave: bytes,
+    functioncode: int,
+    registeraddress: int,
+    payload_to_slave: bytes,
+) -> Any:
+    """Parse a response payload with the parameters read from its request payload.
+
+    Args:
+        * payload_from_slave: The response payload
+        * functioncode: The function code
+        * registeraddress: The start address of the request
+        * payload_to_slave: The request payload
+
+    Returns:
+        The parsed payload, as returned by :func:`_parse_payload`. The payload
+        itself for function codes not used by :class:`Instrument`.
+
+    Raises:
+        InvalidResponseError
+    """
+    count = int.from_bytes(payload_to_slave[2:4], "big")
+    value = None
+    number_of_registers = 0
+    number_of_bits = 0
+    payloadformat = _Payloadformat.REGISTERS
+    if functioncode in [1, 2, 15]:
+        number_of_bits = count
+        payloadformat = _Payloadformat.BITS
+    elif functioncode in [3, 4, 16]:
+        number_of_registers = count
+    elif functioncode == 5:
+        value = 1 if payload_to_slave[2:4] == _bit_to_bytes(1) else 0
+        number_of_bits = 1
+        payloadformat = _Payloadformat.BIT
+    elif functioncode == 6:
+        value = count  # The register value
+        number_of_registers = 1
+        payloadformat = _Payloadformat.REGISTER
+    else:
+        return payload_from_slave
+
+    return _parse_payload(
+        payload_from_slave,
+        functioncode,
+        registeraddress,
+        value,
+        0,
+        number_of_registers,
+        number_of_bits,
+        False,
+        BYTEORDER_BIG,
+        payloadformat,
+    )
+
+
+# ############### #
+# Bus arbitration #
+# ############### #
+
+
+class BusArbiter:
+    """Serialize the Modbus transactions on one serial port.
+
+    All the instruments using the same port name share one arbiter, see
+    :attr:`Instrument.bus_arbiter`. A serial port object without name has its
+    own arbiter. During a transaction (request, response and
+    the silent periods around them) the arbiter holds:
+
+    - a thread lock, so only one thread at a time talks on the bus.
+    - an advisory ``flock()`` of the serial port file descriptor, so other
+      processes using MinimalModbus wait as well, and pySerial ports opened with
+      ``exclusive=True`` by other processes fail to open. Only on POSIX, and not
+      if this serial port is opened with ``exclusive=True``, as pySerial then
+      manages the lock itself (also when the port is reconfigured, for example
+      by :attr:`Instrument.adaptive_timeout`).
+
+    If the bus does not become free within :attr:`Instrument.bus_timeout`,
+    :exc:`BusBusyError` is raised.
+
+    The attributes below are contention metrics, updated at each transaction.
+    """
+
+    def __init__(self, portname: str) -> None:
+        self.portname = portname
+        """Name of the serial port (str)."""
+
+        self.transactions = 0
+        """Number of transactions that got the bus (int)."""
+
+        self.contended = 0
+        """Number of transactions that had to wait for the bus (int)."""
+
+        self.busy = 0
+        """Number of transactions given up, as the bus was not free in time (int)."""
+
+        self.wait_time = 0.0
+        """Total time waited for the bus, in seconds (float)."""
+
+        self.max_wait_time = 0.0
+        """Longest time waited for the bus, in seconds (float)."""
+
+        self.timing = BusTiming()
+        """The :class:`BusTiming` of the port."""
+
+        self._lock = threading.Lock()
+        self._locked_fd: Optional[int] = None
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.BusArbiter` object."""
+        template = (
+            "{}.{}<id=0x{:x}, portname={!r}, transactions={}, contended={}, "
+            + "busy={}, wait_time={:.3f}, max_wait_time={:.3f}>"
+        )
+        return template.format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.portname,
+            self.transactions,
+            self.contended,
+            self.busy,
+            self.wait_time,
+            self.max_wait_time,
+        )
+
+    @contextlib.contextmanager
+    def transaction(
+        self, port: serial.Serial, timeout: Optional[float]
+    ) -> Iterator[None]:
+        """Hold the bus for the duration of a ``with`` block.
+
+        Args:
+            * port: The open serial port
+            * timeout: Maximum time to wait for the bus, in seconds. ``None``
+              waits forever.
+
+        Raises:
+            BusBusyError
+        """
+        self.acquire(port, timeout)
+        try:
+            yield
+        finally:
+            self.release(port)
+
+    def acquire(self, port: serial.Serial, timeout: Optional[float]) -> None:
+        """Wait for the bus to be free, and take it.
+
+        For argument descriptions, see the :meth:`transaction` method.
+
+        Raises:
+            BusBusyError
+        """
+        start_time = time.monotonic()
+        contended = not self._lock.acquire(blocking=False)
+        if contended and not self._lock.acquire(
+            timeout=-1 if timeout is None else timeout
+        ):
+            self._give_up(start_time)
+
+        delay = _BUS_POLL_MIN_DELAY
+        while not self._try_lock_port(port):
+            contended = True
+            remaining = _remaining_time(start_time, timeout)
+            if remaining is not None and remaining <= 0:
+                self._lock.release()
+                self._give_up(start_time)
+            time.sleep(delay if remaining is None else min(delay, remaining))
+            delay = min(delay * 2, _BUS_POLL_MAX_DELAY)
+
+        self._record(start_time, contended)
+
+    async def acquire_async(
+        self, port: serial.Serial, timeout: Optional[float]
+    ) -> None:
+        """Wait for the bus to be free without blocking the event loop, and take it.
+
+        For argument descriptions, see the :meth:`transaction` method.
+
+        Raises:
+            BusBusyError
+        """
+        start_time = time.monotonic()
+        contended = False
+        delay = _BUS_POLL_MIN_DELAY
+        while True:
+            if self._lock.acquire(blocking=False):
+                if self._try_lock_port(port):
+                    break
+                self._lock.release()
+            contended = True
+            remaining = _remaining_time(start_time, timeout)
+            if remaining is not None and remaining <= 0:
+                self._give_up(start_time)
+            await asyncio.sleep(delay if remaining is None else min(delay, remaining))
+            delay = min(delay * 2, _BUS_POLL_MAX_DELAY)
+
+        self._record(start_time, contended)
+
+    def release(self, port: serial.Serial) -> None:
+        """Give the bus back.
+
+        Args:
+            * port: The serial port given to :meth:`acquire`
+        """
+        if self._locked_fd is not None:
+            # Closing the port has already released the lock
+            if port.is_open:
+                fcntl.flock(self._locked_fd, fcntl.LOCK_UN)
+            self._locked_fd = None
+        self._lock.release()
+
+    def _try_lock_port(self, port: serial.Serial) -> bool:
+        """Try to take the advisory lock of the serial port, without waiting."""
+        if fcntl is None or getattr(port, "exclusive", None):
+            return True  # pySerial manages the lock itself, also at reconfiguration
+        try:
+            fd = port.fileno()
+        except (AttributeError, io.UnsupportedOperation, serial.SerialException):
+            return True  # Not a POSIX serial port
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self._locked_fd = fd
+        return True
+
+    def _record(self, start_time: float, contended: bool) -> None:
+        """Update the metrics after taking the bus."""
+        wait_time = time.monotonic() - start_time
+        self.transactions += 1
+        self.wait_time += wait_time
+        if contended:
+            self.contended += 1
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def _give_up(self, start_time: float) -> None:
+        """Raise BusBusyError, as the bus did not become free in time."""
+        self.busy += 1
+        raise BusBusyError(
+            "The serial port {} is busy: not free after {:.1f} ms".format(
+                self.portname,
+                (time.monotonic() - start_time) * _SECONDS_TO_MILLISECONDS,
+            )
+        )
+
+
+class BusTiming:
+    """Delays between the Modbus transactions on one serial port.
+
+    All the instruments using the same port name share it, see
+    :attr:`Instrument.bus_timing`. At the end of each transaction it computes
+    when the bus is free for the next request: after the silent period of 3.5
+    character times plus the :attr:`turnaround_delay`, or after the
+    :attr:`broadcast_delay`. The next transaction waits only for what is left of
+    that delay, so back-to-back transactions run at the fastest allowed rate, and
+    a broadcast does not block the caller.
+
+    The character times are computed once per baudrate. The waits are done with
+    :func:`time.sleep` and then, for the last 0.3 ms (2 ms on Windows), by
+    spinning on :func:`time.perf_counter`, as a sleep may last longer than asked.
+    At high baudrates that would be several character times.
+
+    Not used in Modbus TCP mode, where the gateway times the serial line.
+    """
+
+    def __init__(self) -> None:
+        self.turnaround_delay = 0.0
+        """Extra silence after a response before the next request, in seconds
+        (float), for slaves that need some time before listening again.
+        Defaults to 0."""
+
+        self.broadcast_delay = _BROADCAST_DELAY
+        """Silence after a broadcast, so the slaves can process it before the next
+        request, in seconds (float). Defaults to 0.2 s."""
+
+        self.inter_character_timeout = 0.0
+        """Longest silence allowed within a frame (1.5 character times), in seconds
+        (float). Read only."""
+
+        self.inter_frame_delay = 0.0
+        """Shortest silence between frames (3.5 character times), in seconds
+        (float). Read only."""
+
+        self.end_of_frame_silence = 0.0
+        """Silence that ends a received frame, in seconds (float). Longer than
+        :attr:`inter_frame_delay`, as USB serial adapters deliver the received
+        bytes in bursts. Read only."""
+
+        self._baudrate: Optional[Union[int, float]] = None
+        self._bus_free_time = 0.0  # time.perf_counter() value
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.BusTiming` object."""
+        template = (
+            "{}.{}<id=0x{:x}, baudrate={}, inter_frame_delay={:.6f}, "
+            + "turnaround_delay={}, broadcast_delay={}>"
+        )
+        return template.format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self._baudrate,
+            self.inter_frame_delay,
+            self.turnaround_delay,
+            self.broadcast_delay,
+        )
+
+    def time_to_wait(self) -> float:
+        """Give the time left before the next request may be sent, in seconds."""
+        return max(self._bus_free_time - time.perf_counter(), 0.0)
 
-        # Check combinations: number of bits
-        if payloadformat == _Payloadformat.BIT:
-            if number_of_bits != 1:
-                raise ValueError(
-                    "For BIT payload format the number of bits should be 1. "
-                    + "Given: {0!r}.".format(number_of_bits)
-                )
-        elif payloadformat == _Payloadformat.BITS:
-            if number_of_bits < 1:
-                raise ValueError(
-                    "For BITS payload format the number of bits should be at least 1. "
-                    + "Given: {0!r}.".format(number_of_bits)
-                )
-        elif number_of_bits:
-            raise ValueError(
-                "The number_of_bits parameter is wrong for payload format "
-                + "{0!r}. Given: {1!r}.".format(payloadformat, number_of_bits)
-            )
+    def wait(self) -> float:
+        """Wait until the next request may be sent.
 
-        # Check combinations: Number of registers
-        if functioncode in [1, 2, 5, 15] and number_of_registers:
-            raise ValueError(
-                "The number_of_registers is not valid for this function code. "
-                + "number_of_registers: {0!r}, functioncode {1}.".format(
-                    number_of_registers, functioncode
+        Returns:
+            The time waited, in seconds.
+        """
+        start_time = time.perf_counter()
+        remaining = self._bus_free_time - start_time
+        if remaining <= 0:
+            return 0.0
+        if remaining > _SPIN_TIME:
+            time.sleep(remaining - _SPIN_TIME)
+        while time.perf_counter() < self._bus_free_time:
+            pass
+        return time.perf_counter() - start_time
+
+    async def wait_async(self) -> float:
+        """Wait until the next request may be sent, see :meth:`wait`."""
+        start_time = time.perf_counter()
+        remaining = self._bus_free_time - start_time
+        if remaining <= 0:
+            return 0.0
+        if remaining > _SPIN_TIME:
+            await asyncio.sleep(remaining - _SPIN_TIME)
+        while time.perf_counter() < self._bus_free_time:
+            pass
+        return time.perf_counter() - start_time
+
+    def _set_baudrate(self, baudrate: Union[int, float]) -> None:
+        """Compute the character times, if the baudrate has changed."""
+        if baudrate == self._baudrate:
+            return
+        self.inter_character_timeout = _calculate_inter_character_timeout(baudrate)
+        self.inter_frame_delay = _calculate_minimum_silent_period(baudrate)
+        self.end_of_frame_silence = _calculate_end_of_frame_silence(baudrate)
+        self._baudrate = baudrate
+
+    def _end_of_transaction(self, broadcast: bool) -> None:
+        """Compute when the bus is free, at the end of the response (or request)."""
+        delay = self.inter_frame_delay + self.turnaround_delay
+        if broadcast:
+            delay = max(self.broadcast_delay, self.inter_frame_delay)
+        self._bus_free_time = time.perf_counter() + delay
+
+
+def _get_bus_arbiter(port: serial.Serial) -> BusArbiter:
+    """Return the arbiter of the serial port, creating it at first use.
+
+    The ports with the same name share an arbiter. A port object without name
+    has its own arbiter, as nothing tells which bus it is on.
+    """
+    key: Union[str, int] = port.port or id(port)
+    with _bus_arbiters_lock:
+        arbiter = _bus_arbiters.get(key)
+        if arbiter is None:
+            arbiter = _bus_arbiters[key] = BusArbiter(port.port or "")
+        return arbiter
+
+
+def _remaining_time(start_time: float, timeout: Optional[float]) -> Optional[float]:
+    """Return the seconds left before the timeout, or ``None`` for no timeout."""
+    if timeout is None:
+        return None
+    return start_time + timeout - time.monotonic()
+
+
+# ########## #
+# Bus master #
+# ########## #
+
+
+class BusMaster:
+    """Run the requests for several slaves on one serial port, by priority.
+
+    Args:
+        * port: The serial port name, for example ``/dev/ttyUSB0`` (Linux),
+          ``/dev/tty.usbserial`` (OS X) or ``COM4`` (Windows).
+          It is also possible to pass in an already opened ``serial.Serial`` object.
+        * mode: Modbus mode of all the slaves on the bus. Can be
+          :data:`minimalmodbus.MODE_RTU` or :data:`minimalmodbus.MODE_ASCII`.
+          For a ``tcp://host:port`` URL the mode is set to
+          :data:`minimalmodbus.MODE_TCP`, as by :class:`Instrument`.
+
+    The requests are :class:`PreparedCommand` objects, created by the
+    :meth:`Instrument.prepare_read` and :meth:`Instrument.prepare_write` methods of
+    the instruments returned by :meth:`instrument`. Submitting a request returns a
+    :class:`concurrent.futures.Future` with the result of :meth:`Instrument.execute`::
+
+        bus = minimalmodbus.BusMaster("/dev/ttyUSB0")
+        bus.instrument(1).serial.baudrate = 9600  # Shared by all the slaves
+        command = bus.instrument(1).prepare_read(289, 2)
+        with bus:
+            future = bus.submit(command, minimalmodbus.PRIORITY_POLL)
+            print(future.result())
+
+    A worker thread executes the requests back-to-back, leaving only the silent
+    period between the frames: first the :data:`PRIORITY_WRITE` requests, then
+    :data:`PRIORITY_POLL` and last :data:`PRIORITY_SCAN`, each class in order of
+    submission. Requests submitted before :meth:`start` are executed when it is
+    called. After :meth:`close` no request can be submitted.
+    """
+
+    def __init__(self, port: Union[str, serial.Serial], mode: str = MODE_RTU) -> None:
+        """Initialize the bus master. The worker thread is started by :meth:`start`."""
+        _check_mode(mode)
+        if isinstance(port, str) and port.startswith(_MODBUS_TCP_URL_SCHEME):
+            mode = MODE_TCP
+        self.port = port
+        self.mode = mode
+        self._instruments: Dict[int, Instrument] = {}
+        self._instruments_lock = threading.Lock()
+        # Items: (priority, sequence number, command, future)
+        self._queue: "queue.PriorityQueue[Tuple[int, int, Any, Any]]" = (
+            queue.PriorityQueue()
+        )
+        self._sequence = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._state_lock = threading.Lock()  # For _thread, _closed and the queue
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.BusMaster` object."""
+        return "{}.{}<id=0x{:x}, port={!r}, mode={}, slaves={}, pending={}>".format(
+            self.__module__,
+            self.__class__.__name__,
+            id(self),
+            self.port,
+            self.mode,
+            sorted(self._instruments),
+            self._queue.qsize(),
+        )
+
+    def __enter__(self) -> "BusMaster":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def instrument(self, slaveaddress: int) -> Instrument:
+        """Return the instrument for a slave on the bus, creating it at first use.
+
+        Args:
+            * slaveaddress: Slave address in the range 0 to 247.
+
+        Returns:
+            The :class:`Instrument`, sharing the serial port with the other slaves.
+            Use it to prepare the commands, and to change its attributes.
+
+        Raises:
+            TypeError, ValueError, ModbusException
+        """
+        _check_slaveaddress(slaveaddress)
+        with self._instruments_lock:
+            instrument = self._instruments.get(slaveaddress)
+            if instrument is None:
+                instrument = self._instruments[slaveaddress] = Instrument(
+                    self.port, slaveaddress, self.mode
                 )
+            return instrument
+
+    def start(self) -> None:
+        """Start the worker thread executing the requests.
+
+        Raises:
+            RuntimeError if the bus master is closed.
+        """
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("The bus master is closed")
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="BusMaster {}".format(self.port), daemon=True
             )
-        if functioncode in [3, 4, 16] and not number_of_registers:
-            raise ValueError(
-                "The number_of_registers must be > 0 for functioncode "
-                + "{}.".format(functioncode)
-            )
-        if functioncode == 6 and number_of_registers != 1:
-            raise ValueError(
-                "The number_of_registers must be 1 for functioncode 6. "
-                + "Given: {}.".format(number_of_registers)
-            )
-        if (
-            functioncode == 16
-            and payloadformat == _Payloadformat.REGISTER
-            and number_of_registers != 1
-        ):
-            raise ValueError(
-                "Wrong number_of_registers when writing to a "
-                + "single register. Given {0!r}.".format(number_of_registers)
-            )
-            # Note: For function code 16 there is checking also in the content
-            # conversion functions.
+            self._thread.start()
 
-        # Number of registers for float and long
-        if payloadformat == _Payloadformat.FLOAT and number_of_registers not in [2, 4]:
-            raise ValueError(
-                "The number of registers for float must be 2 or 4. "
-                + "Given {0!r}".format(number_of_registers)
+    def close(self, cancel_pending: bool = True) -> None:
+        """Stop the worker thread. No request can be submitted afterwards.
+
+        Args:
+            * cancel_pending: Cancel the requests not executed yet. If
+              :const:`False`, wait for them to be executed first. Without
+              worker thread (if not started) they are always cancelled.
+        """
+        with self._state_lock:
+            self._closed = True
+            thread = self._thread
+            self._thread = None
+        if cancel_pending or thread is None:
+            while True:
+                try:
+                    _, _, _, future = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if future is not None:
+                    future.cancel()
+        if thread is not None:
+            # After all the requests, whatever their priority
+            self._queue.put((_PRIORITY_STOP, next(self._sequence), None, None))
+            thread.join()
+
+    def submit(
+        self, command: PreparedCommand, priority: int = PRIORITY_POLL
+    ) -> "concurrent.futures.Future[Any]":
+        """Queue a request for execution by the worker thread.
+
+        Args:
+            * command: Prepared by an instrument returned by :meth:`instrument`.
+            * priority: :data:`PRIORITY_WRITE`, :data:`PRIORITY_POLL` or
+              :data:`PRIORITY_SCAN`.
+
+        Returns:
+            A future, with the result of :meth:`Instrument.execute`. Cancelling it
+            before it runs removes the request from the bus.
+
+        Raises:
+            TypeError, ValueError, RuntimeError if the bus master is closed.
+        """
+        if not isinstance(command, PreparedCommand):
+            raise TypeError(
+                "The command must be a PreparedCommand. Given: {!r}".format(command)
             )
-        if payloadformat == _Payloadformat.LONG and number_of_registers not in [2, 4]:
+        _check_int(
+            priority,
+            minvalue=PRIORITY_WRITE,
+            maxvalue=PRIORITY_SCAN,
+            description="priority",
+        )
+        if command.slaveaddress not in self._instruments or command.mode != self.mode:
             raise ValueError(
-                "The number of registers for long must be 2 or 4. "
-                + "Given {0!r}".format(number_of_registers)
+                "The command for slave address {} in {} mode ".format(
+                    command.slaveaddress, command.mode
+                )
+                + "is not prepared by an instrument of this bus."
             )
+        future: "concurrent.futures.Future[Any]" = concurrent.futures.Future()
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("The bus master is closed")
+            self._queue.put((priority, next(self._sequence), command, future))
+        return future
 
-        # Check combinations: Value
-        if functioncode in [5, 6, 15, 16] and value is None:
-            raise ValueError(
-                "The input value must be given for this function code. "
-                + "Given {0!r} and {1}.".format(value, functioncode)
-            )
-        if functioncode in [1, 2, 3, 4] and value is not None:
-            raise ValueError(
-                "The input value should not be given for this function code. "
-                + "Given {0!r} and {1}.".format(value, functioncode)
+    def read_registers(
+        self,
+        slaveaddress: int,
+        registeraddress: int,
+        number_of_registers: int,
+        functioncode: int = 3,
+        priority: int = PRIORITY_POLL,
+    ) -> "concurrent.futures.Future[Any]":
+        """Queue the reading of integers from 16-bit registers in a slave.
+
+        For argument descriptions, see :meth:`Instrument.prepare_read` and
+        :meth:`submit`.
+
+        Returns:
+            A future, with the list of register values.
+        """
+        command = self.instrument(slaveaddress).prepare_read(
+            registeraddress, number_of_registers, functioncode
+        )
+        return self.submit(command, priority)
+
+    def write_registers(
+        self,
+        slaveaddress: int,
+        registeraddress: int,
+        values: List[int],
+        functioncode: int = 16,
+        priority: int = PRIORITY_WRITE,
+    ) -> "concurrent.futures.Future[Any]":
+        """Queue the writing of integers to 16-bit registers in a slave.
+
+        For argument descriptions, see :meth:`Instrument.prepare_write` and
+        :meth:`submit`.
+
+        Returns:
+            A future, with result ``None``.
+        """
+        command = self.instrument(slaveaddress).prepare_write(
+            registeraddress, values, functioncode
+        )
+        return self.submit(command, priority)
+
+    def _run(self) -> None:
+        """Execute the queued requests, until stopped by :meth:`close`."""
+        while True:
+            _, _, command, future = self._queue.get()
+            if command is None or future is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue  # Cancelled
+            try:
+                result = self._instruments[command.slaveaddress].execute(command)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+# ############################# #
+# Modbus instrument for asyncio #
+# ############################# #
+
+
+class AsyncInstrument(Instrument):
+    """Instrument for talking to a slave from an :mod:`asyncio` event loop.
+
+    The constructor arguments and the attributes are the same as for
+    :class:`Instrument`, but the methods for talking to the slave are
+    coroutines::
+
+        instrument = minimalmodbus.AsyncInstrument("/dev/ttyUSB1", 1)
+        temperature = await instrument.read_register(289, 1)
+
+    The requests are built and the responses parsed by the same functions as for
+    :class:`Instrument`. The serial port file descriptor is used in non-blocking
+    mode and the event loop is told when it is readable, so the silent period,
+    the wait for the response and the broadcast delay do not block the loop.
+    One event loop can then drive several serial ports and slaves.
+
+    The methods check their arguments and build the requests with the same
+    helpers as :class:`Instrument`, and send them with :meth:`execute`.
+
+    The transactions on a serial port are serialized by its :class:`BusArbiter`,
+    also with the instruments used from other threads and processes. A
+    coroutine waiting for the bus polls the arbiter, so the wait is bounded by
+    :attr:`bus_timeout`.
+
+    Needs a serial port object with a file descriptor, as on POSIX systems.
+    """
+
+    def __init__(
+        self,
+        port: Union[str, serial.Serial],
+        slaveaddress: int,
+        mode: str = MODE_RTU,
+        close_port_after_each_call: bool = False,
+        debug: bool = False,
+    ) -> None:
+        """Initialize instrument and open corresponding serial port."""
+        super().__init__(port, slaveaddress, mode, close_port_after_each_call, debug)
+        # Closed ports are checked when opened by the first transaction
+        if self.serial is not None and self.serial.is_open:
+            self._check_file_descriptor()
+
+    def _check_file_descriptor(self) -> None:
+        """Check that the serial port has a file descriptor for the event loop.
+
+        Raises:
+            MasterReportedException
+        """
+        assert self.serial is not None
+        try:
+            self.serial.fileno()
+        except (io.UnsupportedOperation, OSError, AttributeError) as exc:
+            raise MasterReportedException(
+                "The serial port has no file descriptor, "
+                + "it can not be used with AsyncInstrument"
+            ) from exc
+
+    # ################################# #
+    #  Methods for talking to the slave #
+    # ################################# #
+
+    async def read_bit(  # type: ignore[override]
+        self, registeraddress: int, functioncode: int = 2
+    ) -> int:
+        """Read one bit from the slave (instrument).
+
+        See :meth:`Instrument.read_bit`.
+        """
+        return int(
+            await self.execute(self._prepare_read_bit(registeraddress, functioncode))
+        )
+
+    async def write_bit(  # type: ignore[override]
+        self, registeraddress: int, value: int, functioncode: int = 5
+    ) -> None:
+        """Write one bit to the slave (instrument).
+
+        See :meth:`Instrument.write_bit`.
+        """
+        await self.execute(
+            self._prepare_write_bit(registeraddress, value, functioncode)
+        )
+
+    async def read_bits(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        number_of_bits: int,
+        functioncode: int = 2,
+        packed: bool = False,
+    ) -> Union[List[int], int]:
+        """Read multiple bits from the slave (instrument).
+
+        See :meth:`Instrument.read_bits`.
+        """
+        command = self._prepare_read_bits(
+            registeraddress, number_of_bits, functioncode, packed
+        )
+        returnvalue = await self.execute(command)
+        if packed:
+            assert isinstance(returnvalue, int)
+            return returnvalue
+
+        # Make sure that we really return a list of integers
+        assert isinstance(returnvalue, list)
+        return [int(x) for x in returnvalue]
+
+    async def write_bits(  # type: ignore[override]
+        self, registeraddress: int, values: List[int]
+    ) -> None:
+        """Write multiple bits to the slave (instrument).
+
+        See :meth:`Instrument.write_bits`.
+        """
+        await self.execute(self._prepare_write_bits(registeraddress, values))
+
+    async def read_register(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        number_of_decimals: int = 0,
+        functioncode: int = 3,
+        signed: bool = False,
+    ) -> Union[int, float]:
+        """Read an integer from one 16-bit register in the slave, possibly scaling it.
+
+        See :meth:`Instrument.read_register`.
+        """
+        return await self.execute(
+            self._prepare_read_register(
+                registeraddress, number_of_decimals, functioncode, signed
             )
+        )
 
-        # Check combinations: Value for numerical
-        if (
-            functioncode == 16
-            and payloadformat
-            in [
-                _Payloadformat.REGISTER,
-                _Payloadformat.FLOAT,
-                _Payloadformat.LONG,
-            ]
-        ) or (functioncode == 6 and payloadformat == _Payloadformat.REGISTER):
-            if not isinstance(value, (int, float)):
-                raise TypeError(f"The input value must be numerical. Given: {value!r}")
+    async def write_register(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        value: Union[int, float],
+        number_of_decimals: int = 0,
+        functioncode: int = 16,
+        signed: bool = False,
+    ) -> None:
+        """Write an integer to one 16-bit register in the slave, possibly scaling it.
 
-        # Check combinations: Value for string
-        if functioncode == 16 and payloadformat == _Payloadformat.STRING:
-            if not isinstance(value, str):
-                raise TypeError(f"The input should be a string. Given: {value!r}")
-            _check_string(
-                value, "input string", minlength=1, maxlength=number_of_register_bytes
+        See :meth:`Instrument.write_register`.
+        """
+        await self.execute(
+            self._prepare_write_register(
+                registeraddress, value, number_of_decimals, functioncode, signed
             )
-            # Note: The string might be padded later, so the length might be shorter
-            # than number_of_register_bytes.
+        )
 
-        # Check combinations: Value for registers
-        if functioncode == 16 and payloadformat == _Payloadformat.REGISTERS:
-            if not isinstance(value, list):
-                raise TypeError(
-                    "The value parameter for payloadformat REGISTERS must be a list. "
-                    + "Given {0!r}.".format(value)
-                )
+    async def read_long(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        functioncode: int = 3,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        number_of_registers: int = 2,
+    ) -> int:
+        """Read a long integer (32 or 64 bits) from the slave.
 
-            if len(value) != number_of_registers:
-                raise ValueError(
-                    "The list length does not match number of registers. "
-                    + "List: {0!r},  Number of registers: {1!r}.".format(
-                        value, number_of_registers
-                    )
+        See :meth:`Instrument.read_long`.
+        """
+        return int(
+            await self.execute(
+                self._prepare_read_long(
+                    registeraddress,
+                    functioncode,
+                    signed,
+                    byteorder,
+                    number_of_registers,
                 )
+            )
+        )
 
-        # Check combinations: Value for bit
-        if functioncode in [5, 15] and payloadformat == _Payloadformat.BIT:
-            if not isinstance(value, int):
-                raise TypeError(f"The input should be an integer. Given: {value!r}")
-            _check_int(
-                value,
-                minvalue=0,
-                maxvalue=1,
-                description="input value for payload format BIT",
+    async def write_long(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        value: int,
+        signed: bool = False,
+        byteorder: int = BYTEORDER_BIG,
+        number_of_registers: int = 2,
+    ) -> None:
+        """Write a long integer (32 or 64 bits) to the slave.
+
+        See :meth:`Instrument.write_long`.
+        """
+        await self.execute(
+            self._prepare_write_long(
+                registeraddress, value, signed, byteorder, number_of_registers
             )
+        )
 
-        # Check combinations: Value for bits
-        if functioncode == 15 and payloadformat == _Payloadformat.BITS:
-            if not isinstance(value, list):
-                raise TypeError(
-                    "The value parameter for payloadformat BITS must be a list. "
-                    + "Given {0!r}.".format(value)
-                )
+    async def read_float(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        functioncode: int = 3,
+        number_of_registers: int = 2,
+        byteorder: int = BYTEORDER_BIG,
+    ) -> float:
+        """Read a floating point number from the slave.
 
-            if len(value) != number_of_bits:
-                raise ValueError(
-                    "The list length does not match number of bits. "
-                    + "List: {0!r},  Number of registers: {1!r}.".format(
-                        value, number_of_registers
-                    )
+        See :meth:`Instrument.read_float`.
+        """
+        return float(
+            await self.execute(
+                self._prepare_read_float(
+                    registeraddress, functioncode, number_of_registers, byteorder
                 )
-
-        # Create payload
-        payload_to_slave = _create_payload(
-            functioncode,
-            registeraddress,
-            value,
-            number_of_decimals,
-            number_of_registers,
-            number_of_bits,
-            signed,
-            byteorder,
-            payloadformat,
+            )
         )
 
-        # Communicate with instrument
-        payload_from_slave = self._perform_command(functioncode, payload_to_slave)
-
-        # There is no response for broadcasts
-        if self.address == _SLAVEADDRESS_BROADCAST:
-            return None
+    async def write_float(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        value: Union[int, float],
+        number_of_registers: int = 2,
+        byteorder: int = BYTEORDER_BIG,
+    ) -> None:
+        """Write a floating point number to the slave.
 
-        # Parse response payload
-        return _parse_payload(
-            payload_from_slave,
-            functioncode,
-            registeraddress,
-            value,
-            number_of_decimals,
-            number_of_registers,
-            number_of_bits,
-            signed,
-            byteorder,
-            payloadformat,
+        See :meth:`Instrument.write_float`.
+        """
+        await self.execute(
+            self._prepare_write_float(
+                registeraddress, value, number_of_registers, byteorder
+            )
         )
 
-    # #################################### #
-    # Communication implementation details #
-    # #################################### #
+    async def read_string(  # type: ignore[override]
+        self, registeraddress: int, number_of_registers: int = 16, functioncode: int = 3
+    ) -> str:
+        """Read an ASCII string from the slave.
 
-    def _perform_command(self, functioncode: int, payload_to_slave: bytes) -> bytes:
-        """Perform the command having the *functioncode*.
+        See :meth:`Instrument.read_string`.
+        """
+        return str(
+            await self.execute(
+                self._prepare_read_string(
+                    registeraddress, number_of_registers, functioncode
+                )
+            )
+        )
 
-        Args:
-            * functioncode: The function code for the command to be performed.
-              Can for example be 'Write register' = 16.
-            * payload_to_slave: Data to be transmitted to the slave (will be
-              embedded in slaveaddress, CRC etc)
+    async def write_string(  # type: ignore[override]
+        self, registeraddress: int, textstring: str, number_of_registers: int = 16
+    ) -> None:
+        """Write an ASCII string to the slave.
 
-        Returns:
-            The extracted data payload from the slave. It has been
-            stripped of CRC etc.
+        See :meth:`Instrument.write_string`.
+        """
+        await self.execute(
+            self._prepare_write_string(registeraddress, textstring, number_of_registers)
+        )
 
-        Raises:
-            TypeError, ValueError, ModbusException,
-            serial.SerialException (inherited from IOError)
+    async def read_registers(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        functioncode: int = 3,
+        as_array: bool = False,
+    ) -> Union[List[int], "array.array[int]"]:
+        """Read integers from 16-bit registers in the slave.
 
-        Makes use of the :meth:`_communicate` method. The request is generated
-        with the :func:`_embed_payload` function, and the parsing of the
-        response is done with the :func:`_extract_payload` function.
+        See :meth:`Instrument.read_registers`.
         """
-        DEFAULT_NUMBER_OF_BYTES_TO_READ = 1000
+        returnvalue = await self.execute(
+            self._prepare_read_registers(
+                registeraddress, number_of_registers, functioncode, as_array
+            )
+        )
+        # Make sure that we really return a list (or array) of integers
+        assert isinstance(returnvalue, (list, array.array))
+        return returnvalue
 
-        _check_functioncode(functioncode, None)
-        _check_bytes(payload_to_slave, description="payload")
+    async def read_registers_scaled(  # type: ignore[override]
+        self,
+        registeraddress: int,
+        number_of_registers: int,
+        scale: Union[float, List[float], Tuple[float, ...]] = 1.0,
+        offset: Union[float, List[float], Tuple[float, ...]] = 0.0,
+        signed: bool = False,
+        functioncode: int = 3,
+        as_numpy: bool = False,
+    ) -> Any:
+        """Read 16-bit registers in the slave, and scale them to floats.
 
-        # Build request
-        request_bytes = _embed_payload(
-            self.address, self.mode, functioncode, payload_to_slave
+        See :meth:`Instrument.read_registers_scaled`.
+        """
+        return await self.execute(
+            self.prepare_read_scaled(
+                registeraddress,
+                number_of_registers,
+                scale,
+                offset,
+                signed,
+                functioncode,
+                as_numpy,
+            )
         )
 
-        # Calculate number of bytes to read
-        number_of_bytes_to_read = DEFAULT_NUMBER_OF_BYTES_TO_READ
-        if self.address == _SLAVEADDRESS_BROADCAST:
-            number_of_bytes_to_read = 0
-        elif self.precalculate_read_size:
-            try:
-                number_of_bytes_to_read = _predict_response_size(
-                    self.mode, functioncode, payload_to_slave
-                )
-            except Exception:
-                if self.debug:
-                    template = (
-                        "Could not precalculate response size for Modbus {} mode. "
-                        + "Will read {} bytes. Request: {!r}"
-                    )
-                    self._print_debug(
-                        template.format(
-                            self.mode, number_of_bytes_to_read, request_bytes
-                        )
-                    )
+    async def write_registers(  # type: ignore[override]
+        self, registeraddress: int, values: List[int]
+    ) -> None:
+        """Write integers to 16-bit registers in the slave.
 
-        # Communicate
-        response_bytes = self._communicate(request_bytes, number_of_bytes_to_read)
+        See :meth:`Instrument.write_registers`.
+        """
+        await self.execute(self._prepare_write_registers(registeraddress, values))
 
-        if number_of_bytes_to_read == 0:
-            return b""
+    async def execute(self, command: PreparedCommand) -> Any:  # type: ignore[override]
+        """Execute a prepared command.
 
-        # Extract payload
-        payload_from_slave = _extract_payload(
-            response_bytes, self.address, self.mode, functioncode
+        See :meth:`Instrument.execute`.
+        """
+        self._check_command(command)
+        response_bytes = await self._communicate_async(
+            command.request, command.number_of_bytes_to_read
         )
-        return payload_from_slave
 
-    def _communicate(self, request: bytes, number_of_bytes_to_read: int) -> bytes:
-        """Talk to the slave via a serial port.
+        # There is no response for broadcasts
+        if command.number_of_bytes_to_read == 0:
+            return None
+
+        return self._decode_response(command, response_bytes)
+
+    # #################################### #
+    # Communication implementation details #
+    # #################################### #
+
+    async def _communicate_async(
+        self, request: bytes, number_of_bytes_to_read: int
+    ) -> bytes:
+        """Talk to the slave via a serial port, without blocking the event loop.
 
         Args:
             * request: The raw request that is to be sent to the slave.
@@ -1375,105 +4193,87 @@ class Instrument:
             TypeError, ValueError, ModbusException,
             serial.SerialException (inherited from IOError)
 
-        Sleeps if the previous message arrived less than the "silent period" ago.
-
-        Will block until reaching *number_of_bytes_to_read* or timeout.
-
-        Additional delay will be used after broadcast transmissions (slave address 0).
-
-        If the attribute :attr:`Instrument.debug` is :const:`True`, the communication
-        details are printed.
-
-        If the attribute :attr:`Instrument.close_port_after_each_call` is :const:`True`
-        the serial port is closed after each call.
-
-        Timing::
-
-                            Request from master (Master is writing)
-                            |
-                            |                             Response from slave
-                            |                             (Master is reading)
-                            |                             |
-            --------R-------W-----------------------------R-------W--------------------
-                     |     |                               |
-                     |     |<------- Roundtrip time ------>|
-                     |     |
-                  -->|-----|<----- Silent period
-
-        The resolution for Python's :py:func:`time.time()` is lower on Windows than
-        on Linux.
-        It is about 16 ms on Windows according to
-        stackoverflow.com/questions/157359/accurate-timestamping-in-python-logging
+        Same behaviour as :meth:`Instrument._communicate`, but the transaction
+        holds the lock of the serial port and all the waiting is done by the
+        event loop.
         """
         _check_bytes(request, minlength=1, description="request")
         _check_int(number_of_bytes_to_read)
 
-        self._print_debug(
-            "Will write to instrument (expecting {} bytes back): {}".format(
-                number_of_bytes_to_read, _describe_bytes(request)
-            )
-        )
-
         if self.serial is None:
             raise ModbusException("The serial port instance is None")
 
-        if not self.serial.is_open:
-            self._print_debug("Opening port {}".format(self.serial.port))
-            self.serial.open()
-
         portname: str = ""
         if self.serial.port is not None:
             portname = self.serial.port
 
-        if self.clear_buffers_before_each_transaction:
-            self._print_debug("Clearing serial buffers for port {}".format(portname))
-            self.serial.reset_input_buffer()
-            self.serial.reset_output_buffer()
+        if self.debug:
+            self._print_debug(
+                "Will write to instrument (expecting {} bytes back): {}".format(
+                    number_of_bytes_to_read, _describe_bytes(request)
+                )
+            )
 
-        # Sleep to make sure 3.5 character times have passed
-        minimum_silent_period = _calculate_minimum_silent_period(self.serial.baudrate)
-        time_since_read = time.monotonic() - _latest_read_times.get(portname, 0)
+        if not self.serial.is_open:
+            self._print_debug("Opening port {}".format(portname))
+            self.serial.open()
+            self._check_file_descriptor()
 
-        if time_since_read < minimum_silent_period:
-            sleep_time = minimum_silent_period - time_since_read
+        arbiter = _get_bus_arbiter(self.serial)
+        await arbiter.acquire_async(self.serial, self.bus_timeout)
+        try:
+            return await self._transaction_async(
+                request, number_of_bytes_to_read, portname
+            )
+        finally:
+            arbiter.release(self.serial)
 
-            if self.debug:
-                template = (
-                    "Sleeping {:.2f} ms before sending. "
-                    + "Minimum silent period: {:.2f} ms, time since read: {:.2f} ms."
-                )
-                text = template.format(
-                    sleep_time * _SECONDS_TO_MILLISECONDS,
-                    minimum_silent_period * _SECONDS_TO_MILLISECONDS,
-                    time_since_read * _SECONDS_TO_MILLISECONDS,
-                )
-                self._print_debug(text)
+    async def _transaction_async(
+        self, request: bytes, number_of_bytes_to_read: int, portname: str
+    ) -> bytes:
+        """Do one transaction on the bus, holding the serial port.
+
+        For argument descriptions, see the :meth:`_communicate_async` method.
+        """
+        assert self.serial is not None
+        if self.clear_buffers_before_each_transaction:
+            self._print_debug("Clearing serial buffers for port {}".format(portname))
+            self.serial.reset_input_buffer()
+            self.serial.reset_output_buffer()
 
-            time.sleep(sleep_time)
+        if self.mode == MODE_TCP:
+            request = _set_transaction_id(request, portname)
 
-        elif self.debug:
-            template = (
-                "No sleep required before write. Time since "
-                + "previous read: {:.2f} ms, minimum silent period: {:.2f} ms."
-            )
-            text = template.format(
-                time_since_read * _SECONDS_TO_MILLISECONDS,
-                minimum_silent_period * _SECONDS_TO_MILLISECONDS,
-            )
-            self._print_debug(text)
+        # Wait for the silent period after the previous frame
+        timing = _get_bus_arbiter(self.serial).timing
+        sleep_time = 0.0
+        if self.mode != MODE_TCP:
+            timing._set_baudrate(self.serial.baudrate)
+            if self.debug:
+                self._print_debug(
+                    "Waiting {:.2f} ms before sending.".format(
+                        timing.time_to_wait() * _SECONDS_TO_MILLISECONDS
+                    )
+                )
+            sleep_time = await timing.wait_async()
 
         # Write request
         write_time = time.monotonic()
-        self.serial.write(request)
+        await self._write_async(request)
+        if self.trace is not None:
+            self.trace._record(TRACE_REQUEST, request, None)
 
         # Read and discard local echo
         if self.handle_local_echo:
-            local_echo_to_discard = self.serial.read(len(request))
+            local_echo_to_discard = await self._read_async(
+                len(request), self.serial.timeout
+            )
             if self.debug:
-                text = "Discarding this local echo: {}".format(
-                    _describe_bytes(local_echo_to_discard),
+                self._print_debug(
+                    "Discarding this local echo: {}".format(
+                        _describe_bytes(local_echo_to_discard)
+                    )
                 )
-                self._print_debug(text)
             if local_echo_to_discard != request:
                 template = (
                     "Local echo handling is enabled, but the local echo does "
@@ -1487,47 +4287,206 @@ class Instrument:
                 raise LocalEchoError(text)
 
         # Read response
+        functioncode = _get_functioncode_of_request(request, self.mode)
         if number_of_bytes_to_read > 0:
-            answer = self.serial.read(number_of_bytes_to_read)
+            timeout = self.serial.timeout
+            if self.adaptive_timeout is not None:
+                timeout = self.adaptive_timeout.get_timeout(
+                    functioncode, number_of_bytes_to_read
+                )
+            answer = await self._read_response_async(number_of_bytes_to_read, timeout)
+            while self.mode == MODE_TCP and answer and answer[:2] != request[:2]:
+                if self.debug:
+                    self._print_debug(
+                        "Discarding the response to an earlier request: {}".format(
+                            _describe_bytes(answer)
+                        )
+                    )
+                answer = await self._read_response_async(
+                    number_of_bytes_to_read, timeout
+                )
         else:
             answer = b""
-            self.serial.flush()
+            await asyncio.get_running_loop().run_in_executor(None, self.serial.flush)
 
         read_time = time.monotonic()
-        _latest_read_times[portname] = read_time
+        if self.mode != MODE_TCP:
+            timing._end_of_transaction(number_of_bytes_to_read == 0)
         roundtrip_time = read_time - write_time
         self._latest_roundtrip_time = roundtrip_time
+        if number_of_bytes_to_read > 0:
+            if self.trace is not None:
+                self.trace._record(TRACE_RESPONSE, answer, roundtrip_time)
+            if self.adaptive_timeout is not None:
+                self.adaptive_timeout._record(
+                    functioncode,
+                    number_of_bytes_to_read,
+                    roundtrip_time if answer else None,
+                )
+        self.metrics._record_transaction(
+            functioncode,
+            len(request),
+            len(answer),
+            number_of_bytes_to_read,
+            roundtrip_time,
+            sleep_time,
+        )
 
         if self.close_port_after_each_call:
             self._print_debug("Closing port {}".format(portname))
             self.serial.close()
 
         if self.debug:
-            if isinstance(self.serial.timeout, float):
-                timeout_time = self.serial.timeout * _SECONDS_TO_MILLISECONDS
-            else:
-                timeout_time = 0
-            text = (
-                "Response from instrument: {}, roundtrip time: {:.1f} ms."
-                " Timeout for reading: {:.1f} ms.\n"
-            ).format(
-                _describe_bytes(answer),
-                roundtrip_time,
-                timeout_time,
+            self._print_debug(
+                "Response from instrument: {}, roundtrip time: {:.1f} ms.\n".format(
+                    _describe_bytes(answer),
+                    roundtrip_time * _SECONDS_TO_MILLISECONDS,
+                )
             )
-            self._print_debug(text)
 
         if not answer and number_of_bytes_to_read > 0:
             raise NoResponseError("No communication with the instrument (no answer)")
 
-        if number_of_bytes_to_read == 0:
+        if number_of_bytes_to_read == 0 and self.mode != MODE_TCP:
             self._print_debug(
-                "Broadcast delay: Sleeping for {} s".format(_BROADCAST_DELAY)
+                "Broadcast delay: next request after {} s".format(
+                    timing.broadcast_delay
+                )
             )
-            time.sleep(_BROADCAST_DELAY)
 
         return answer
 
+    async def _read_response_async(
+        self, number_of_bytes_to_read: int, timeout: Optional[float]
+    ) -> bytes:
+        """Read the response from the slave, stopping at the end of the frame.
+
+        Args:
+            * number_of_bytes_to_read: Number of bytes expected
+            * timeout: Maximum time to wait for the response, in seconds. ``None``
+              waits forever.
+
+        See :meth:`Instrument._read_response`.
+        """
+        assert self.serial is not None
+        if self.mode == MODE_ASCII:
+            return await self._read_async(number_of_bytes_to_read, timeout)
+
+        predict_frame_length = _predict_rtu_frame_length
+        if self.mode == MODE_TCP:
+            predict_frame_length = _predict_tcp_frame_length
+        silent_period = None
+        if self.end_frame_on_silence and self.mode == MODE_RTU:
+            silent_period = self.bus_timing.end_of_frame_silence
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        answer = b""
+        expected = predict_frame_length(answer, number_of_bytes_to_read)
+        while len(answer) < expected:
+            size = expected - len(answer)
+            if answer and silent_period is not None:
+                timeout = silent_period
+            elif answer and deadline is not None:
+                timeout = max(deadline - loop.time(), 0.0)
+            chunk = await self._read_async(size, timeout, silent_period)
+            answer += chunk
+            if len(chunk) < size:
+                break  # Timeout or silence
+            expected = predict_frame_length(answer, number_of_bytes_to_read)
+        return answer
+
+    async def _read_async(
+        self, size: int, timeout: Optional[float], silent_period: Optional[float] = None
+    ) -> bytes:
+        """Read from the non-blocking serial port file descriptor.
+
+        Args:
+            * size: Maximum number of bytes to read
+            * timeout: Seconds to wait for the data (``None`` waits forever)
+            * silent_period: If given, the read also ends when no byte has been
+              received for this number of seconds
+
+        Returns:
+            The bytes received.
+
+        Raises:
+            serial.SerialException
+        """
+        assert self.serial is not None
+        loop = asyncio.get_running_loop()
+        fd = self.serial.fileno()
+        data = b""
+        deadline = None if timeout is None else loop.time() + timeout
+        ready = False
+        while len(data) < size:
+            try:
+                chunk = os.read(fd, size - len(data))
+            except BlockingIOError:
+                chunk = b""
+            if chunk:
+                data += chunk
+                if silent_period is not None:
+                    deadline = loop.time() + silent_period
+                ready = False
+                continue
+            if ready:
+                # A tty reads 0 bytes when empty, but not when reported readable
+                raise serial.SerialException(
+                    "Device reports readiness to read but returned no data "
+                    + "(device disconnected?)"
+                )
+
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                break
+            readable = loop.create_future()
+            loop.add_reader(fd, _set_future_done, readable)
+            try:
+                await asyncio.wait_for(readable, remaining)
+            except asyncio.TimeoutError:
+                break
+            finally:
+                loop.remove_reader(fd)
+            ready = True
+        return data
+
+    async def _write_async(self, data: bytes) -> None:
+        """Write to the non-blocking serial port file descriptor.
+
+        Args:
+            * data: The bytes to write
+
+        Raises:
+            serial.SerialTimeoutException
+        """
+        assert self.serial is not None
+        loop = asyncio.get_running_loop()
+        fd = self.serial.fileno()
+        timeout = self.serial.write_timeout
+        deadline = None if timeout is None else loop.time() + timeout
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(fd, view) :]
+                continue
+            except BlockingIOError:
+                pass
+            remaining = None if deadline is None else deadline - loop.time()
+            writable = loop.create_future()
+            loop.add_writer(fd, _set_future_done, writable)
+            try:
+                await asyncio.wait_for(writable, remaining)
+            except asyncio.TimeoutError:
+                raise serial.SerialTimeoutException("Write timeout")
+            finally:
+                loop.remove_writer(fd)
+
+
+def _set_future_done(future: "asyncio.Future[None]") -> None:
+    """Mark the future as done, if it is not yet (callback for the event loop)."""
+    if not future.done():
+        future.set_result(None)
+
 
 # ########## #
 # Exceptions #
@@ -1572,6 +4531,10 @@ class LocalEchoError(MasterReportedException):
     """There is some problem with the local echo."""
 
 
+class BusBusyError(MasterReportedException):
+    """The serial port is used by another transaction, and is not free in time."""
+
+
 class InvalidResponseError(MasterReportedException):
     """The response does not fulfill the Modbus standad, for example wrong checksum."""
 
@@ -1709,6 +4672,8 @@ def _parse_payload(
             return _bytes_to_bits(registerdata, number_of_bits)[0]
         if payloadformat == _Payloadformat.BITS:
             return _bytes_to_bits(registerdata, number_of_bits)
+        if payloadformat == _Payloadformat.PACKEDBITS:
+            return _bytes_to_packed_bits(registerdata, number_of_bits)
 
     if functioncode in [3, 4]:
         registerdata = payload[_NUMBER_OF_BYTES_BEFORE_REGISTERDATA:]
@@ -1724,6 +4689,9 @@ def _parse_payload(
         if payloadformat == _Payloadformat.REGISTERS:
             return _bytes_to_valuelist(registerdata, number_of_registers)
 
+        if payloadformat == _Payloadformat.REGISTERARRAY:
+            return _bytes_to_valuelist(registerdata, number_of_registers, as_array=True)
+
         if payloadformat == _Payloadformat.REGISTER:
             return _two_bytes_to_num(registerdata, number_of_decimals, signed=signed)
 
@@ -1744,7 +4712,7 @@ def _embed_payload(
 
     Args:
         * slaveaddress: The address of the slave.
-        * mode: The modbus protcol mode (MODE_RTU or MODE_ASCII)
+        * mode: The modbus protcol mode (MODE_RTU, MODE_ASCII or MODE_TCP)
         * functioncode: The function code for the command to be performed.
           Can for example be 16 (Write register).
         * payloaddata: The bytes to be sent to the slave.
@@ -1759,6 +4727,9 @@ def _embed_payload(
      * RTU Mode: slaveaddress byte + functioncode byte + payloaddata + CRC (two bytes).
      * ASCII Mode: header (``:``) + slaveaddress (2 characters) + functioncode
        (2 characters) + payloaddata + LRC (which is two characters) + footer (CR+LF)
+     * TCP Mode: MBAP header (transaction ID, protocol ID 0 and length, two bytes
+       each) + slaveaddress byte + functioncode byte + payloaddata. The transaction
+       ID is 0, it is set at each transmission by :func:`_set_transaction_id`.
 
     The LRC or CRC is calculated from the bytes made up of slaveaddress +
     functioncode + payloaddata.
@@ -1780,8 +4751,10 @@ def _embed_payload(
             + _hexencode(_calculate_lrc(first_part))
             + _ASCII_FOOTER
         )
+    elif mode == MODE_TCP:
+        request = struct.pack(">HHH", 0, 0, len(first_part)) + first_part
     else:
-        request = first_part + _calculate_crc(first_part)
+        request = first_part + _calculate_request_crc(first_part)
 
     return request
 
@@ -1813,6 +4786,8 @@ def _extract_payload(
     * RTU Mode: slaveaddress byte + functioncode byte + payloaddata + CRC (two bytes)
     * ASCII Mode: header (``:``) + slaveaddress byte + functioncode byte +
       payloaddata + LRC (which is two characters) + footer (CR+LF)
+    * TCP Mode: MBAP header (transaction ID, protocol ID and length) + slaveaddress
+      byte + functioncode byte + payloaddata. The transaction ID is not checked here.
 
     For development purposes, this function can also be used to extract the payload
     from the request sent **to** the slave.
@@ -1824,6 +4799,7 @@ def _extract_payload(
     NUMBER_OF_LRC_BYTES = 1
     MINIMAL_RESPONSE_LENGTH_RTU = NUMBER_OF_RESPONSE_STARTBYTES + NUMBER_OF_CRC_BYTES
     MINIMAL_RESPONSE_LENGTH_ASCII = 9
+    MINIMAL_RESPONSE_LENGTH_TCP = _NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH + 3
 
     # Argument validity testing (ValueError/TypeError at lib programming error)
     _check_bytes(response, description="response")
@@ -1842,6 +4818,14 @@ def _extract_payload(
                     MINIMAL_RESPONSE_LENGTH_ASCII, response
                 )
             )
+    elif mode == MODE_TCP:
+        if len(response) < MINIMAL_RESPONSE_LENGTH_TCP:
+            raise InvalidResponseError(
+                "Too short Modbus TCP response (minimum "
+                + "length {} bytes). Response: {!r}".format(
+                    MINIMAL_RESPONSE_LENGTH_TCP, response
+                )
+            )
     elif len(response) < MINIMAL_RESPONSE_LENGTH_RTU:
         raise InvalidResponseError(
             "Too short Modbus RTU response (minimum "
@@ -1881,7 +4865,21 @@ def _extract_payload(
         # Convert the ASCII (stripped) response string to RTU-like response string
         response = _hexdecode(response)
 
-    # Validate response checksum
+    if mode == MODE_TCP:
+        # Validate and strip the MBAP header. There is no checksum.
+        protocol_id, length = struct.unpack(">HH", response[2:6])
+        if protocol_id != 0 or length != len(response) - 6:
+            raise InvalidResponseError(
+                "Wrong MBAP header: protocol ID {} and length {} ".format(
+                    protocol_id, length
+                )
+                + "for a response of {} bytes. The response is: {!r}".format(
+                    len(response), response
+                )
+            )
+        response = response[_NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH:]
+
+    # Validate response checksum (Modbus TCP relies on the TCP checksum)
     if mode == MODE_ASCII:
         calculate_checksum = _calculate_lrc
         number_of_checksum_bytes = NUMBER_OF_LRC_BYTES
@@ -1889,19 +4887,22 @@ def _extract_payload(
         calculate_checksum = _calculate_crc
         number_of_checksum_bytes = NUMBER_OF_CRC_BYTES
 
-    received_checksum = response[-number_of_checksum_bytes:]
-    response_without_checksum = response[0 : (len(response) - number_of_checksum_bytes)]
-    calculated_checksum = calculate_checksum(response_without_checksum)
+    if mode != MODE_TCP:
+        received_checksum = response[-number_of_checksum_bytes:]
+        response_without_checksum = response[
+            0 : (len(response) - number_of_checksum_bytes)
+        ]
+        calculated_checksum = calculate_checksum(response_without_checksum)
 
-    if received_checksum != calculated_checksum:
-        template = (
-            "Checksum error in {} mode: {!r} instead of {!r} . The response "
-            + "is: {!r} (plain response: {!r})"
-        )
-        text = template.format(
-            mode, received_checksum, calculated_checksum, response, plainresponse
-        )
-        raise InvalidResponseError(text)
+        if received_checksum != calculated_checksum:
+            template = (
+                "Checksum error in {} mode: {!r} instead of {!r} . The response "
+                + "is: {!r} (plain response: {!r})"
+            )
+            text = template.format(
+                mode, received_checksum, calculated_checksum, response, plainresponse
+            )
+            raise InvalidResponseError(text)
 
     # Check slave address
     responseaddress = response[_BYTEPOSITION_FOR_SLAVEADDRESS]
@@ -1931,6 +4932,8 @@ def _extract_payload(
 
     if mode == MODE_ASCII:
         last_databyte_number = len(response) - NUMBER_OF_LRC_BYTES
+    elif mode == MODE_TCP:
+        last_databyte_number = len(response)
     else:
         last_databyte_number = len(response) - NUMBER_OF_CRC_BYTES
 
@@ -1949,7 +4952,7 @@ def _predict_response_size(
     """Calculate the number of bytes that should be received from the slave.
 
     Args:
-     * mode: The modbus protcol mode (MODE_RTU or MODE_ASCII)
+     * mode: The modbus protcol mode (MODE_RTU, MODE_ASCII or MODE_TCP)
      * functioncode: Modbus function code.
      * payload_to_slave: The raw request that is to be sent to the slave
        (not hex encoded)
@@ -1972,6 +4975,7 @@ def _predict_response_size(
     NUMBER_OF_RTU_RESPONSE_ENDBYTES = 2
     NUMBER_OF_ASCII_RESPONSE_STARTBYTES = 5
     NUMBER_OF_ASCII_RESPONSE_ENDBYTES = 4
+    NUMBER_OF_TCP_RESPONSE_STARTBYTES = 8  # MBAP header and function code
 
     # Argument validity testing
     _check_mode(mode)
@@ -2014,6 +5018,8 @@ def _predict_response_size(
             + response_payload_size * RTU_TO_ASCII_PAYLOAD_FACTOR
             + NUMBER_OF_ASCII_RESPONSE_ENDBYTES
         )
+    if mode == MODE_TCP:
+        return NUMBER_OF_TCP_RESPONSE_STARTBYTES + response_payload_size
     return (
         NUMBER_OF_RTU_RESPONSE_STARTBYTES
         + response_payload_size
@@ -2021,6 +5027,131 @@ def _predict_response_size(
     )
 
 
+def _predict_rtu_frame_length(beginning: bytes, number_of_bytes_to_read: int) -> int:
+    """Predict the length of a Modbus RTU response from its first bytes.
+
+    Args:
+     * beginning: The bytes of the response received so far.
+     * number_of_bytes_to_read: Number of bytes expected for a normal response.
+
+    Returns:
+        The total number of bytes in the response frame or, if *beginning* is too
+        short to tell, the number of bytes needed to tell: the slave address and
+        the function code, plus the byte count for read function codes.
+
+    For an exception response (bit 7 of the function code set) the frame ends
+    after the exception code and the CRC. The responses to the write function
+    codes echo the address and the value or quantity of the request, so they are
+    always 8 bytes long.
+    """
+    NUMBER_OF_RTU_HEADER_BYTES = 2  # Slave address and function code
+    NUMBER_OF_RTU_EXCEPTION_BYTES = 3  # Exception code and CRC
+    NUMBER_OF_RTU_WRITE_ECHO_BYTES = 4  # Address, and value or quantity
+    NUMBER_OF_CRC_BYTES = 2
+
+    if len(beginning) < NUMBER_OF_RTU_HEADER_BYTES:
+        return NUMBER_OF_RTU_HEADER_BYTES
+
+    received_functioncode = beginning[_BYTEPOSITION_FOR_FUNCTIONCODE]
+    if _check_bit(received_functioncode, _BITNUMBER_FUNCTIONCODE_ERRORINDICATION):
+        return NUMBER_OF_RTU_HEADER_BYTES + NUMBER_OF_RTU_EXCEPTION_BYTES
+
+    if received_functioncode in [1, 2, 3, 4]:
+        if len(beginning) == NUMBER_OF_RTU_HEADER_BYTES:
+            return NUMBER_OF_RTU_HEADER_BYTES + 1
+        bytecount = beginning[NUMBER_OF_RTU_HEADER_BYTES]
+        return NUMBER_OF_RTU_HEADER_BYTES + 1 + bytecount + NUMBER_OF_CRC_BYTES
+
+    if received_functioncode in [5, 6, 15, 16]:
+        return (
+            NUMBER_OF_RTU_HEADER_BYTES
+            + NUMBER_OF_RTU_WRITE_ECHO_BYTES
+            + NUMBER_OF_CRC_BYTES
+        )
+
+    return max(number_of_bytes_to_read, NUMBER_OF_RTU_HEADER_BYTES)
+
+
+def _predict_tcp_frame_length(beginning: bytes, number_of_bytes_to_read: int) -> int:
+    """Predict the length of a Modbus TCP response from its first bytes.
+
+    Args:
+     * beginning: The bytes of the response received so far.
+     * number_of_bytes_to_read: Not used, the length is in the MBAP header.
+
+    Returns:
+        The total number of bytes in the response frame or, if *beginning* is too
+        short to tell, the number of bytes of the MBAP header up to the length field.
+    """
+    if len(beginning) < _NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH:
+        return _NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH
+    length = int(_two_bytes_to_num(beginning[4:6]))
+    return _NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH + length
+
+
+def _get_functioncode_of_request(request: bytes, mode: str) -> int:
+    """Find the function code of a request built by :func:`_embed_payload`.
+
+    Args:
+     * request: The request.
+     * mode: The modbus protcol mode (MODE_RTU, MODE_ASCII or MODE_TCP)
+
+    Returns:
+        The function code.
+    """
+    if mode == MODE_ASCII:
+        return int(request[3:5], 16)
+    if mode == MODE_TCP:
+        return request[_NUMBER_OF_MBAP_BYTES_BEFORE_LENGTH + 1]
+    return request[_BYTEPOSITION_FOR_FUNCTIONCODE]
+
+
+def _set_transaction_id(request: bytes, portname: str) -> bytes:
+    """Give a Modbus TCP request the next transaction ID of the connection.
+
+    Args:
+     * request: The request built by :func:`_embed_payload`.
+     * portname: The name of the connection (serial port object) to the gateway.
+
+    Returns:
+        The request, with the transaction ID in its first two bytes.
+
+    Must be called while holding the :class:`BusArbiter` of the port.
+    """
+    transaction_id = (_latest_transaction_ids.get(portname, 0) + 1) & 0xFFFF
+    _latest_transaction_ids[portname] = transaction_id
+    return transaction_id.to_bytes(2, "big") + request[2:]
+
+
+def _create_serial_port(port: str) -> serial.Serial:
+    """Create and open a serial port, or a TCP connection to a gateway.
+
+    Args:
+        port: The serial port name, or a ``tcp://host:port`` or
+            ``rtu+tcp://host:port`` URL
+
+    Returns:
+        The pySerial port object. The TCP connections use the pySerial
+        ``socket://`` URL handler.
+    """
+    for scheme in [_MODBUS_TCP_URL_SCHEME, _RTU_OVER_TCP_URL_SCHEME]:
+        if port.startswith(scheme):
+            return serial.serial_for_url(
+                "socket://" + port[len(scheme) :],
+                timeout=_TCP_DEFAULT_TIMEOUT,
+                write_timeout=2.0,
+            )
+    return serial.Serial(
+        port=port,
+        baudrate=19200,
+        parity=serial.PARITY_NONE,
+        bytesize=8,
+        stopbits=1,
+        timeout=0.05,
+        write_timeout=2.0,
+    )
+
+
 def _calculate_minimum_silent_period(baudrate: Union[int, float]) -> float:
     """Calculate the silent period length between messages.
 
@@ -2049,6 +5180,51 @@ def _calculate_minimum_silent_period(baudrate: Union[int, float]) -> float:
     )
 
 
+def _calculate_inter_character_timeout(baudrate: Union[int, float]) -> float:
+    """Calculate the longest silence allowed between the characters of a message.
+
+    It should correspond to the time to send 1.5 characters.
+
+    Args:
+        baudrate: The baudrate for the serial port
+
+    Returns:
+        The number of seconds.
+
+    Raises:
+        ValueError, TypeError.
+    """
+    _check_numerical(baudrate, minvalue=1, description="baudrate")
+
+    BITTIMES_PER_CHARACTERTIME = 11
+    MAXIMUM_SILENT_CHARACTERTIMES = 1.5
+    MINIMUM_TIMEOUT_SECONDS = 0.00075  # See Modbus standard
+
+    bittime = 1 / float(baudrate)
+    return max(
+        bittime * BITTIMES_PER_CHARACTERTIME * MAXIMUM_SILENT_CHARACTERTIMES,
+        MINIMUM_TIMEOUT_SECONDS,
+    )
+
+
+def _calculate_end_of_frame_silence(baudrate: Union[int, float]) -> float:
+    """Calculate the silence on the line that ends a received Modbus RTU frame.
+
+    Args:
+        baudrate: The baudrate for the serial port
+
+    Returns:
+        The silent period in seconds, at least _MINIMUM_END_OF_FRAME_SILENCE as USB
+        serial adapters deliver the received bytes in bursts.
+
+    Raises:
+        ValueError, TypeError.
+    """
+    return max(
+        _calculate_minimum_silent_period(baudrate), _MINIMUM_END_OF_FRAME_SILENCE
+    )
+
+
 # ########################## #
 # String and num conversions #
 # ########################## #
@@ -2567,7 +5743,9 @@ def _valuelist_to_bytes(valuelist: List[int], number_of_registers: int) -> bytes
     return outputbytes
 
 
-def _bytes_to_valuelist(inputbytes: bytes, number_of_registers: int) -> List[int]:
+def _bytes_to_valuelist(
+    inputbytes: bytes, number_of_registers: int, as_array: bool = False
+) -> Union[List[int], "array.array[int]"]:
     """Convert bytes to a list of numerical values.
 
     The bytes are interpreted as 'unsigned INT16'.
@@ -2575,12 +5753,16 @@ def _bytes_to_valuelist(inputbytes: bytes, number_of_registers: int) -> List[int
     Args:
         * inputbytes: The bytes from the slave. Length = 2 * *number_of_registers*
         * number_of_registers: The number of registers. For error checking.
+        * as_array: Return an :class:`array.array` of type ``'H'`` instead of a list.
 
     Returns:
-        A list of integers.
+        A list (or array) of integers.
 
     Raises:
         TypeError, ValueError
+
+    All registers are decoded in one call, with a precompiled :class:`struct.Struct`
+    (or a byteswapped array on little-endian platforms).
     """
     _check_int(number_of_registers, minvalue=1, description="number of registers")
     number_of_bytes = _NUMBER_OF_BYTES_PER_REGISTER * number_of_registers
@@ -2588,13 +5770,129 @@ def _bytes_to_valuelist(inputbytes: bytes, number_of_registers: int) -> List[int
         inputbytes, "input bytes", minlength=number_of_bytes, maxlength=number_of_bytes
     )
 
-    values = []
-    for i in range(number_of_registers):
-        offset = _NUMBER_OF_BYTES_PER_REGISTER * i
-        sub_bytes = inputbytes[offset : (offset + _NUMBER_OF_BYTES_PER_REGISTER)]
-        values.append(int(_two_bytes_to_num(sub_bytes)))
+    if as_array:
+        values = array.array("H", inputbytes)
+        if sys.byteorder == "little":
+            values.byteswap()  # Modbus registers are big-endian
+        return values
+
+    return list(_registers_struct(number_of_registers).unpack(inputbytes))
+
+
+@functools.lru_cache(maxsize=None)
+def _registers_struct(number_of_registers: int) -> struct.Struct:
+    """Precompiled struct for *number_of_registers* big-endian unsigned INT16."""
+    return struct.Struct(">{}H".format(number_of_registers))
+
+
+def _scale_registers(
+    values: "array.array[int]",
+    scale: Union[float, Tuple[float, ...]],
+    offset: Union[float, Tuple[float, ...]],
+    signed: bool,
+    as_numpy: bool,
+) -> Any:
+    """Convert register values to ``value * scale + offset``.
+
+    Args:
+        * values: The register values, as unsigned INT16.
+        * scale: Factor for all the values, or a tuple with one factor per value.
+        * offset: Offset for all the values, or a tuple with one offset per value.
+        * signed: Interpret the values as signed INT16 (two's complement).
+        * as_numpy: Compute with NumPy, and return a :class:`numpy.ndarray`.
+
+    Returns:
+        A list of floats, or a NumPy array of float64.
+    """
+    if signed:
+        values = array.array("h", values.tobytes())  # Same bits, signed
+    if as_numpy:
+        numpy = _import_numpy()
+        return numpy.frombuffer(values, dtype=values.typecode) * numpy.asarray(
+            scale
+        ) + numpy.asarray(offset)
+    if isinstance(scale, float) and isinstance(offset, float):
+        return [value * scale + offset for value in values]
+    scales = itertools.repeat(scale) if isinstance(scale, float) else scale
+    offsets = itertools.repeat(offset) if isinstance(offset, float) else offset
+    return [value * s + o for value, s, o in zip(values, scales, offsets)]
+
+
+def _decode_register(decoder: Callable[[bytes], Any], payload: bytes) -> Any:
+    """Parse a single register payload with *decoder*.
+
+    Returns:
+        An int if the value is integral (also with decimals), else a float.
+    """
+    value = decoder(payload)
+    if int(value) == value:
+        return int(value)
+    return float(value)
+
+
+def _decode_scaled_registers(
+    decoder: Callable[[bytes], Any],
+    payload: bytes,
+    scale: Union[float, Tuple[float, ...]],
+    offset: Union[float, Tuple[float, ...]],
+    signed: bool,
+    as_numpy: bool,
+) -> Any:
+    """Parse a response payload with *decoder*, then scale the register values.
+
+    For argument descriptions, see :func:`_scale_registers`.
+    """
+    return _scale_registers(decoder(payload), scale, offset, signed, as_numpy)
+
+
+def _normalize_scaling(
+    value: Union[float, List[float], Tuple[float, ...]],
+    number_of_registers: int,
+    description: str,
+) -> Union[float, Tuple[float, ...]]:
+    """Check a scale or an offset, for all the registers or one per register.
+
+    Args:
+        * value: A number, or a list or tuple of *number_of_registers* numbers.
+        * number_of_registers: The number of registers.
+        * description: Used in error messages.
+
+    Returns:
+        The value as a float, or a tuple of floats.
+
+    Raises:
+        TypeError, ValueError
+    """
+    if isinstance(value, (list, tuple)):
+        _check_int(
+            len(value),
+            minvalue=number_of_registers,
+            maxvalue=number_of_registers,
+            description="length of the {} list".format(description),
+        )
+        for item in value:
+            _check_numerical(item, description=description)
+        return tuple(float(item) for item in value)
+    _check_numerical(value, description=description)
+    return float(value)
+
+
+def _import_numpy() -> Any:
+    """Import NumPy, an optional dependency used only for ``as_numpy`` reads.
+
+    It is not imported with this module, as it is slow to import and not
+    supported by some embedded interpreters (as the one of Domoticz plugins).
 
-    return values
+    Raises:
+        ImportError
+    """
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError(
+            "NumPy is needed for as_numpy=True, install it with: pip install numpy"
+        ) from exc
+    return numpy
 
 
 def _pack_bytes(formatstring: str, value: Any) -> bytes:
@@ -2814,24 +6112,25 @@ def _bits_to_bytes(valuelist: List[int]) -> bytes:
         raise TypeError(
             "The input should be a list. " + "Given: {!r}".format(valuelist)
         )
-    for value in valuelist:
-        if value not in [0, 1, False, True]:
-            raise ValueError(
-                "Wrong value in list of bits. " + "Given: {!r}".format(value)
-            )
-
-    list_position = 0
-    outputbytes = b""
-    while list_position < len(valuelist):
-        sublist = valuelist[list_position : (list_position + _BITS_PER_BYTE)]
-
-        bytevalue = 0
-        for bitposition, value in enumerate(sublist):
-            bytevalue |= value << bitposition
-        outputbytes += bytevalue.to_bytes(1, "big")
+    try:
+        valid = _BIT_VALUES.issuperset(valuelist)
+    except TypeError:  # Unhashable values in the list
+        valid = False
+    if not valid:
+        for value in valuelist:
+            if value not in [0, 1, False, True]:
+                raise ValueError(
+                    "Wrong value in list of bits. " + "Given: {!r}".format(value)
+                )
 
-        list_position += _BITS_PER_BYTE
-    return outputbytes
+    if not valuelist:
+        return b""
+    # The first bit in the list goes to the LSB of the first byte, so reversed
+    # it is the binary representation of a little endian integer.
+    bitstring = bytes(reversed(valuelist)).translate(_BIT_VALUES_TO_DIGITS)
+    return int(bitstring, 2).to_bytes(
+        _calculate_number_of_bytes_for_bits(len(valuelist)), "little"
+    )
 
 
 def _bytes_to_bits(inputbytes: bytes, number_of_bits: int) -> List[int]:
@@ -2853,6 +6152,42 @@ def _bytes_to_bits(inputbytes: bytes, number_of_bits: int) -> List[int]:
     Returns a list of values (0 or 1). The length of the list is equal to
     *number_of_bits*.
     """
+    _check_number_of_bytes_for_bits(inputbytes, number_of_bits)
+    # One table lookup per byte gives its 8 bits, LSB first
+    return list(
+        b"".join([_BYTE_TO_BITS[bytevalue] for bytevalue in inputbytes])[
+            :number_of_bits
+        ]
+    )
+
+
+def _bytes_to_packed_bits(inputbytes: bytes, number_of_bits: int) -> int:
+    """Parse bits from bytes, packed in an integer.
+
+    This is used for parsing the bits in response messages for functioncode 1 and 2,
+    see :func:`_bytes_to_bits`.
+
+    Args:
+        * inputbytes: Input bytes
+        * number_of_bits: Number of bits to extract
+
+    Returns an integer where bit N is the value in position N of the list returned
+    by :func:`_bytes_to_bits`. The padding bits are cleared.
+    """
+    _check_number_of_bytes_for_bits(inputbytes, number_of_bits)
+    return int.from_bytes(inputbytes, "little") & ((1 << number_of_bits) - 1)
+
+
+def _check_number_of_bytes_for_bits(inputbytes: bytes, number_of_bits: int) -> None:
+    """Check that the number of bytes is right for the number of bits.
+
+    Args:
+        * inputbytes: Input bytes
+        * number_of_bits: Number of bits to extract
+
+    Raises:
+        ValueError
+    """
     expected_length = _calculate_number_of_bytes_for_bits(number_of_bits)
     if len(inputbytes) != expected_length:
         raise ValueError(
@@ -2861,12 +6196,6 @@ def _bytes_to_bits(inputbytes: bytes, number_of_bits: int) -> List[int]:
                 expected_length, number_of_bits, len(inputbytes)
             )
         )
-    total_list = []
-    for bytevalue in inputbytes:  # Gives individual bytes as int
-        for bitposition in range(_BITS_PER_BYTE):
-            bitvalue = (bytevalue & (1 << bitposition)) > 0
-            total_list.append(int(bitvalue))
-    return total_list[:number_of_bits]
 
 
 # ################### #
@@ -3294,6 +6623,23 @@ Built with this code::
 """
 
 
+_CRC16TABLE_SLICE2 = tuple(
+    (_CRC16TABLE[index] >> 8) ^ _CRC16TABLE[_CRC16TABLE[index] & 0xFF]
+    for index in range(256)
+)
+"""CRC-16 lookup table for the slice-by-two algorithm, with 256 elements.
+
+Element ``i`` is the CRC register contribution of the byte ``i`` followed by
+a zero byte. As the CRC is linear, processing the 16-bit word ``w`` (least
+significant byte first) is::
+
+    register ^= w
+    register = _CRC16TABLE_SLICE2[register & 0xFF] ^ _CRC16TABLE[register >> 8]
+"""
+
+_CRC_SLICE2_MIN_LENGTH = 16  # Shorter messages are faster to process byte by byte
+
+
 def _is_serial_object(obj: Any) -> bool:
     """Check if an object is serialport-like."""
     KNOWN_ATTRIBUTES = ["open", "close", "read", "write", "is_open"]
@@ -3307,6 +6653,60 @@ def _is_serial_object(obj: Any) -> bool:
 def _calculate_crc(inputbytes: bytes) -> bytes:
     """Calculate CRC-16 for Modbus RTU.
 
+    Args:
+        inputbytes: An arbitrary-length message (without the CRC).
+
+    Returns:
+        A two-byte CRC, where the least significant byte is first.
+
+    Short messages are processed byte by byte. Longer messages are processed
+    two bytes at a time (slice-by-two), using :data:`_CRC16TABLE` and
+    :data:`_CRC16TABLE_SLICE2`. The result is identical to
+    :func:`_calculate_crc_reference`.
+    """
+    if not isinstance(inputbytes, bytes):
+        _check_bytes(inputbytes, description="CRC input bytes")
+
+    table = _CRC16TABLE
+    register = 0xFFFF  # Preload a 16-bit register with ones
+    length = len(inputbytes)
+
+    if length < _CRC_SLICE2_MIN_LENGTH:
+        for current_byte in inputbytes:
+            register = (register >> 8) ^ table[(register ^ current_byte) & 0xFF]
+        return register.to_bytes(2, "little")
+
+    table_slice2 = _CRC16TABLE_SLICE2
+    even_length = length & ~1
+    if sys.byteorder == "little":
+        words: Any = memoryview(inputbytes)[:even_length].cast("H")
+    else:
+        words = array.array("H", inputbytes[:even_length])
+        words.byteswap()
+    for word in words:  # Least significant byte first
+        register ^= word
+        register = table_slice2[register & 0xFF] ^ table[register >> 8]
+    if length & 1:
+        register = (register >> 8) ^ table[(register ^ inputbytes[-1]) & 0xFF]
+    return register.to_bytes(2, "little")
+
+
+@functools.lru_cache(maxsize=32)
+def _calculate_request_crc(inputbytes: bytes) -> bytes:
+    """Calculate CRC-16 for a request, caching the result.
+
+    A master most often sends the same few requests over and over again,
+    so the CRC is calculated once for each of them.
+    """
+    return _calculate_crc(inputbytes)
+
+
+def _calculate_crc_reference(inputbytes: bytes) -> bytes:
+    """Calculate CRC-16 for Modbus RTU, one byte at a time.
+
+    This is the original (slower) implementation, kept as reference for
+    :func:`_calculate_crc`.
+
     Args:
         inputbytes: An arbitrary-length message (without the CRC).
 
@@ -3361,7 +6761,7 @@ def _check_mode(mode: str) -> None:
     """Check that the Modbus mode is valid.
 
     Args:
-        mode: The Modbus mode (MODE_RTU or MODE_ASCII)
+        mode: The Modbus mode (MODE_RTU, MODE_ASCII or MODE_TCP)
 
     Raises:
         TypeError, ValueError
@@ -3369,10 +6769,10 @@ def _check_mode(mode: str) -> None:
     if not isinstance(mode, str):
         raise TypeError("The {0} should be a string. Given: {1!r}".format("mode", mode))
 
-    if mode not in [MODE_RTU, MODE_ASCII]:
+    if mode not in [MODE_RTU, MODE_ASCII, MODE_TCP]:
         raise ValueError(
             "Unreconized Modbus mode given. Must "
-            + "be 'rtu' or 'ascii' but {0!r} was given.".format(mode)
+            + "be 'rtu', 'ascii' or 'tcp' but {0!r} was given.".format(mode)
         )
 
 
@@ -4046,4 +7446,3 @@ def _get_diagnostic_string() -> str:
 
 # For backward compatibility
 _getDiagnosticString = _get_diagnostic_string
-
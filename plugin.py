@@ -10,7 +10,7 @@ THIS SOFTWARE COMES WITH ABSOLUTE NO WARRANTY. USE AT YOUR OWN RISK!
 Requirements:
     1.python module minimalmodbus -> http://minimalmodbus.readthedocs.io/en/master/
         (pi@raspberrypi:~$ sudo pip3 install minimalmodbus)
-    2.Communication module Modbus USB to RS485 converter module
+    2.Communication module Modbus USB to RS485 converter module, or Ethernet to RS485 gateway (Modbus TCP or RTU over TCP)
 """
 """
 <plugin key="EmmetiMiraiEQ2021" name="Emmeti-Mirai EQ2021 hot water heatpump" version="1.2" author="CreasolTech" externallink="https://github.com/CreasolTech/domoticz-emmeti-eq2021">
@@ -21,6 +21,7 @@ Requirements:
     </description>
     <params>
         <param field="SerialPort" label="Modbus Port" width="200px" required="true" default="/dev/ttyUSB0" />
+        <param field="Address" label="Gateway URL (tcp://host:502 or rtu+tcp://host:4001), empty to use the Modbus Port" width="200px" required="false" default="" />
         <param field="Mode1" label="Baud rate" width="40px" required="true" default="9600"  />
         <param field="Mode2" label="Heat pump address" width="40px" required="true" default="3" />
         <param field="Mode3" label="Poll interval">
@@ -33,51 +34,452 @@ Requirements:
                 <option label="240 seconds" value="240" />
             </options>
         </param>
+        <param field="Mode4" label="Dead-band (update device only if value changes more than)" width="40px" required="false" default="0" />
+        <param field="Mode5" label="Force device update every">
+            <options>
+                <option label="1 minute" value="60" />
+                <option label="5 minutes" value="300" default="true" />
+                <option label="15 minutes" value="900" />
+                <option label="30 minutes" value="1800" />
+            </options>
+        </param>
+        <param field="Mode6" label="Modbus health devices (roundtrip time, error rate)">
+            <options>
+                <option label="No" value="0" default="true" />
+                <option label="Yes" value="1" />
+            </options>
+        </param>
     </params>
 </plugin>
 
 """
 
 import minimalmodbus    #v2.1.1
+import queue
+import random
+import threading
 import time
 import Domoticz         #tested on Python 3.9.2 in Domoticz 2021.1 and 2023.1
 
 
-LANGS=[ "en", "it" ] # list of supported languages, in DEVS dict below
-DEVADDR=0   #field corresponding to Modbus address in the DEVS dict
-DEVUNIT=1
-DEVTYPE=2
-DEVSUBTYPE=3
-DEVSWITCHTYPE=4
-DEVOPTIONS=5
-DEVIMAGE=6
-DEVLANG=7  # item in the DEVS list where the first language starts 
-
-DEVS={ #topic:                Modbus, Unit,Type,Sub,swtype, Options, Image,  "en name", "it name"  ...other languages should follow  ],
-    "SP_HOTWATER":          [ 1104,     1,242,1,0,  {'ValueStep':'0.5', ' ValueMin':'10', 'ValueMax':'60', 'ValueUnit':'°C'},   None,  "SetPoint Hot Water", "Termostato ACS"    ],
-    "SP_DIFF":              [ 1106,     2,242,1,0,  {'ValueStep':'0.5', ' ValueMin':'1', 'ValueMax':'20', 'ValueUnit':'°C'},    None,  "SetPoint-TempLow to activate", "SetPoin-TempLow per attivare", "Termostato uscita per ACS" ],
-    "SP_RESISTOR_DELAY":    [ 1109,     3,242,1,0,  {'ValueStep':'5', ' ValueMin':'0', 'ValueMax':'450', 'ValueUnit':'min.'},   None,  "Resistor start delay", "Ritardo acc. resistenza"  ],
-    "TEMP_WATER_BOTTOM":    [ 2020,     4, 80,5,0,  None,           None,   "Temp tank bottom",     "Temp bollitore in basso"     ],
-    "TEMP_WATER_TOP":       [ 2021,     5, 80,5,0,  None,           None,   "Temp tank top",        "Temp bollitore in alto"     ],
-    "TEMP_AIR_IN":          [ 2019,     6,80,5,0,   None,           None,   "Temp air inlet",       "Temp aria ingresso"      ],
-    "TEMP_AIR_OUT":         [ 2023,     7,80,5,0,   None,           None,   "Temp air outlet",      "Temp aria uscita"   ],
-    "TEMP_COIL":            [ 2022,     8,80,5,0,   None,           None,   "Temp coil",            "Temp scambiatore"   ],
+LANGS=[ "en", "it" ] # list of supported languages, in the "names" of the DEVS dict below
+POLLCLASSES={   # refresh interval in seconds of the registers of each poll class (0 => every poll interval)
+    "fast": 0,
+    "slow": 600,
+}
+BLOCKGAP=4      # registers not in DEVS read anyway to merge two blocks in one transaction (they must exist in the heat pump)
+BLOCKMAXREGS=125    # max registers read by one transaction (Modbus limit)
+
+PORTIDLETIME=2     # close the serial port when not used for PORTIDLETIME seconds, so other programs can access it between polls
+BREAKERTHRESHOLD=3      # consecutive failed transactions that open the circuit breaker
+BREAKERBACKOFFMIN=10    # seconds: backoff after the first opening of the circuit breaker, doubled at each failed probe...
+BREAKERBACKOFFMAX=600   # ... up to BREAKERBACKOFFMAX seconds
+TIMEOUTMIN=0.05        # seconds: min and max response timeout, adapted to the response times of the heat pump
+TIMEOUTMAX=0.5
+BUSTIMEOUT=2            # seconds: max wait for the serial port, when used by other threads or programs
+TRACESIZE=64           # Modbus frames kept in memory, saved to TRACEFILE in the plugin folder when the circuit breaker opens
+TRACEFILE="modbus-trace.bin"
+STATSINTERVAL=3600 # log the number of written/suppressed device updates every STATSINTERVAL seconds
+
+DEVS={ # register map of the heat pump: each register is decoded as value=register*scale+offset, and shown by the Domoticz device "unit"
+    # access: "r" read-only, "rw" also written by the device; poll: refresh interval, from POLLCLASSES; valueUnit: added to the options of setpoints
+    "SP_HOTWATER":          {"addr":1104, "scale":0.5, "offset":-30, "access":"rw", "poll":"slow", "valueUnit":"°C",   "unit":1, "type":242, "subtype":1, "switchtype":0, "options":{'ValueStep':'0.5', ' ValueMin':'10', 'ValueMax':'60'}, "image":None, "names":["SetPoint Hot Water", "Termostato ACS"]},
+    "SP_DIFF":              {"addr":1106, "scale":0.5, "offset":-30, "access":"rw", "poll":"slow", "valueUnit":"°C",   "unit":2, "type":242, "subtype":1, "switchtype":0, "options":{'ValueStep':'0.5', ' ValueMin':'1', 'ValueMax':'20'},  "image":None, "names":["SetPoint-TempLow to activate", "SetPoin-TempLow per attivare", "Termostato uscita per ACS"]},
+    "SP_RESISTOR_DELAY":    {"addr":1109, "scale":5,   "offset":0,   "access":"rw", "poll":"slow", "valueUnit":"min.", "unit":3, "type":242, "subtype":1, "switchtype":0, "options":{'ValueStep':'5', ' ValueMin':'0', 'ValueMax':'450'},   "image":None, "names":["Resistor start delay", "Ritardo acc. resistenza"]},
+    "TEMP_WATER_BOTTOM":    {"addr":2020, "scale":0.5, "offset":-30, "access":"r",  "poll":"fast", "valueUnit":"°C",   "unit":4, "type":80,  "subtype":5, "switchtype":0, "options":None, "image":None, "names":["Temp tank bottom", "Temp bollitore in basso"]},
+    "TEMP_WATER_TOP":       {"addr":2021, "scale":0.5, "offset":-30, "access":"r",  "poll":"fast", "valueUnit":"°C",   "unit":5, "type":80,  "subtype":5, "switchtype":0, "options":None, "image":None, "names":["Temp tank top", "Temp bollitore in alto"]},
+    "TEMP_AIR_IN":          {"addr":2019, "scale":0.5, "offset":-30, "access":"r",  "poll":"fast", "valueUnit":"°C",   "unit":6, "type":80,  "subtype":5, "switchtype":0, "options":None, "image":None, "names":["Temp air inlet", "Temp aria ingresso"]},
+    "TEMP_AIR_OUT":         {"addr":2023, "scale":0.5, "offset":-30, "access":"r",  "poll":"fast", "valueUnit":"°C",   "unit":7, "type":80,  "subtype":5, "switchtype":0, "options":None, "image":None, "names":["Temp air outlet", "Temp aria uscita"]},
+    "TEMP_COIL":            {"addr":2022, "scale":0.5, "offset":-30, "access":"r",  "poll":"fast", "valueUnit":"°C",   "unit":8, "type":80,  "subtype":5, "switchtype":0, "options":None, "image":None, "names":["Temp coil", "Temp scambiatore"]},
 }
 
-def value2temp(value):
-    """ Convert value returned by Modbus to a temperature """
-    return (value-60)*0.5   # 60 = 0°C, 160 = 50°C
+BUSDEVS={ # devices created only if enabled by Mode6, with bus health metrics computed by the poller at each cycle: same device fields as DEVS
+    "BUS_ROUNDTRIP":        {"unit":20, "type":243, "subtype":31, "switchtype":0, "options":{'Custom':'1;ms'}, "image":None, "names":["Modbus roundtrip p95", "Modbus tempo di risposta p95"]},
+    "BUS_ERRORS":           {"unit":21, "type":243, "subtype":31, "switchtype":0, "options":{'Custom':'1;%'},  "image":None, "names":["Modbus error rate", "Modbus errori"]},
+    "BUS_STATUS":           {"unit":22, "type":243, "subtype":19, "switchtype":0, "options":None,             "image":None, "names":["Modbus status", "Modbus stato"]},
+}
+
+
+class RegisterBlock:
+    """ Contiguous registers read by one Modbus transaction, with the decoding of the DEVS registers in it precomputed """
+    def __init__(self, startaddr, count, interval, items):
+        self.startaddr=startaddr
+        self.count=count
+        self.interval=interval  # refresh interval in seconds
+        self.items=items        # DEVS registers in the block
+        self.lastRead=0         # time.monotonic() time of the last successful read
+        self.indexes=[DEVS[i]["addr"]-startaddr for i in items]    # position of each register in the values read
+        self.units=[DEVS[i]["unit"] for i in items]
+        self.integral=[float(DEVS[i]["scale"]).is_integer() and float(DEVS[i]["offset"]).is_integer() for i in items]  # integer values, as "25" and not "25.0"
+        self.scales=[1]*count   # scale and offset of each register of the block, applied by minimalmodbus while reading
+        self.offsets=[0]*count
+        for i, index in zip(items, self.indexes):
+            self.scales[index]=DEVS[i]["scale"]
+            self.offsets[index]=DEVS[i]["offset"]
+
+    def __contains__(self, Register):
+        return self.startaddr<=Register<self.startaddr+self.count
+
+    def decode(self, values):
+        """ Return [(Unit, value), ...] for the registers of the block, from the values read with prepare_read_scaled(startaddr, count, scales, offsets) """
+        return [(Unit, int(values[index]) if integral else values[index]) for Unit, index, integral in zip(self.units, self.indexes, self.integral)]
+
+
+def compileRegisterMap(pollTime, gap=BLOCKGAP, maxRegs=BLOCKMAXREGS):
+    """ Compile the DEVS register map into the blocks read by the poller: fastest poll class first, so that the first block tells if the heat pump is ON """
+    blocks=[]
+    for pollClass in sorted(POLLCLASSES, key=POLLCLASSES.get):
+        items=sorted((i for i in DEVS if DEVS[i]["poll"]==pollClass), key=lambda i: DEVS[i]["addr"])
+        spans=[]    # DEVS items of each block, by address
+        for i in items:
+            if spans and DEVS[i]["addr"]-DEVS[spans[-1][-1]]["addr"]<=gap+1 and DEVS[i]["addr"]-DEVS[spans[-1][0]]["addr"]<maxRegs:
+                spans[-1].append(i)
+            else:
+                spans.append([i])
+        for span in spans:
+            startaddr=DEVS[span[0]]["addr"]
+            blocks.append(RegisterBlock(startaddr, DEVS[span[-1]]["addr"]-startaddr+1, max(pollTime, POLLCLASSES[pollClass]), span))
+    return blocks
+
+def decodeValue(item, value):
+    """ Convert the value of register DEVS[item] returned by Modbus """
+    return value*DEVS[item]["scale"]+DEVS[item]["offset"]
+
+def encodeValue(item, value):
+    """ Convert a value of DEVS[item] to the value of its Modbus register """
+    return int((value-DEVS[item]["offset"])/DEVS[item]["scale"])
+
+class SerialSession:
+    """ Keep the serial port of a minimalmodbus.Instrument open across a poll cycle, close it when idle, reopen it on serial errors """
+    def __init__(self, rs485, idleTime=PORTIDLETIME):
+        self.rs485=rs485
+        self.idleTime=idleTime
+        self.lastUse=time.monotonic()
+        self.opens=0    # number of port open/close since the last call to counters()
+        self.closes=0
+
+    def open(self):
+        if not self.rs485.serial.is_open:
+            self.rs485.serial.open()
+            self.opens+=1
+
+    def close(self):
+        if self.rs485.serial.is_open:
+            self.rs485.serial.close()
+            self.closes+=1
+
+    def call(self, method, *args):
+        """ Call an instrument method with the port open; in case of SerialException reopen the port and try again once """
+        self.open()
+        try:
+            result=method(*args)
+        except minimalmodbus.serial.SerialException:
+            self.close()
+            self.open()
+            result=method(*args)
+        finally:
+            self.lastUse=time.monotonic()
+        return result
+
+    def idleDeadline(self):
+        """ Return the time.monotonic() time when the port should be closed, or None if already closed """
+        return self.lastUse+self.idleTime if self.rs485.serial.is_open else None
+
+    def closeIfIdle(self):
+        if self.rs485.serial.is_open and time.monotonic()-self.lastUse>=self.idleTime:
+            self.close()
+
+    def counters(self):
+        """ Return and reset the number of port open and close """
+        counters=(self.opens, self.closes)
+        self.opens=self.closes=0
+        return counters
+
+
+class CircuitBreaker:
+    """ Circuit breaker around the Modbus client: stop polling a heat pump that does not answer, and probe it with exponential backoff and full jitter """
+    CLOSED="closed"         # normal operation
+    OPEN="open"             # heat pump not answering: no transactions until nextAttempt
+    HALF_OPEN="half-open"   # nextAttempt reached: a single probe transaction is allowed
+
+    def __init__(self, log, threshold=BREAKERTHRESHOLD, backoffMin=BREAKERBACKOFFMIN, backoffMax=BREAKERBACKOFFMAX):
+        self.log=log
+        self.threshold=threshold
+        self.backoffMin=backoffMin
+        self.backoffMax=backoffMax
+        self.state=self.CLOSED
+        self.failures=0     # consecutive failed transactions
+        self.openings=0     # consecutive openings, used to compute the backoff
+        self.nextAttempt=0  # time.monotonic() time when the breaker goes half-open
+
+    def allow(self):
+        """ Return True if a transaction can be tried now """
+        if self.state==self.OPEN and time.monotonic()>=self.nextAttempt:
+            self.state=self.HALF_OPEN
+            self.log("Circuit breaker half-open: probing the heat pump")
+        return self.state!=self.OPEN
+
+    def success(self):
+        if self.state!=self.CLOSED:
+            self.log("Circuit breaker closed: heat pump is answering again")
+        self.state=self.CLOSED
+        self.failures=0
+        self.openings=0
+
+    def failure(self):
+        self.failures+=1
+        if self.state==self.HALF_OPEN or self.failures>=self.threshold:
+            backoff=min(self.backoffMax, self.backoffMin*2**self.openings)
+            delay=random.uniform(0, backoff)  # full jitter: avoid polling in sync with other programs using the same port
+            self.openings+=1
+            self.state=self.OPEN
+            self.nextAttempt=time.monotonic()+delay
+            self.log(f"Circuit breaker open after {self.failures} failed transactions: next attempt at {time.strftime('%H:%M:%S', time.localtime(time.time()+delay))} (in {delay:.1f}s, backoff {backoff}s)")
+
+
+class WriteQueue:
+    """ Register writes waiting for the poller thread: a newer value for the same register replaces the older one """
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.pending={}     # Register: Value
+
+    def __bool__(self):
+        return bool(self.pending)
+
+    def put(self, Register, Value):
+        with self.lock:
+            self.pending[Register]=Value
+
+    def putBack(self, Register, Values):
+        """ Requeue a failed write, unless a newer value has been queued in the meantime """
+        with self.lock:
+            for i, Value in enumerate(Values):
+                self.pending.setdefault(Register+i, Value)
+
+    def take(self):
+        """ Remove and return all pending writes, grouped in runs of contiguous registers: [(Register, [Value, ...]), ...] """
+        with self.lock:
+            pending=self.pending
+            self.pending={}
+        runs=[]
+        for Register in sorted(pending):
+            if runs and runs[-1][0]+len(runs[-1][1])==Register:
+                runs[-1][1].append(pending[Register])
+            else:
+                runs.append((Register, [pending[Register]]))
+        return runs
+
+
+class Poller(threading.Thread):
+    """ Acquisition worker: owns the Modbus instrument, polls the heat pump and hands decoded samples to the plugin thread """
+    def __init__(self, port, address, baudrate, pollTime, blocks, busHealth=False, traceFile=None):
+        super().__init__(name="EQ2021Poller", daemon=True)
+        self.port=port
+        self.address=address
+        self.baudrate=baudrate
+        self.pollTime=pollTime
+        self.busHealth=busHealth    # True => publish the BUSDEVS devices at each cycle
+        self.traceFile=traceFile    # the last Modbus frames are saved to this file when the heat pump stops answering
+        self.trace=minimalmodbus.TransactionTrace(TRACESIZE)
+        self.rs485=None
+        self.session=None
+        self.breaker=None
+        self.prepared={}    # startaddr: minimalmodbus.PreparedCommand reading the block, returning the decoded values
+        self.probe=None
+        self.blocks=blocks  # RegisterBlock list from compileRegisterMap(), read in this order
+        self.samples=queue.Queue()  # ("update", Unit, nValue, sValue) or ("status"|"error", text) messages for the plugin thread
+        self.writes=WriteQueue()    # register writes requested by onCommand, executed by this thread between polls
+        self.wakeup=threading.Event()
+        self.running=True
+        self.nextPoll=0     # time.monotonic() time of the next poll
+        self.cycles=0       # number of cycles (polls and/or writes) done
+        self.cycleTime=0    # duration of the last cycle, in seconds
+        self.busyTime=0     # total duration of the cycles, in seconds
+        self.idle=threading.Event() # set while waiting for the next cycle
+
+    def stop(self):
+        self.running=False
+        self.wakeup.set()
+
+    def pollNow(self):
+        """ Start a poll cycle now, without waiting for the poll interval """
+        self.nextPoll=0
+        self.wakeup.set()
+
+    def write(self, Register, Value):
+        """ Called by the plugin thread: queue a register write, executed by the poller thread """
+        self.writes.put(Register, Value)
+        self.wakeup.set()
+
+    def status(self, text):
+        self.samples.put(("status", text))
+
+    def error(self, text):
+        self.samples.put(("error", text))
+
+    def publish(self, Unit, value):
+        self.samples.put(("update", Unit, 0, str(value)))
+
+    def publishBusHealth(self):
+        """ Publish the roundtrip time and error rate of the transactions done since the previous call """
+        metrics=self.rs485.metrics.snapshot(reset=True)
+        if metrics.transactions==0:
+            return
+        p95=metrics.roundtrip.percentile(95)
+        if p95 is not None:
+            self.samples.put(("update", BUSDEVS["BUS_ROUNDTRIP"]["unit"], 0, f"{p95*1000:.1f}"))
+        self.samples.put(("update", BUSDEVS["BUS_ERRORS"]["unit"], 0, f"{metrics.error_rate*100:.1f}"))
+        self.samples.put(("update", BUSDEVS["BUS_STATUS"]["unit"], 0, f"{metrics.transactions} transactions: {metrics.no_responses} no answer, {metrics.invalid_responses} invalid, {metrics.slave_exceptions} exceptions, {metrics.bytes_sent}/{metrics.bytes_received} bytes sent/received"))
+
+    def run(self):
+        self.nextPoll=time.monotonic()
+        while self.running:
+            self.wakeup.clear()
+            if self.rs485 is None:
+                self.openInstrument()
+            if self.rs485 is not None:
+                cycleStart=time.monotonic()
+                wrote=bool(self.writes) and self.breaker.allow()
+                if wrote:
+                    for Register, Values in self.writes.take():
+                        self.WriteRS485(Register, Values)
+                polled=time.monotonic()>=self.nextPoll
+                if polled:
+                    self.poll()
+                    self.nextPoll=time.monotonic()+self.pollTime
+                    if self.breaker.state==CircuitBreaker.OPEN:
+                        self.nextPoll=self.breaker.nextAttempt
+                if wrote or polled:
+                    self.cycleTime=time.monotonic()-cycleStart
+                    self.busyTime+=self.cycleTime
+                    self.cycles+=1
+                    opens, closes = self.session.counters()
+                    self.status(f"Cycle time {self.cycleTime*1000:.1f}ms, serial port opened {opens} times and closed {closes} times")
+                    if self.busHealth:
+                        self.publishBusHealth()
+                self.session.closeIfIdle()
+                deadline=self.session.idleDeadline()
+                if deadline is not None and deadline<self.nextPoll:
+                    timeout=deadline-time.monotonic()
+                else:
+                    timeout=self.nextPoll-time.monotonic()
+            else:
+                self.nextPoll=time.monotonic()+self.pollTime
+                timeout=self.pollTime
+            self.idle.set()
+            self.wakeup.wait(max(0, timeout))
+            self.idle.clear()
+        if self.session is not None:
+            self.session.close()
+
+    def openInstrument(self):
+        try:
+            self.rs485 = minimalmodbus.Instrument(self.port, self.address)
+            self.rs485.serial.baudrate = self.baudrate
+            self.rs485.serial.bytesize = 8
+            self.rs485.serial.parity = minimalmodbus.serial.PARITY_EVEN
+            self.rs485.serial.stopbits = 1
+            self.rs485.serial.timeout = TIMEOUTMAX
+            self.rs485.serial.write_timeout = 0 # used in case of problem opening serial device: 0 => return immediately in case of error writing port
+        except Exception as e:
+            self.error(f"Error opening serial port {self.port}: {e}")
+            self.rs485 = None
+            return
+        self.rs485.adaptive_timeout = minimalmodbus.AdaptiveTimeout(TIMEOUTMIN, TIMEOUTMAX)   # timeout learnt from the response times of the heat pump
+        self.rs485.trace = self.trace  # frames are recorded without formatting them: see failure()
+        self.rs485.close_port_after_each_call = False   # port lifecycle is managed by SerialSession
+        self.rs485.bus_timeout = BUSTIMEOUT   # other threads/programs using the same port are serialized by the minimalmodbus bus arbiter
+        # requests sent at every poll are validated and built once
+        self.prepared={block.startaddr: self.rs485.prepare_read_scaled(block.startaddr, block.count, block.scales, block.offsets) for block in self.blocks}
+        self.probe=self.rs485.prepare_read(self.blocks[0].startaddr, 1, 3)
+        self.session = SerialSession(self.rs485)
+        self.breaker = CircuitBreaker(self.status)
+        self.session.opens+=1   # the port has been opened by Instrument()
+
+    def poll(self):
+        """ Read the register blocks whose refresh interval has expired, and publish the decoded values """
+        if not self.breaker.allow():
+            return
+        if self.breaker.state==CircuitBreaker.HALF_OPEN:
+            try:    # cheap probe: read only the first register
+                self.session.call(self.rs485.execute, self.probe)
+            except minimalmodbus.BusBusyError as e:
+                self.status(f"{e}: will retry at next poll")
+                return
+            except:
+                self.failure()
+                return
+            self.breaker.success()
+
+        now=time.monotonic()
+        for block in self.blocks:
+            startaddr, count = block.startaddr, block.count
+            if now-block.lastRead<block.interval-self.pollTime/2:    # not due yet (tolerance of half poll interval to avoid skipping a poll for jitter)
+                continue
+            try:
+                values=self.session.call(self.rs485.execute, self.prepared[startaddr])
+            except minimalmodbus.BusBusyError as e:
+                self.status(f"{e}: will retry at next poll")   # another program is using the serial port: not a heat pump failure
+                return
+            except:
+                self.status(f"Error connecting to heat pump by Modbus reading registers {startaddr}-{startaddr+count-1}")
+                self.failure()
+                return  # communication error, or Hot Water boiler is OFF: the other blocks are skipped, and this block will be read at next poll
+            self.breaker.success()
+            self.status(f"Successfull reading registers {startaddr}-{startaddr+count-1}")
+            for Unit, value in block.decode(values):
+                self.publish(Unit, value)
+            block.lastRead=time.monotonic()
+
+    def failure(self):
+        """ A transaction failed: save the Modbus trace when the circuit breaker opens """
+        self.breaker.failure()
+        if self.breaker.state==CircuitBreaker.OPEN and self.traceFile:
+            try:
+                self.trace.dump(self.traceFile)
+            except OSError as e:
+                self.error(f"Error saving the Modbus trace to {self.traceFile}: {e}")
+            else:
+                self.status(f"Last {len(self.trace)} Modbus frames saved to {self.traceFile}")
+
+    def markFresh(self, Register):
+        """ Register has just been written: no need to read its block again until its refresh interval expires """
+        for block in self.blocks:
+            if Register in block:
+                block.lastRead=time.monotonic()
+
+    def WriteRS485(self, Register, Values):
+        """ Write Values to contiguous registers starting at Register: FC6 for a single register, FC16 for more registers """
+        try:
+            if len(Values)==1:
+                self.session.call(self.rs485.write_register, Register, Values[0], 0, 6, False)
+            else:
+                self.session.call(self.rs485.write_registers, Register, Values)
+        except minimalmodbus.BusBusyError as e:
+            self.status(f"{e}: will retry writing reg={Register} values={Values} later")
+            self.writes.putBack(Register, Values)
+        except:
+            self.status(f"Error writing to heat pump Modbus reg={Register} values={Values}: will retry later")
+            self.writes.putBack(Register, Values)
+            self.failure()
+        else:
+            self.status(f"Successfully written reg={Register} values={Values}")
+            self.breaker.success()
+            for i in range(len(Values)):
+                self.markFresh(Register+i)
 
-def temp2value(temp):
-    """ Convert a temperature to a Modbus value for this heat pump """
-    return int(temp*2)+60
 
 class BasePlugin:
     def __init__(self):
-        self.rs485 = ""
-        self.elapsedTime=0
+        self.poller = None
         self.heartbeat=30
-        self.heartbeatnow=30
+        self.deadband=0
+        self.maxAge=300
+        self.busHealth=False
+        self.published={}   # Unit: (nValue, sValue, time.monotonic()) of the last value written to Domoticz
+        self.updatesWritten=0
+        self.updatesSuppressed=0
+        self.statsTime=0
 
 
     def onStart(self):
@@ -85,160 +487,105 @@ class BasePlugin:
         Domoticz.Status("Starting Emmeti-EQ2021 plugin")
         self.pollTime=30 if Parameters['Mode3']=="" else int(Parameters['Mode3'])
         self.heartbeat=self.pollTime if self.pollTime<=30 else 30   # heartbeat must be <=30 or a warning will be written in the log
-        self.heartbeatnow=self.heartbeat        # used to track any temp modification of the heartbeat
-        Domoticz.Heartbeat(self.heartbeatnow)
+        Domoticz.Heartbeat(self.heartbeat)
         self.runInterval = 1
+        self.deadband=0 if Parameters['Mode4']=="" else float(Parameters['Mode4'])
+        self.maxAge=300 if Parameters['Mode5']=="" else int(Parameters['Mode5'])
+        self.busHealth=Parameters['Mode6']=="1"
+        self.statsTime=time.monotonic()
         self._lang=Settings["Language"]
         # check if language set in domoticz exists
         if self._lang in LANGS:
-            self.lang=DEVLANG+LANGS.index(self._lang)
+            self.lang=LANGS.index(self._lang)
         else:
             Domoticz.Error(f"Language {self._lang} does not exist in dict DEVS, inside the domoticz-emmeti-mirai plugin, but you can contribute adding it ;-) Thanks!")
             self._lang="en"
-            self.lang=DEVLANG # default: english text
+            self.lang=0 # default: english text
 
         # Check that all devices exist, or create them
-        for i in DEVS:
-            if DEVS[i][DEVUNIT] not in Devices:
-                Options=DEVS[i][DEVOPTIONS] if DEVS[i][DEVOPTIONS] else {}
-                Image=DEVS[i][DEVIMAGE] if DEVS[i][DEVIMAGE] else 0
-                Domoticz.Status(f"Creating device {i}, Name={DEVS[i][self.lang]}, Unit={DEVS[i][DEVUNIT]}, Type={DEVS[i][DEVTYPE]}, Subtype={DEVS[i][DEVSUBTYPE]}, Switchtype={DEVS[i][DEVSWITCHTYPE]} Options={Options}, Image={Image}")
-                Domoticz.Device(Name=DEVS[i][self.lang], Unit=DEVS[i][DEVUNIT], Type=DEVS[i][DEVTYPE], Subtype=DEVS[i][DEVSUBTYPE], Switchtype=DEVS[i][DEVSWITCHTYPE], Options=Options, Image=Image, Used=1).Create()
-
-        self.rs485 = minimalmodbus.Instrument(Parameters["SerialPort"], int(Parameters["Mode2"]))
-        self.rs485.serial.baudrate = Parameters["Mode1"]
-        self.rs485.serial.bytesize = 8
-        self.rs485.serial.parity = minimalmodbus.serial.PARITY_EVEN
-        self.rs485.serial.stopbits = 1
-        self.rs485.serial.timeout = 0.2
-        self.rs485.serial.write_timeout = 0 # used in case of problem opening serial device: 0 => return immediately in case of error writing port
-        self.rs485.serial.exclusive = True # Fix From Forum Member 'lost'
-        self.rs485.debug = True
-        self.rs485.mode = minimalmodbus.MODE_RTU
-        self.rs485.close_port_after_each_call = True
+        devs=dict(DEVS, **BUSDEVS) if self.busHealth else DEVS
+        for i in devs:
+            dev=devs[i]
+            if dev["unit"] not in Devices:
+                Options=dict(dev["options"], ValueUnit=dev["valueUnit"]) if dev["options"] and "valueUnit" in dev else dev["options"] or {}
+                Image=dev["image"] if dev["image"] else 0
+                Domoticz.Status(f"Creating device {i}, Name={dev['names'][self.lang]}, Unit={dev['unit']}, Type={dev['type']}, Subtype={dev['subtype']}, Switchtype={dev['switchtype']} Options={Options}, Image={Image}")
+                Domoticz.Device(Name=dev["names"][self.lang], Unit=dev["unit"], Type=dev["type"], Subtype=dev["subtype"], Switchtype=dev["switchtype"], Options=Options, Image=Image, Used=1).Create()
+
+        # All Modbus transactions are done by the poller thread, so onHeartbeat and onCommand never block on the serial port
+        blocks=compileRegisterMap(self.pollTime)
+        Domoticz.Status("Register blocks: "+", ".join(f"{block.startaddr}-{block.startaddr+block.count-1} every {block.interval}s" for block in blocks))
+        self.poller = Poller(Parameters["Address"] or Parameters["SerialPort"], int(Parameters["Mode2"]), int(Parameters["Mode1"]), self.pollTime, blocks, self.busHealth, Parameters["HomeFolder"]+TRACEFILE)
+        self.poller.start()
 
     def onStop(self):
         Domoticz.Status("Stopping Emmeti-EQ2021 plugin")
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller.join(5)
+            if self.poller.is_alive():
+                Domoticz.Error("Poller thread did not stop within 5s")
+            self.poller = None
+        self.logStats()
+
+    def updateDevice(self, Unit, nValue, sValue, force=False):
+        """ Update device only if its value changed by more than the dead-band, or if it was not updated for maxAge seconds """
+        now=time.monotonic()
+        last=self.published.get(Unit)
+        if not force and last is not None and last[0]==nValue and now-last[2]<self.maxAge:
+            if last[1]==sValue:
+                self.updatesSuppressed+=1
+                return
+            try:
+                changed=abs(float(sValue)-float(last[1]))>=self.deadband
+            except ValueError:
+                changed=True
+            if not changed:
+                self.updatesSuppressed+=1
+                return
+        Devices[Unit].Update(nValue=nValue, sValue=sValue)
+        self.published[Unit]=(nValue, sValue, now)
+        self.updatesWritten+=1
+
+    def logStats(self):
+        Domoticz.Status(f"Device updates: {self.updatesWritten} written, {self.updatesSuppressed} suppressed (dead-band={self.deadband}, max age={self.maxAge}s)")
+        if self.poller is not None and self.poller.rs485 is not None:
+            bus=self.poller.rs485.bus_arbiter
+            Domoticz.Status(f"Serial port {bus.portname}: {bus.transactions} transactions, {bus.contended} waited for the port (total {bus.wait_time:.1f}s, max {bus.max_wait_time*1000:.0f}ms), {bus.busy} given up")
+        self.statsTime=time.monotonic()
 
     def onHeartbeat(self):
-        self.elapsedTime+=self.heartbeatnow
-        if self.elapsedTime<self.pollTime:
+        if self.poller is None:
             return
-        self.elapsedTime=0
-        
-        errors=0
-
-        startaddr=2019
-        for retry in range (1,3):  # try 2 times to access the serial port
-            if retry==2:
-                self.rs485.serial.exclusive = False
-            try:    #                          addr #regs   fc  
-                values=self.rs485.read_registers(startaddr, 5,     3)
-            except:
-                Domoticz.Status(f"{retry}: Error connecting to heat pump by Modbus reading reg.addr={startaddr}")
-                errors+=1
-                time.sleep(0.2) #wait 0.1s before trying again
-            else:
-                Domoticz.Status(f"{retry}: Successfull reading reg.addr={startaddr}")
-                item="TEMP_AIR_IN"
-                value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-                sValue=str(value); nValue=0
-                Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-                item="TEMP_AIR_OUT"
-                value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-                sValue=str(value); nValue=0
-                Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-                item="TEMP_COIL"
-                value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-                sValue=str(value); nValue=0
-                Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-                item="TEMP_WATER_BOTTOM"
-                value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-                sValue=str(value); nValue=0
-                Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-                item="TEMP_WATER_TOP"
-                value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-                sValue=str(value); nValue=0
-                Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-                errors=0
+        while True: # drain the samples published by the poller thread
+            try:
+                msg=self.poller.samples.get_nowait()
+            except queue.Empty:
                 break
-
-        if errors: # Impossible to read => communication error, or Hot Water boiler is OFF
-            Domoticz.Status("Communication error, or boiler is OFF => Exit")
-            return
-
-        startaddr=1104
-        try:    #                          addr #regs   fc  
-            values=self.rs485.read_registers(startaddr, 6,     3)
-        except:
-            Domoticz.Status(f"Error connecting to heat pump by Modbus, reading registers 1104-1109")
-            errors+=1
-        else:
-            item="SP_HOTWATER"
-            value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-            sValue=str(value); nValue=0
-            Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-            item="SP_DIFF"
-            value=value2temp(values[DEVS[item][DEVADDR]-startaddr]) 
-            sValue=str(value); nValue=0
-            Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-            item="SP_RESISTOR_DELAY"
-            value=values[DEVS[item][DEVADDR]-startaddr]*5
-            sValue=str(value); nValue=0
-            Devices[DEVS[item][DEVUNIT]].Update(nValue=nValue, sValue=sValue)
-
-
-        ####self.rs485.serial.close()  #  Close that door !
-        if errors:
-            self.heartbeatnow=self.heartbeat+1+(time.monotonic_ns()&7)
-            Domoticz.Status(f"Increase heartbeat to {self.heartbeatnow} to avoid concurrent access to the same serial port")
-            Domoticz.Heartbeat(self.heartbeatnow)
-        else: #no errors
-            if self.heartbeatnow!=self.heartbeat:
-                Domoticz.Status(f"No errors: restore heartbeat to {self.heartbeat}")
-                self.heartbeatnow=self.heartbeat
-                Domoticz.Heartbeat(self.heartbeatnow)
-
+            if msg[0]=="update":
+                self.updateDevice(msg[1], msg[2], msg[3])
+            elif msg[0]=="error":
+                Domoticz.Error(msg[1])
+            else:
+                Domoticz.Status(msg[1])
+        if time.monotonic()-self.statsTime>=STATSINTERVAL:
+            self.logStats()
 
     def onCommand(self, Unit, Command, Level, Hue):
         Domoticz.Status(f"Command for {Devices[Unit].Name}: Unit={Unit}, Command={Command}, Level={Level}")
 
         for i in DEVS:  # Find the index of DEVS
-            if DEVS[i][DEVUNIT]==Unit:
+            if DEVS[i]["unit"]==Unit:
                 nValue=int(Level)
                 sValue=str(Level)
-                if DEVS[i][DEVADDR]<2000:  # Addresses above 2000 are read-only, in EMMETI EQxxxx
-                    if i=='SP_RESISTOR_DELAY':
-                        value=int(Level/5)    # 5 minutes step
-                    else:
-                        value=temp2value(Level)
-                    self.WriteRS485(DEVS[i][DEVADDR], value)
-                    Devices[Unit].Update(nValue=nValue, sValue=sValue)
+                if DEVS[i]["access"]=="rw":
+                    self.poller.write(DEVS[i]["addr"], encodeValue(i, Level))    # written by the poller thread, without blocking Domoticz
+                    self.updateDevice(Unit, nValue, sValue, force=True)
                 break
 
 
 #        Devices[Unit].Refresh()
 
-    def WriteRS485(self, Register, Value):
-        for retry in range (1,4):
-            if retry==3:
-                self.rs485.serial.exclusive = False
-            try:
-                 self.rs485.write_register(Register, Value, 0, 6, False)
-                 self.rs485.serial.close()
-            except:
-                Domoticz.Status(f"{retry}: Error writing to heat pump Modbus reg={Register} value={Value}")
-                time.sleep(0.2)
-            else:
-                Domoticz.Status(f"{retry}: Successfully written reg={Register} value={Value}")
-                break
-
 
 global _plugin
 _plugin = BasePlugin()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Offline replay of a Modbus capture saved by the domoticz-emmeti-eq2021 plugin, without the heat pump and without a serial port.
+Author: Paolo Subiaco https://github.com/CreasolTech
+
+The plugin saves the last Modbus frames to modbus-trace.bin when the heat pump stops answering (see TRACESIZE in plugin.py).
+Each response is checked and parsed again by minimalmodbus (_extract_payload, _parse_payload) with the parameters of its
+request, then the registers are decoded by the plugin as the poller does, so the errors seen in the field (wrong CRC,
+truncated frames, wrong byte count) can be reproduced and debugged at the desk, and the decoder profiled on real traffic.
+
+Usage:
+    python3 replay.py modbus-trace.bin [--mode rtu|ascii|tcp] [--realtime] [--repeat 1000] [--quiet]
+    python3 -m cProfile -s cumtime replay.py modbus-trace.bin --repeat 1000 --quiet    # profile the decoding
+"""
+
+import argparse
+import collections
+import sys
+import time
+import types
+
+import minimalmodbus
+
+
+def loadPlugin():
+    """ Import plugin.py with a minimal Domoticz module: only its decoding is used """
+    Domoticz=types.ModuleType("Domoticz")
+    Domoticz.Status=Domoticz.Log=Domoticz.Debug=Domoticz.Error=lambda text: None
+    sys.modules["Domoticz"]=Domoticz
+    import plugin
+    return plugin
+
+
+def decodeDevices(plugin, transaction):
+    """ Decode the registers read by the transaction as the poller does: return {item: value} """
+    if transaction.functioncode!=3 or transaction.result is None:
+        return {}
+    startaddr=transaction.registeraddress
+    values=transaction.result
+    return {item: plugin.decodeValue(item, values[plugin.DEVS[item]["addr"]-startaddr])
+            for item in plugin.DEVS if startaddr<=plugin.DEVS[item]["addr"]<startaddr+len(values)}
+
+
+def describe(plugin, transaction):
+    """ One line describing the transaction """
+    when=time.strftime("%H:%M:%S", time.localtime(transaction.timestamp))+f".{int(transaction.timestamp%1*1000):03d}"
+    text=f"{when} addr={transaction.slaveaddress} fc={transaction.functioncode} reg={transaction.registeraddress}"
+    if transaction.roundtrip_time is not None:
+        text+=f" {transaction.roundtrip_time*1000:.1f}ms"
+    if transaction.response is None:
+        return text+" broadcast"
+    if transaction.error is not None:
+        return text+f" {type(transaction.error).__name__}: {transaction.error} response={minimalmodbus._describe_bytes(transaction.response)}"
+    devices=decodeDevices(plugin, transaction)
+    if devices:
+        return text+" "+", ".join(f"{item}={value}" for item, value in devices.items())
+    return text+f" {transaction.result}"
+
+
+def main():
+    parser=argparse.ArgumentParser(description="Replay a Modbus capture through the minimalmodbus and plugin decoding")
+    parser.add_argument("tracefile", help="capture file, for example modbus-trace.bin in the plugin folder")
+    parser.add_argument("--mode", choices=[minimalmodbus.MODE_RTU, minimalmodbus.MODE_ASCII, minimalmodbus.MODE_TCP], default=minimalmodbus.MODE_RTU, help="Modbus mode of the capture (default rtu)")
+    parser.add_argument("--realtime", action="store_true", help="replay with the recorded timing, instead of as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the capture REPEAT times, to profile the decoding")
+    parser.add_argument("--quiet", action="store_true", help="print only the summary")
+    args=parser.parse_args()
+
+    plugin=loadPlugin()
+    trace=minimalmodbus.load_trace(args.tracefile)
+    errors=collections.Counter()
+    transactions=0
+    cpuStart=time.process_time()
+    for repetition in range(args.repeat):
+        for transaction in minimalmodbus.replay_trace(trace, args.mode, args.realtime):
+            transactions+=1
+            if transaction.error is not None:
+                errors[type(transaction.error).__name__]+=1
+            else:
+                decodeDevices(plugin, transaction)
+            if not args.quiet and repetition==0:
+                print(describe(plugin, transaction))
+    cpuTime=time.process_time()-cpuStart
+
+    print(f"{len(trace)} frames, {transactions} transactions, {sum(errors.values())} errors"+"".join(f", {count} {name}" for name, count in errors.most_common()))
+    if transactions:
+        print(f"CPU time {cpuTime*1e6/transactions:.1f} us per transaction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Check AdaptiveTimeout, alone and against the emulator on a pseudo-terminal.
+
+Run with ``python -m unittest test_adaptive_timeout``.
+"""
+
+import time
+import unittest
+
+import minimalmodbus
+from emulator import EQ2021Emulator
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+    def test_maximum_before_samples(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.02, 0.5)
+        self.assertEqual(timeout.get_timeout(3, 15), 0.5)
+        timeout._record(3, 15, None)  # No response, nothing learnt yet
+        self.assertEqual(timeout.get_timeout(3, 15), 0.5)
+
+    def test_convergence(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.001, 1.0)
+        for _ in range(100):
+            timeout._record(3, 15, 0.05)
+        self.assertAlmostEqual(timeout.get_timeout(3, 15), 0.05, delta=0.001)
+
+    def test_jitter_widens_timeout(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.001, 1.0)
+        for index in range(100):
+            timeout._record(3, 15, 0.04 if index % 2 else 0.06)
+        self.assertGreater(timeout.get_timeout(3, 15), 0.06)
+        self.assertLess(timeout.get_timeout(3, 15), 0.15)
+
+    def test_bounds(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.02, 0.5)
+        for _ in range(100):
+            timeout._record(3, 15, 0.001)
+        self.assertEqual(timeout.get_timeout(3, 15), 0.02)
+        for _ in range(100):
+            timeout._record(3, 15, 2.0)
+        self.assertEqual(timeout.get_timeout(3, 15), 0.5)
+
+    def test_backoff(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.02, 0.5)
+        for _ in range(100):
+            timeout._record(3, 15, 0.03)
+        first = timeout.get_timeout(3, 15)
+        timeout._record(3, 15, None)
+        self.assertAlmostEqual(timeout.get_timeout(3, 15), 2 * first)
+        for _ in range(10):
+            timeout._record(3, 15, None)
+        self.assertEqual(timeout.get_timeout(3, 15), 0.5)
+        for _ in range(100):
+            timeout._record(3, 15, 0.03)
+        self.assertAlmostEqual(timeout.get_timeout(3, 15), first, delta=0.005)
+
+    def test_estimate_per_request_kind(self):
+        timeout = minimalmodbus.AdaptiveTimeout(0.001, 1.0)
+        timeout._record(3, 15, 0.05)
+        self.assertEqual(timeout.get_timeout(3, 7), 1.0)
+        self.assertEqual(timeout.get_timeout(16, 15), 1.0)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            minimalmodbus.AdaptiveTimeout(0.5, 0.1)
+        with self.assertRaises(ValueError):
+            minimalmodbus.AdaptiveTimeout(-1, 0.1)
+
+
+class TestAdaptiveTimeoutOnBus(unittest.TestCase):
+    def test_timeout_follows_slave(self):
+        emulator = EQ2021Emulator(address=3, latency=0.01)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        instrument = minimalmodbus.Instrument(emulator.port, 3)
+        self.addCleanup(instrument.serial.close)
+        instrument.serial.timeout = 1.0
+        instrument.adaptive_timeout = minimalmodbus.AdaptiveTimeout(0.02, 1.0)
+        for _ in range(20):
+            self.assertEqual(instrument.read_registers(2019, 1), [100])
+        learnt = instrument.adaptive_timeout.get_timeout(3, 7)
+        self.assertLess(learnt, 0.2)
+        self.assertEqual(instrument.serial.timeout, 1.0)  # Not changed
+
+        emulator.off = True
+        start_time = time.monotonic()
+        with self.assertRaises(minimalmodbus.NoResponseError):
+            instrument.read_registers(2019, 1)
+        self.assertLess(time.monotonic() - start_time, 0.5)
+        self.assertAlmostEqual(
+            instrument.adaptive_timeout.get_timeout(3, 7), 2 * learnt
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Check that BusArbiter serializes the transactions on a serial port.
+
+Run with ``python -m unittest test_bus_arbiter``.
+"""
+
+import asyncio
+import os
+import threading
+import unittest
+
+import serial
+
+import minimalmodbus
+
+TIMEOUT = 0.05
+
+
+class TestBusArbiter(unittest.TestCase):
+    def setUp(self):
+        master, slave = os.openpty()
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        self.portname = os.ttyname(slave)
+
+    def open_port(self, exclusive=None):
+        port = serial.Serial(self.portname, exclusive=exclusive)
+        self.addCleanup(port.close)
+        return port
+
+    def test_busy_within_process(self):
+        port = self.open_port()
+        arbiter = minimalmodbus.BusArbiter(self.portname)
+        holding = threading.Event()
+        done = threading.Event()
+
+        def hold():
+            with arbiter.transaction(port, None):
+                holding.set()
+                done.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait(5)
+        with self.assertRaises(minimalmodbus.BusBusyError):
+            arbiter.acquire(port, TIMEOUT)
+        done.set()
+        thread.join()
+        self.assertEqual(arbiter.busy, 1)
+
+        arbiter.acquire(port, TIMEOUT)  # Free again
+        arbiter.release(port)
+        self.assertEqual(arbiter.transactions, 2)
+
+    def test_contended_wait(self):
+        port = self.open_port()
+        arbiter = minimalmodbus.BusArbiter(self.portname)
+        arbiter.acquire(port, None)
+        timer = threading.Timer(TIMEOUT, arbiter.release, (port,))
+        timer.start()
+        arbiter.acquire(port, 5.0)
+        arbiter.release(port)
+        timer.join()
+        self.assertEqual(arbiter.contended, 1)
+        self.assertGreater(arbiter.max_wait_time, 0.0)
+
+    def check_flock_contention(self, exclusive):
+        # Two arbiters on two file descriptors of the same port, as in two processes
+        first_port = self.open_port(exclusive)
+        second_port = self.open_port(exclusive)
+        first = minimalmodbus.BusArbiter(self.portname)
+        second = minimalmodbus.BusArbiter(self.portname)
+        first.acquire(first_port, TIMEOUT)
+        try:
+            with self.assertRaises(minimalmodbus.BusBusyError):
+                second.acquire(second_port, TIMEOUT)
+        finally:
+            first.release(first_port)
+        second.acquire(second_port, TIMEOUT)
+        second.release(second_port)
+
+    def test_flock_contention(self):
+        self.check_flock_contention(None)
+
+    def test_flock_contention_not_exclusive(self):
+        self.check_flock_contention(False)
+
+    def test_exclusive_port_not_flocked(self):
+        port = self.open_port(exclusive=True)
+        arbiter = minimalmodbus.BusArbiter(self.portname)
+        arbiter.acquire(port, TIMEOUT)
+        self.assertIsNone(arbiter._locked_fd)  # pySerial holds the lock
+        arbiter.release(port)
+
+    def test_busy_async(self):
+        port = self.open_port()
+        arbiter = minimalmodbus.BusArbiter(self.portname)
+        arbiter.acquire(port, None)
+        try:
+            with self.assertRaises(minimalmodbus.BusBusyError):
+                asyncio.run(arbiter.acquire_async(port, TIMEOUT))
+        finally:
+            arbiter.release(port)
+        asyncio.run(arbiter.acquire_async(port, TIMEOUT))
+        arbiter.release(port)
+        self.assertEqual(arbiter.busy, 1)
+
+    def test_port_without_file_descriptor(self):
+        port = serial.serial_for_url("loop://")
+        arbiter = minimalmodbus.BusArbiter("loop://")
+        arbiter.acquire(port, TIMEOUT)
+        arbiter.release(port)
+
+
+class TestGetBusArbiter(unittest.TestCase):
+    def test_same_name(self):
+        first = serial.Serial()
+        second = serial.Serial()
+        first.port = second.port = "/dev/ttyTEST0"
+        self.assertIs(
+            minimalmodbus._get_bus_arbiter(first),
+            minimalmodbus._get_bus_arbiter(second),
+        )
+
+    def test_ports_without_name(self):
+        first = serial.Serial()
+        second = serial.Serial()
+        self.assertIsNot(
+            minimalmodbus._get_bus_arbiter(first),
+            minimalmodbus._get_bus_arbiter(second),
+        )
+        self.assertIs(
+            minimalmodbus._get_bus_arbiter(first),
+            minimalmodbus._get_bus_arbiter(first),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Check the scheduling of BusMaster against the emulator on a pseudo-terminal.
+
+Run with ``python -m unittest test_bus_master``.
+"""
+
+import concurrent.futures
+import unittest
+
+import minimalmodbus
+from emulator import EQ2021Emulator, EQ2021TcpEmulator
+
+TIMEOUT = 5
+
+
+class TestBusMaster(unittest.TestCase):
+    def setUp(self):
+        self.emulator = EQ2021Emulator(address=3)
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.bus = minimalmodbus.BusMaster(self.emulator.port)
+        self.addCleanup(self.bus.close)
+        self.bus.instrument(3).serial.timeout = 0.5
+
+    def test_priority_order(self):
+        order = []
+
+        def submit(label, future):
+            future.add_done_callback(lambda _: order.append(label))
+            return future
+
+        # Queued before start(), so the worker sees them all at once
+        futures = [
+            submit("scan", self.bus.read_registers(3, 2019, 1, priority=2)),
+            submit("poll 1", self.bus.read_registers(3, 2020, 1)),
+            submit("write", self.bus.write_registers(3, 1104, [120])),
+            submit("poll 2", self.bus.read_registers(3, 2021, 1)),
+        ]
+        self.bus.start()
+        results = [future.result(TIMEOUT) for future in futures]
+        self.assertEqual(order, ["write", "poll 1", "poll 2", "scan"])
+        self.assertEqual(results, [[100], [150], None, [160]])
+        self.assertEqual(self.emulator.registers[1104], 120)
+
+    def test_exception_in_future(self):
+        self.bus.start()
+        future = self.bus.read_registers(3, 3000, 1)  # Not a register of the slave
+        with self.assertRaises(minimalmodbus.IllegalRequestError):
+            future.result(TIMEOUT)
+        self.assertEqual(self.bus.read_registers(3, 2019, 1).result(TIMEOUT), [100])
+
+    def test_close_cancels_pending(self):
+        future = self.bus.read_registers(3, 2019, 1)
+        self.bus.close()
+        self.assertTrue(future.cancelled())
+
+    def test_close_without_worker_cancels_pending(self):
+        future = self.bus.read_registers(3, 2019, 1)
+        self.bus.close(cancel_pending=False)
+        self.assertTrue(future.cancelled())
+
+    def test_close_runs_pending(self):
+        self.bus.start()
+        futures = [self.bus.read_registers(3, 2019, 1) for _ in range(5)]
+        self.bus.close(cancel_pending=False)
+        self.assertEqual([future.result(0) for future in futures], [[100]] * 5)
+
+    def test_closed(self):
+        self.bus.start()
+        self.bus.close()
+        with self.assertRaises(RuntimeError):
+            self.bus.read_registers(3, 2019, 1)
+        with self.assertRaises(RuntimeError):
+            self.bus.start()
+        self.bus.close()  # Closing again is harmless
+
+    def test_cancelled_future_is_skipped(self):
+        cancelled = self.bus.write_registers(3, 1104, [130])
+        self.assertTrue(cancelled.cancel())
+        self.bus.start()
+        self.assertEqual(self.bus.read_registers(3, 1104, 1).result(TIMEOUT), [160])
+        with self.assertRaises(concurrent.futures.CancelledError):
+            cancelled.result(0)
+
+    def test_command_of_other_bus(self):
+        instrument = minimalmodbus.Instrument(self.emulator.port, 4)
+        self.addCleanup(instrument.serial.close)
+        with self.assertRaises(ValueError):
+            self.bus.submit(instrument.prepare_read(2019, 1))
+
+
+class TestBusMasterTcp(unittest.TestCase):
+    def test_mode_from_url(self):
+        emulator = EQ2021TcpEmulator("tcp", address=3)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        bus = minimalmodbus.BusMaster(emulator.port)
+        self.assertEqual(bus.mode, minimalmodbus.MODE_TCP)
+        with bus:
+            future = bus.read_registers(3, 2019, 2)
+            self.assertEqual(future.result(TIMEOUT), [100, 150])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Check that the fast CRC-16 gives the same bytes as the reference implementation.
+
+Run with ``python -m unittest test_crc``.
+"""
+
+import random
+import unittest
+
+import minimalmodbus
+
+KNOWN_VECTORS = [
+    (b"", b"\xff\xff"),
+    (b"123456789", bytes.fromhex("374B")),  # CRC-16/MODBUS check value 0x4B37
+    (bytes.fromhex("01030000000A"), bytes.fromhex("C5CD")),
+    (bytes.fromhex("1103006B0003"), bytes.fromhex("7687")),
+    (bytes.fromhex("030307E30005"), bytes.fromhex("74A9")),
+]
+
+
+class TestCrc(unittest.TestCase):
+    def test_known_vectors(self):
+        for data, crc in KNOWN_VECTORS:
+            with self.subTest(data=data):
+                self.assertEqual(minimalmodbus._calculate_crc(data), crc)
+                self.assertEqual(minimalmodbus._calculate_crc_reference(data), crc)
+                self.assertEqual(minimalmodbus._calculate_request_crc(data), crc)
+
+    def test_all_lengths(self):
+        generator = random.Random(2021)
+        for length in range(257):
+            for _ in range(20):
+                data = bytes(generator.getrandbits(8) for _ in range(length))
+                with self.subTest(length=length, data=data):
+                    self.assertEqual(
+                        minimalmodbus._calculate_crc(data),
+                        minimalmodbus._calculate_crc_reference(data),
+                    )
+
+    def test_all_byte_values(self):
+        data = bytes(range(256))
+        for start in range(4):
+            with self.subTest(start=start):
+                self.assertEqual(
+                    minimalmodbus._calculate_crc(data[start:]),
+                    minimalmodbus._calculate_crc_reference(data[start:]),
+                )
+
+    def test_cached_request_crc(self):
+        generator = random.Random(16)
+        requests = [
+            bytes(generator.getrandbits(8) for _ in range(length))
+            for length in range(1, 257, 7)
+        ]
+        for _ in range(2):  # Computed, then from the cache
+            for request in requests:
+                with self.subTest(request=request):
+                    self.assertEqual(
+                        minimalmodbus._calculate_request_crc(request),
+                        minimalmodbus._calculate_crc_reference(request),
+                    )
+
+    def test_embedded_request(self):
+        request = minimalmodbus._embed_payload(
+            3, minimalmodbus.MODE_RTU, 3, bytes.fromhex("07E30005")
+        )
+        self.assertEqual(request, bytes.fromhex("030307E3000574A9"))
+
+
+if __name__ == "__main__":
+    unittest.main()
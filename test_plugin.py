@@ -0,0 +1,341 @@
+"""Check the plugin, with a minimal Domoticz module and the emulator.
+
+Run with ``python -m unittest test_plugin``.
+"""
+
+import os
+import queue
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import minimalmodbus
+from emulator import EQ2021Emulator
+
+Domoticz = types.ModuleType("Domoticz")
+Domoticz.Status = Domoticz.Log = Domoticz.Debug = Domoticz.Error = lambda text: None
+sys.modules.setdefault("Domoticz", Domoticz)
+
+import plugin  # noqa: E402  (needs the Domoticz module)
+
+
+class TestRegisterBlock(unittest.TestCase):
+    def test_decode(self):
+        block = plugin.RegisterBlock(
+            1104, 6, 600, ["SP_HOTWATER", "SP_DIFF", "SP_RESISTOR_DELAY"]
+        )
+        self.assertEqual(block.scales, [0.5, 1, 0.5, 1, 1, 5])
+        self.assertEqual(block.offsets, [-30, 0, -30, 0, 0, 0])
+        decoded = block.decode([50.0, 0.0, 5.0, 0.0, 0.0, 30.0])
+        self.assertEqual(decoded, [(1, 50.0), (2, 5.0), (3, 30)])
+        self.assertIsInstance(decoded[0][1], float)
+        self.assertIsInstance(decoded[2][1], int)  # Published as "30", not "30.0"
+
+
+class TestCompileRegisterMap(unittest.TestCase):
+    def spans(self, *args, **kwargs):
+        return [
+            (block.startaddr, block.count, block.interval)
+            for block in plugin.compileRegisterMap(*args, **kwargs)
+        ]
+
+    def test_default(self):
+        self.assertEqual(self.spans(30), [(2019, 5, 30), (1104, 6, 600)])
+
+    def test_interval(self):
+        self.assertEqual(self.spans(900), [(2019, 5, 900), (1104, 6, 900)])
+
+    def test_gap(self):
+        # The setpoints are at 1104, 1106 and 1109
+        self.assertEqual(self.spans(30, gap=2)[1:], [(1104, 6, 600)])
+        self.assertEqual(self.spans(30, gap=1)[1:], [(1104, 3, 600), (1109, 1, 600)])
+        self.assertEqual(
+            self.spans(30, gap=0),
+            [(2019, 5, 30), (1104, 1, 600), (1106, 1, 600), (1109, 1, 600)],
+        )
+
+    def test_max_registers(self):
+        self.assertEqual(
+            self.spans(30, maxRegs=3),
+            [(2019, 3, 30), (2022, 2, 30), (1104, 3, 600), (1109, 1, 600)],
+        )
+        self.assertEqual(
+            self.spans(30, maxRegs=1),
+            [(address, 1, 30) for address in range(2019, 2024)]
+            + [(1104, 1, 600), (1106, 1, 600), (1109, 1, 600)],
+        )
+
+    def test_modbus_limit(self):
+        registers = {
+            f"TEST_{address}": {
+                "addr": address,
+                "scale": 1,
+                "offset": 0,
+                "poll": "fast",
+                "unit": address,
+            }
+            for address in range(3000, 3200)
+        }
+        with mock.patch.dict(plugin.DEVS, registers):
+            spans = self.spans(30)
+        self.assertEqual(spans[:2], [(2019, 5, 30), (3000, 125, 30)])
+        self.assertEqual(spans[2], (3125, 75, 30))
+
+    def test_items(self):
+        blocks = plugin.compileRegisterMap(30, gap=1)
+        self.assertEqual(blocks[1].items, ["SP_HOTWATER", "SP_DIFF"])
+        self.assertEqual(blocks[1].indexes, [0, 2])
+        self.assertIn(1105, blocks[1])
+        self.assertNotIn(1107, blocks[1])
+        self.assertEqual(blocks[2].items, ["SP_RESISTOR_DELAY"])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.log = []
+        self.breaker = plugin.CircuitBreaker(self.log.append, 3, 10, 60)
+        # Longest delay of the full jitter, to check the backoff
+        patcher = mock.patch.object(
+            plugin.random, "uniform", side_effect=lambda low, high: high
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backoff(self):
+        return round(self.breaker.nextAttempt - plugin.time.monotonic())
+
+    def fail(self, times=1):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.failure()
+
+    def probe(self):
+        """Let the backoff expire, and return the result of allow()."""
+        self.breaker.nextAttempt = 0
+        return self.breaker.allow()
+
+    def test_threshold(self):
+        self.fail(2)
+        self.breaker.success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, plugin.CircuitBreaker.CLOSED)
+        self.fail()
+        self.assertEqual(self.breaker.state, plugin.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.backoff(), 10)
+
+    def test_half_open(self):
+        self.fail(3)
+        self.assertTrue(self.probe())
+        self.assertEqual(self.breaker.state, plugin.CircuitBreaker.HALF_OPEN)
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, plugin.CircuitBreaker.CLOSED)
+        self.assertEqual(len(self.log), 3)  # Open, half-open, closed
+
+    def test_backoff(self):
+        self.fail(3)
+        backoffs = [self.backoff()]
+        for _ in range(4):
+            self.assertTrue(self.probe())
+            self.breaker.failure()  # A single failed probe opens the breaker again
+            self.assertFalse(self.breaker.allow())
+            backoffs.append(self.backoff())
+        self.assertEqual(backoffs, [10, 20, 40, 60, 60])
+
+        self.assertTrue(self.probe())
+        self.breaker.success()
+        self.fail(3)
+        self.assertEqual(self.backoff(), 10)
+
+    def test_full_jitter(self):
+        with mock.patch.object(plugin.random, "uniform", return_value=0) as uniform:
+            self.fail(3)
+        uniform.assert_called_once_with(0, 10)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, plugin.CircuitBreaker.HALF_OPEN)
+
+
+class TestWriteQueue(unittest.TestCase):
+    def test_coalesce(self):
+        writes = plugin.WriteQueue()
+        self.assertFalse(writes)
+        writes.put(1104, 100)
+        writes.put(1104, 110)
+        self.assertTrue(writes)
+        self.assertEqual(writes.take(), [(1104, [110])])
+        self.assertFalse(writes)
+        self.assertEqual(writes.take(), [])
+
+    def test_runs(self):
+        writes = plugin.WriteQueue()
+        for Register, Value in [(1109, 6), (1105, 1), (1104, 100), (1106, 70)]:
+            writes.put(Register, Value)
+        self.assertEqual(writes.take(), [(1104, [100, 1, 70]), (1109, [6])])
+
+    def test_put_back(self):
+        writes = plugin.WriteQueue()
+        writes.put(1105, 2)  # Queued while writing 1104-1106
+        writes.putBack(1104, [100, 1, 70])
+        self.assertEqual(writes.take(), [(1104, [100, 2, 70])])
+
+
+class Device:
+    """Stand-in for Domoticz.Device, recording the updates."""
+
+    def __init__(self):
+        self.updates = []
+
+    def Update(self, nValue=0, sValue=""):
+        self.updates.append(sValue)
+
+
+class TestDeadBand(unittest.TestCase):
+    def setUp(self):
+        self.device = Device()
+        patcher = mock.patch.object(plugin, "Devices", {4: self.device}, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.plugin = plugin.BasePlugin()
+        self.plugin.deadband = 0.5
+        self.plugin.maxAge = 300
+
+    def update(self, *sValues, nValue=0):
+        for sValue in sValues:
+            self.plugin.updateDevice(4, nValue, sValue)
+
+    def test_dead_band(self):
+        self.update("20.0", "20.0", "20.4", "19.6", "20.5", "20.1", "19.9")
+        self.assertEqual(self.device.updates, ["20.0", "20.5", "19.9"])
+        self.assertEqual(self.plugin.updatesWritten, 3)
+        self.assertEqual(self.plugin.updatesSuppressed, 4)
+
+    def test_no_dead_band(self):
+        self.plugin.deadband = 0
+        self.update("20.0", "20.0", "20.1", "20")
+        self.assertEqual(self.device.updates, ["20.0", "20.1", "20"])
+
+    def test_max_age(self):
+        self.update("20.0")
+        nValue, sValue, published = self.plugin.published[4]
+        self.plugin.published[4] = (nValue, sValue, published - 300)
+        self.update("20.0", "20.0")
+        self.assertEqual(self.device.updates, ["20.0", "20.0"])
+
+    def test_always_written(self):
+        self.update("20.0")
+        self.update("20.0", nValue=1)  # nValue changed
+        self.plugin.updateDevice(4, 1, "20.0", force=True)
+        self.update("ON", "OFF", nValue=1)  # Not a number
+        self.assertEqual(self.device.updates, ["20.0", "20.0", "20.0", "ON", "OFF"])
+
+    def test_heartbeat(self):
+        self.plugin.poller = types.SimpleNamespace(samples=queue.Queue(), rs485=None)
+        for sValue in ["20.0", "20.1", "21.0"]:
+            self.plugin.poller.samples.put(("update", 4, 0, sValue))
+        self.plugin.onHeartbeat()
+        self.assertEqual(self.device.updates, ["20.0", "21.0"])
+        self.assertTrue(self.plugin.poller.samples.empty())
+
+
+class TestPoller(unittest.TestCase):
+    def setUp(self):
+        self.emulator = EQ2021Emulator(address=3)
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        # Some kernels refuse to set parity on a pseudo-terminal
+        patcher = mock.patch.object(
+            minimalmodbus.serial, "PARITY_EVEN", minimalmodbus.serial.PARITY_NONE
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.traceFile = os.path.join(folder.name, plugin.TRACEFILE)
+        blocks = plugin.compileRegisterMap(30)
+        self.poller = plugin.Poller(
+            self.emulator.port, 3, 9600, 30, blocks, traceFile=self.traceFile
+        )
+        self.poller.openInstrument()
+        self.addCleanup(self.poller.session.close)
+
+    def updates(self):
+        """Return {Unit: sValue} of the updates published by the poller."""
+        updates = {}
+        while not self.poller.samples.empty():
+            message = self.poller.samples.get()
+            if message[0] == "update":
+                updates[message[1]] = message[3]
+        return updates
+
+    def test_poll(self):
+        self.poller.poll()
+        updates = self.updates()
+        self.assertEqual(updates[plugin.DEVS["TEMP_AIR_IN"]["unit"]], "20.0")
+        self.assertEqual(updates[plugin.DEVS["SP_HOTWATER"]["unit"]], "50.0")
+        self.assertEqual(updates[plugin.DEVS["SP_RESISTOR_DELAY"]["unit"]], "30")
+        self.assertEqual(len(updates), len(plugin.DEVS))
+
+    def test_circuit_breaker(self):
+        self.emulator.off = True
+        for _ in range(plugin.BREAKERTHRESHOLD):
+            self.poller.poll()
+        self.assertEqual(self.poller.breaker.state, plugin.CircuitBreaker.OPEN)
+        trace = minimalmodbus.load_trace(self.traceFile).records()
+        sent = [r for r in trace if r.direction == minimalmodbus.TRACE_REQUEST]
+        self.assertEqual(len(sent), plugin.BREAKERTHRESHOLD)
+        requests = self.emulator.requests
+        self.poller.poll()
+        self.assertEqual(self.emulator.requests, requests)  # No transaction
+
+        self.emulator.off = False
+        self.updates()
+        self.poller.breaker.nextAttempt = 0
+        self.poller.poll()
+        self.assertEqual(self.poller.breaker.state, plugin.CircuitBreaker.CLOSED)
+        self.assertEqual(self.emulator.requests, requests + 3)  # Probe and blocks
+        self.assertEqual(len(self.updates()), len(plugin.DEVS))
+
+    def write(self):
+        """Execute the pending writes, as done by the poller thread."""
+        for Register, Values in self.poller.writes.take():
+            self.poller.WriteRS485(Register, Values)
+
+    def test_writes(self):
+        for Value in [100, 110, 120]:
+            self.poller.write(1104, Value)
+        self.poller.write(1106, 70)
+        self.write()
+        self.assertEqual(self.emulator.requests, 2)  # Only the newest value
+        self.assertEqual(self.emulator.registers[1104], 120)
+        self.poller.write(1105, 1)
+        self.poller.write(1104, 130)
+        self.write()
+        self.assertEqual(self.emulator.requests, 3)  # One FC16 transaction
+        self.assertEqual(self.emulator.registers[1104], 130)
+        self.assertEqual(self.emulator.registers[1105], 1)
+
+    def test_write_retried(self):
+        self.emulator.off = True
+        self.poller.write(1104, 100)
+        self.write()
+        self.poller.write(1104, 110)  # Newer than the failed write
+        self.emulator.off = False
+        self.write()
+        self.assertEqual(self.emulator.registers[1104], 110)
+        self.assertFalse(self.poller.writes)
+
+    def test_write_marks_block_fresh(self):
+        self.poller.poll()
+        self.updates()
+        slow = self.poller.blocks[1]
+        slow.lastRead = 0
+        self.poller.write(1104, 120)
+        self.write()
+        self.poller.poll()
+        self.assertNotIn(plugin.DEVS["SP_HOTWATER"]["unit"], self.updates())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Check how RTU responses are read: frame length prediction and timeout.
+
+Run with ``python -m unittest test_read_response``.
+"""
+
+import asyncio
+import os
+import select
+import threading
+import time
+import unittest
+
+import minimalmodbus
+from emulator import EQ2021Emulator
+
+RESPONSE = bytes.fromhex("0303020064") + minimalmodbus._calculate_crc(
+    bytes.fromhex("0303020064")
+)
+
+
+class TestPredictRtuFrameLength(unittest.TestCase):
+    def test_read(self):
+        predict = minimalmodbus._predict_rtu_frame_length
+        self.assertEqual(predict(b"", 1000), 2)
+        self.assertEqual(predict(b"\x03\x03", 1000), 3)
+        self.assertEqual(predict(b"\x03\x03\x0a", 1000), 15)
+        self.assertEqual(predict(b"\x03\x01\x01", 1000), 6)
+
+    def test_exception(self):
+        self.assertEqual(minimalmodbus._predict_rtu_frame_length(b"\x03\x83", 7), 5)
+
+    def test_write_echo(self):
+        for functioncode in [5, 6, 15, 16]:
+            with self.subTest(functioncode=functioncode):
+                beginning = bytes([3, functioncode])
+                self.assertEqual(
+                    minimalmodbus._predict_rtu_frame_length(beginning, 1000), 8
+                )
+
+    def test_other_function_codes(self):
+        self.assertEqual(minimalmodbus._predict_rtu_frame_length(b"\x03\x17", 9), 9)
+
+
+class TrickleSlave(threading.Thread):
+    """Answer one request on a pseudo-terminal, one byte every *interval*."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self.slave = slave
+
+    def run(self):
+        select.select([self.master], [], [], 5)
+        os.read(self.master, 256)
+        for index in range(len(RESPONSE)):
+            time.sleep(self.interval)
+            os.write(self.master, RESPONSE[index : index + 1])
+
+    def close(self):
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class TestResponseTimeout(unittest.TestCase):
+    TIMEOUT = 0.2
+
+    def start(self, interval, instrument_class=minimalmodbus.Instrument):
+        slave = TrickleSlave(interval)
+        slave.start()
+        self.addCleanup(slave.close)
+        instrument = instrument_class(slave.port, 3)
+        self.addCleanup(instrument.serial.close)
+        instrument.serial.timeout = 1.0
+        instrument.adaptive_timeout = minimalmodbus.AdaptiveTimeout(
+            self.TIMEOUT, self.TIMEOUT
+        )
+        instrument.adaptive_timeout._record(3, 7, self.TIMEOUT)
+        return instrument
+
+    def test_timeout_for_whole_frame(self):
+        instrument = self.start(interval=0.06)  # 7 bytes in 0.42 s
+        start_time = time.monotonic()
+        with self.assertRaises(minimalmodbus.InvalidResponseError):
+            instrument.read_registers(2019, 1)
+        self.assertLess(time.monotonic() - start_time, self.TIMEOUT + 0.1)
+
+    def test_slow_frame_within_timeout(self):
+        instrument = self.start(interval=0.01)
+        self.assertEqual(instrument.read_registers(2019, 1), [100])
+
+    def test_timeout_for_whole_frame_async(self):
+        instrument = self.start(0.06, minimalmodbus.AsyncInstrument)
+        start_time = time.monotonic()
+        with self.assertRaises(minimalmodbus.InvalidResponseError):
+            asyncio.run(instrument.read_registers(2019, 1))
+        self.assertLess(time.monotonic() - start_time, self.TIMEOUT + 0.1)
+
+
+class TestWriteResponse(unittest.TestCase):
+    def test_without_precalculated_size(self):
+        emulator = EQ2021Emulator(address=3)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        instrument = minimalmodbus.Instrument(emulator.port, 3)
+        self.addCleanup(instrument.serial.close)
+        instrument.serial.timeout = 1.0
+        instrument.precalculate_read_size = False
+        for value in range(100, 105):
+            start_time = time.monotonic()
+            instrument.write_register(1104, value)
+            self.assertLess(time.monotonic() - start_time, 0.5)
+        self.assertEqual(emulator.registers[1104], 104)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Check that replay_trace() decodes recorded timeouts in order.
+
+Run with ``python -m unittest test_replay``.
+"""
+
+import struct
+import unittest
+
+import minimalmodbus
+
+REQUEST_PAYLOAD = bytes.fromhex("07E30002")  # Read 2 registers at 2019
+RESPONSE_PAYLOAD = bytes.fromhex("0400640096")  # Values 100 and 150
+
+
+def frame(mode, payload, transaction_id=0):
+    """Build a function code 3 frame for slave 3."""
+    data = minimalmodbus._embed_payload(3, mode, 3, payload)
+    if mode == minimalmodbus.MODE_TCP:
+        data = struct.pack(">H", transaction_id) + data[2:]
+    return data
+
+
+def make_trace(records):
+    trace = minimalmodbus.TransactionTrace()
+    for direction, data in records:
+        trace._record(direction, data, None)
+    return trace
+
+
+def replay(records, mode):
+    return list(minimalmodbus.replay_trace(make_trace(records), mode))
+
+
+class TestReplayTimeouts(unittest.TestCase):
+    def check(self, transactions, expected):
+        self.assertEqual(len(transactions), len(expected))
+        for transaction, (transaction_id, ok) in zip(transactions, expected):
+            if transaction_id is not None:
+                self.assertEqual(
+                    transaction.request[:2], struct.pack(">H", transaction_id)
+                )
+            if ok:
+                self.assertIsNone(transaction.error)
+                self.assertEqual(transaction.result, [100, 150])
+            else:
+                self.assertEqual(transaction.response, b"")
+                self.assertIsInstance(transaction.error, minimalmodbus.NoResponseError)
+
+    def test_rtu(self):
+        mode = minimalmodbus.MODE_RTU
+        request = frame(mode, REQUEST_PAYLOAD)
+        transactions = replay(
+            [
+                (minimalmodbus.TRACE_REQUEST, request),
+                (minimalmodbus.TRACE_RESPONSE, frame(mode, RESPONSE_PAYLOAD)),
+                (minimalmodbus.TRACE_REQUEST, request),
+                (minimalmodbus.TRACE_RESPONSE, b""),
+                (minimalmodbus.TRACE_REQUEST, request),
+                (minimalmodbus.TRACE_RESPONSE, frame(mode, RESPONSE_PAYLOAD)),
+            ],
+            mode,
+        )
+        self.check(transactions, [(None, True), (None, False), (None, True)])
+
+    def test_tcp(self):
+        mode = minimalmodbus.MODE_TCP
+        request = frame(mode, REQUEST_PAYLOAD, 1)
+        transactions = replay(
+            [
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 1)),
+                (minimalmodbus.TRACE_RESPONSE, frame(mode, RESPONSE_PAYLOAD, 1)),
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 2)),
+                (minimalmodbus.TRACE_RESPONSE, b""),
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 3)),
+                (minimalmodbus.TRACE_RESPONSE, frame(mode, RESPONSE_PAYLOAD, 3)),
+            ],
+            mode,
+        )
+        self.assertEqual(transactions[0].request, request)
+        self.check(transactions, [(1, True), (2, False), (3, True)])
+
+    def test_tcp_pipelined(self):
+        mode = minimalmodbus.MODE_TCP
+        transactions = replay(
+            [
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 4)),
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 5)),
+                (minimalmodbus.TRACE_REQUEST, frame(mode, REQUEST_PAYLOAD, 6)),
+                (minimalmodbus.TRACE_RESPONSE, frame(mode, RESPONSE_PAYLOAD, 5)),
+                (minimalmodbus.TRACE_RESPONSE, b""),
+                (minimalmodbus.TRACE_RESPONSE, b""),
+            ],
+            mode,
+        )
+        self.check(transactions, [(5, True), (4, False), (6, False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Check the scaled register reads, with and without NumPy.
+
+Run with ``python -m unittest test_scaled``.
+"""
+
+import array
+import unittest
+
+import minimalmodbus
+from emulator import EQ2021Emulator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+REGISTERS = array.array("H", [100, 150, 0, 65535])
+
+
+class TestScaleRegisters(unittest.TestCase):
+    def scale(self, scale, offset, signed=False, as_numpy=False):
+        return minimalmodbus._scale_registers(
+            REGISTERS, scale, offset, signed, as_numpy
+        )
+
+    def test_one_scale(self):
+        self.assertEqual(self.scale(0.5, -30.0), [20.0, 45.0, -30.0, 32737.5])
+
+    def test_scale_per_register(self):
+        self.assertEqual(
+            self.scale((0.5, 1.0, 2.0, 1.0), (-30.0, 0.0, 1.0, 0.0)),
+            [20.0, 150.0, 1.0, 65535.0],
+        )
+
+    def test_mixed(self):
+        self.assertEqual(self.scale(2.0, (0.0, 1.0, 2.0, 3.0)), [200, 301, 2, 131073])
+        self.assertEqual(self.scale((1.0, 1.0, 1.0, 0.0), 1.0), [101, 151, 1, 1])
+
+    def test_signed(self):
+        self.assertEqual(self.scale(0.1, 0.0, signed=True)[3], -0.1)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_numpy(self):
+        for scale, offset in [
+            (0.5, -30.0),
+            ((0.5, 1.0, 2.0, 1.0), (-30.0, 0.0, 1.0, 0.0)),
+            (2.0, (0.0, 1.0, 2.0, 3.0)),
+        ]:
+            with self.subTest(scale=scale, offset=offset):
+                result = self.scale(scale, offset, as_numpy=True)
+                self.assertIsInstance(result, numpy.ndarray)
+                self.assertEqual(result.dtype, numpy.float64)
+                self.assertEqual(result.tolist(), self.scale(scale, offset))
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_numpy_signed(self):
+        self.assertEqual(
+            self.scale(0.5, 0.0, signed=True, as_numpy=True).tolist(),
+            self.scale(0.5, 0.0, signed=True),
+        )
+
+
+class TestNormalizeScaling(unittest.TestCase):
+    def test_valid(self):
+        normalize = minimalmodbus._normalize_scaling
+        self.assertEqual(normalize(2, 3, "scale"), 2.0)
+        self.assertIsInstance(normalize(2, 3, "scale"), float)
+        self.assertEqual(normalize([1, 0.5, 2], 3, "scale"), (1.0, 0.5, 2.0))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            minimalmodbus._normalize_scaling([1, 2], 3, "scale")
+        with self.assertRaises(TypeError):
+            minimalmodbus._normalize_scaling("1", 3, "scale")
+        with self.assertRaises(TypeError):
+            minimalmodbus._normalize_scaling([1, None, 2], 3, "offset")
+
+
+class TestPrepareReadScaled(unittest.TestCase):
+    def setUp(self):
+        emulator = EQ2021Emulator(address=3)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        self.instrument = minimalmodbus.Instrument(emulator.port, 3)
+        self.addCleanup(self.instrument.serial.close)
+        self.instrument.serial.timeout = 0.5
+
+    def test_read(self):
+        command = self.instrument.prepare_read_scaled(2019, 5, 0.5, -30)
+        expected = [20.0, 45.0, 50.0, 15.0, 10.0]
+        self.assertEqual(self.instrument.execute(command), expected)
+        self.assertEqual(self.instrument.execute(command), expected)  # Reusable
+        self.assertEqual(
+            self.instrument.read_registers_scaled(2019, 5, 0.5, -30), expected
+        )
+
+    def test_scale_per_register(self):
+        command = self.instrument.prepare_read_scaled(
+            1104, 6, [0.5, 1, 0.5, 1, 1, 5], [-30, 0, -30, 0, 0, 0]
+        )
+        values = self.instrument.execute(command)
+        self.assertEqual(values[0], 50.0)
+        self.assertEqual(values[2], 5.0)
+        self.assertEqual(values[5], 30.0)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_read_numpy(self):
+        command = self.instrument.prepare_read_scaled(2019, 5, 0.5, -30, as_numpy=True)
+        result = self.instrument.execute(command)
+        self.assertIsInstance(result, numpy.ndarray)
+        self.assertEqual(result.tolist(), [20.0, 45.0, 50.0, 15.0, 10.0])
+
+    @unittest.skipIf(numpy, "NumPy is installed")
+    def test_numpy_missing(self):
+        with self.assertRaises(ImportError):
+            self.instrument.prepare_read_scaled(2019, 5, as_numpy=True)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.instrument.prepare_read_scaled(2019, 5, [0.5, 0.5])
+        with self.assertRaises(ValueError):
+            self.instrument.prepare_read_scaled(2019, 5, functioncode=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
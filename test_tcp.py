@@ -0,0 +1,92 @@
+"""Check the Modbus TCP transaction IDs and pipelining against the emulator.
+
+Run with ``python -m unittest test_tcp``.
+"""
+
+import time
+import unittest
+
+import minimalmodbus
+from emulator import EQ2021TcpEmulator
+
+VALUES = {2019: 100, 2020: 150, 2021: 160, 2022: 90, 2023: 80}
+
+
+class ScriptedEmulator(EQ2021TcpEmulator):
+    """Drop or delay the responses to some requests, by request number."""
+
+    def __init__(self, dropped=(), delays=None, **kwargs):
+        self.dropped_requests = set(dropped)
+        self.delays = delays or {}
+        super().__init__("tcp", address=3, **kwargs)
+
+    def respond(self, frame):
+        number = self.requests
+        response = super().respond(frame)
+        time.sleep(self.delays.get(number, 0))
+        return None if number in self.dropped_requests else response
+
+
+class TestTcp(unittest.TestCase):
+    def start(self, **kwargs):
+        emulator = ScriptedEmulator(**kwargs)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        instrument = minimalmodbus.Instrument(emulator.port, 3)
+        self.addCleanup(instrument.serial.close)
+        instrument.serial.timeout = 0.2
+        instrument.trace = minimalmodbus.TransactionTrace(100)
+        return emulator, instrument
+
+    def test_late_response_is_discarded(self):
+        emulator, instrument = self.start(delays={0: 0.3})
+        with self.assertRaises(minimalmodbus.NoResponseError):
+            instrument.read_registers(2019, 1)
+        # The late response to the first request arrives first, with another ID
+        self.assertEqual(instrument.read_registers(2020, 1), [150])
+        self.assertEqual(instrument.read_registers(2021, 1), [160])
+
+    def test_pipelined(self):
+        emulator, instrument = self.start()
+        instrument.max_transactions_in_flight = 4
+        addresses = [2019 + k % 5 for k in range(10)]
+        commands = [instrument.prepare_read(address, 1) for address in addresses]
+        results = instrument.execute_many(commands)
+        self.assertEqual(results, [[VALUES[address]] for address in addresses])
+        self.assertEqual(instrument.metrics.transactions, 10)
+
+    def test_pipelined_after_timeout(self):
+        emulator, instrument = self.start(dropped={1, 5})
+        instrument.max_transactions_in_flight = 2
+        addresses = [2019 + k % 5 for k in range(10)]
+        commands = [instrument.prepare_read(address, 1) for address in addresses]
+        results = instrument.execute_many(commands, return_exceptions=True)
+        self.assertEqual(emulator.requests, 10)  # All sent, also after the timeouts
+        for index, (address, result) in enumerate(zip(addresses, results)):
+            with self.subTest(index=index):
+                if index in (1, 5):
+                    self.assertIsInstance(result, minimalmodbus.NoResponseError)
+                else:
+                    self.assertEqual(result, [VALUES[address]])
+
+        self.assertEqual(instrument.metrics.transactions, 10)
+        replayed = list(
+            minimalmodbus.replay_trace(instrument.trace, minimalmodbus.MODE_TCP)
+        )
+        self.assertEqual(len(replayed), 10)
+        errors = [
+            replayed_transaction.registeraddress
+            for replayed_transaction in replayed
+            if replayed_transaction.error is not None
+        ]
+        self.assertEqual(errors, [addresses[1], addresses[5]])
+
+    def test_pipelined_writes(self):
+        emulator, instrument = self.start()
+        commands = [instrument.prepare_write(1104 + k, [100 + k]) for k in range(3)]
+        self.assertEqual(instrument.execute_many(commands), [None] * 3)
+        self.assertEqual(instrument.read_registers(1104, 3), [100, 101, 102])
+
+
+if __name__ == "__main__":
+    unittest.main()